@@ -0,0 +1,22 @@
+"""
+Where the desktop apps keep their files
+Settings, caches and the other files of the CLI and the GUI all live in one
+YT-Downloader folder under APPDATA (the home folder where APPDATA isn't set).
+"""
+
+import os
+
+APP_DIR_NAME = "YT-Downloader"
+
+
+def get_app_dir():
+    """The YT-Downloader folder (not created)"""
+    app_data = os.getenv('APPDATA')
+    if not app_data:
+        app_data = os.path.expanduser("~")
+    return os.path.join(app_data, APP_DIR_NAME)
+
+
+def get_app_path(*parts):
+    """Path of a file or folder inside the YT-Downloader folder, e.g. get_app_path("cache", "metadata")"""
+    return os.path.join(get_app_dir(), *parts)
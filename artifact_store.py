@@ -0,0 +1,207 @@
+"""
+Eviction service for the web app download folder
+Keeps an in-memory index of finished files (size and last access) so the
+folder is scanned once at startup, and cleanup only touches the files it
+actually removes. Leftovers of failed or cancelled jobs (.part, .ytdl,
+format pieces) are never indexed, an occasional sweep finds them instead.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024 * 1024
+DEFAULT_MAX_AGE = 3600  # seconds since last access
+DEFAULT_INTERVAL = 60
+# Seconds between two scans of the folder for files that were never indexed
+DEFAULT_SWEEP_INTERVAL = 600
+# Evicting for space goes down to this fraction of max_bytes, so a busy
+# node doesn't run the eviction for every new file once it is full
+LOW_WATER_RATIO = 0.9
+
+
+class ArtifactStore:
+    """
+    Index of the files in `directory`, least recently used first.
+    Files over `max_age` seconds since their last access, and the oldest files
+    while the total is over `max_bytes`, are deleted by a background thread.
+    Pinned files (being sent to a client) are never deleted. Files nobody
+    indexed count against `max_bytes` too, and are deleted once untouched for
+    `max_age` seconds (a download in progress keeps its mtime fresh).
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE, interval=DEFAULT_INTERVAL,
+                 sweep_interval=DEFAULT_SWEEP_INTERVAL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.interval = interval
+        self.sweep_interval = sweep_interval
+
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # file name -> [size, last access]
+        self._pins = {}              # file name -> number of open responses
+        self._total_bytes = 0
+        self._unindexed_bytes = 0  # files found by the last sweep that are not in the index
+        self._last_sweep = time.monotonic()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """One full scan at startup, mtime stands in for the last access"""
+        found = []
+        for entry in os.scandir(self.directory):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            if entry.is_file():
+                found.append((st.st_mtime, entry.name, st.st_size))
+
+        with self._lock:
+            for mtime, name, size in sorted(found):
+                self._index[name] = [size, mtime]
+                self._total_bytes += size
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes + self._unindexed_bytes
+
+    def names(self):
+        """Snapshot of the indexed file names"""
+        with self._lock:
+            return list(self._index)
+
+    def add(self, name):
+        """Index a finished file (or refresh its size), returns False if it doesn't exist"""
+        name = os.path.basename(name)
+        try:
+            size = os.path.getsize(os.path.join(self.directory, name))
+        except OSError:
+            return False
+
+        with self._lock:
+            if name in self._index:
+                self._total_bytes -= self._index.pop(name)[0]
+            self._index[name] = [size, time.time()]
+            self._total_bytes += size
+            over = self._total_bytes > self.max_bytes
+        if over:
+            self._wakeup.set()
+        return True
+
+    def touch(self, name):
+        """Mark a file as just used, returns False if it isn't indexed"""
+        name = os.path.basename(name)
+        with self._lock:
+            entry = self._index.get(name)
+            if entry is None:
+                return False
+            entry[1] = time.time()
+            self._index.move_to_end(name)
+            return True
+
+    def pin(self, name):
+        """Protect a file from eviction until unpin() (calls nest)"""
+        name = os.path.basename(name)
+        with self._lock:
+            self._pins[name] = self._pins.get(name, 0) + 1
+        self.touch(name)
+
+    def unpin(self, name):
+        name = os.path.basename(name)
+        with self._lock:
+            count = self._pins.get(name, 0) - 1
+            if count > 0:
+                self._pins[name] = count
+            else:
+                self._pins.pop(name, None)
+
+    def sweep(self):
+        """
+        Delete the files that were never indexed (left by failed / cancelled jobs)
+        once untouched for max_age, and count the rest against max_bytes; returns what was removed
+        """
+        now = time.time()
+        with self._lock:
+            indexed = set(self._index) | set(self._pins)
+        stale, unindexed_bytes = [], 0
+        for entry in os.scandir(self.directory):
+            if entry.name in indexed:
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            if now - st.st_mtime > self.max_age:
+                stale.append(entry.name)
+            else:
+                unindexed_bytes += st.st_size
+
+        removed = []
+        for name in stale:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            removed.append(name)
+        with self._lock:
+            self._unindexed_bytes = unindexed_bytes
+            self._last_sweep = time.monotonic()
+        return removed
+
+    def evict(self):
+        """Delete expired files, then the oldest ones while over the high-water mark"""
+        removed = []
+        if time.monotonic() - self._last_sweep >= self.sweep_interval:
+            removed.extend(self.sweep())
+        now = time.time()
+        with self._lock:
+            low_water = self.max_bytes * LOW_WATER_RATIO
+            over = self._total_bytes + self._unindexed_bytes > self.max_bytes
+            skipped, evicted = [], []
+            while self._index:
+                name, (size, last_access) = next(iter(self._index.items()))
+                expired = now - last_access > self.max_age
+                if not expired and not (over and self._total_bytes + self._unindexed_bytes > low_water):
+                    break
+                del self._index[name]
+                if name in self._pins:
+                    skipped.append((name, size, last_access))
+                    continue
+                self._total_bytes -= size
+                evicted.append(name)
+
+            # Pinned files keep their place at the front of the LRU order
+            for name, size, last_access in reversed(skipped):
+                self._index[name] = [size, last_access]
+                self._index.move_to_end(name, last=False)
+
+        for name in evicted:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+        return removed + evicted
+
+    def start(self):
+        """Run evict() every `interval` seconds (or sooner when a new file crosses the mark)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='artifact-eviction', daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.evict()
+            except Exception as e:
+                print(f"Eviction error: {e}")
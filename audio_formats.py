@@ -0,0 +1,58 @@
+"""
+Audio format negotiation
+Prefer a source stream that is already encoded in the requested codec, so
+FFmpegExtractAudio only copies it into the target container (or leaves the
+file alone) instead of decoding and re-encoding it
+"""
+
+# Target codec -> conditions a source stream must meet to need no re-encode, best first
+NATIVE_STREAMS = {
+    'mp3': [('acodec', '=', 'mp3')],
+    'm4a': [('acodec', '^=', 'mp4a'), ('ext', '=', 'm4a')],
+    'aac': [('acodec', '^=', 'mp4a')],
+    'opus': [('acodec', '=', 'opus')],
+    'vorbis': [('acodec', '=', 'vorbis')],
+    'flac': [('acodec', '=', 'flac')],
+    'alac': [('acodec', '=', 'alac')],
+    'wav': [],  # PCM is never streamed, always a (cheap) decode
+}
+
+AUDIO_CODECS = tuple(NATIVE_STREAMS)
+
+
+def _matches(fmt, condition):
+    field, op, value = condition
+    actual = (fmt.get(field) or '').lower()
+    if op == '^=':
+        return actual.startswith(value)
+    return actual == value
+
+
+def build_audio_format(codec):
+    """yt-dlp format selector: a native stream for `codec` if there is one, else the best audio"""
+    native = [f'bestaudio[{field}{op}{value}]' for field, op, value in NATIVE_STREAMS.get(codec, [])]
+    return '/'.join(native + ['bestaudio', 'best'])
+
+
+def build_audio_options(codec='mp3', quality=None):
+    """yt-dlp options for an audio download in `codec` (quality only matters when transcoding)"""
+    postprocessor = {'key': 'FFmpegExtractAudio', 'preferredcodec': codec}
+    if quality is not None:
+        postprocessor['preferredquality'] = quality
+    return {
+        'format': build_audio_format(codec),
+        'postprocessors': [postprocessor],
+    }
+
+
+def find_native_stream(info, codec):
+    """The best audio-only format in `info` that is already in `codec`, or None"""
+    conditions = NATIVE_STREAMS.get(codec) or []
+    candidates = [
+        f for f in info.get('formats') or []
+        if f.get('vcodec') == 'none' and f.get('acodec') not in (None, 'none')
+        and any(_matches(f, condition) for condition in conditions)
+    ]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda f: f.get('abr') or f.get('tbr') or 0)
@@ -0,0 +1,231 @@
+"""
+Local stand-in for a video site, used by the benchmarks
+Serves synthetic progressive files, DASH manifests and RSS playlists with
+configurable bandwidth and latency, so runs don't depend on the network
+
+Routes:
+    /v/<name>.mp4                 progressive file (Range supported)
+    /dash/<name>.mpd              DASH manifest (360p/720p video + audio)
+    /dash/<name>/<rep>.<ext>      DASH representation data
+    /playlist/<name>.xml?n=10     RSS feed linking to n progressive files
+"""
+
+import re
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+DEFAULT_SIZE = 2 * 1024 * 1024
+BLOCK_SIZE = 16 * 1024
+
+# DASH representations: id -> (mime type, ext, fraction of the file size, height, bandwidth)
+DASH_REPRESENTATIONS = {
+    'v360': ('video/mp4', 'mp4', 0.4, 360, 800000),
+    'v720': ('video/mp4', 'mp4', 1.0, 720, 2500000),
+    'a128': ('audio/mp4', 'm4a', 0.1, None, 128000),
+}
+
+
+def synthetic_bytes(size, offset=0):
+    """Deterministic filler, the same bytes for the same offsets"""
+    pattern = bytes(range(256)) * (BLOCK_SIZE // 256)
+    position = offset
+    end = offset + size
+    while position < end:
+        start = position % len(pattern)
+        chunk = pattern[start:start + min(len(pattern) - start, end - position)]
+        yield chunk
+        position += len(chunk)
+
+
+class FakeSiteHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def site(self):
+        return self.server.site
+
+    def do_HEAD(self):
+        self.handle_request(send_body=False)
+
+    def do_GET(self):
+        self.handle_request(send_body=True)
+
+    def handle_request(self, send_body):
+        if self.site.latency:
+            time.sleep(self.site.latency)
+
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        path = parsed.path
+
+        match = re.fullmatch(r'/v/([\w-]+)\.mp4', path)
+        if match:
+            return self.send_data('video/mp4', self.site.size, send_body)
+
+        match = re.fullmatch(r'/dash/([\w-]+)\.mpd', path)
+        if match:
+            return self.send_text('application/dash+xml', self.site.mpd(match.group(1)), send_body)
+
+        match = re.fullmatch(r'/dash/([\w-]+)/(\w+)\.(mp4|m4a)', path)
+        if match and match.group(2) in DASH_REPRESENTATIONS:
+            mime, _, fraction, _, _ = DASH_REPRESENTATIONS[match.group(2)]
+            return self.send_data(mime, int(self.site.size * fraction), send_body)
+
+        match = re.fullmatch(r'/playlist/([\w-]+)\.xml', path)
+        if match:
+            count = int(query.get('n', ['10'])[0])
+            return self.send_text('application/rss+xml', self.site.rss(match.group(1), count), send_body)
+
+        self.send_error(404)
+
+    def send_text(self, content_type, text, send_body):
+        body = text.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+        self.site.count(len(body) if send_body else 0)
+
+    def send_data(self, content_type, size, send_body):
+        start, end = 0, size - 1
+        status = 200
+        range_header = self.headers.get('Range')
+        if range_header:
+            match = re.fullmatch(r'bytes=(\d*)-(\d*)', range_header.strip())
+            if match and (match.group(1) or match.group(2)):
+                if match.group(1):
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+                else:
+                    start = max(size - int(match.group(2)), 0)
+                if start >= size or start > end:
+                    self.send_response(416)
+                    self.send_header('Content-Range', f'bytes */{size}')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                status = 206
+
+        length = end - start + 1
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(length))
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+        if not send_body:
+            return
+
+        sent = 0
+        started = time.monotonic()
+        try:
+            for chunk in synthetic_bytes(length, start):
+                self.wfile.write(chunk)
+                sent += len(chunk)
+                if self.site.bandwidth:
+                    # Pace this connection to the configured rate
+                    ahead = sent / self.site.bandwidth - (time.monotonic() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.site.count(sent)
+
+
+class FakeSite:
+    """
+    Run the fake site on a background thread.
+    `bandwidth` is bytes/sec per connection (0 = unlimited), `latency` is
+    seconds added before every response, `size` is the progressive file size.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, bandwidth=0, latency=0.0, size=DEFAULT_SIZE):
+        self.bandwidth = bandwidth
+        self.latency = latency
+        self.size = size
+        self.bytes_served = 0
+        self.requests_served = 0
+
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), FakeSiteHandler)
+        self._server.daemon_threads = True
+        self._server.site = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def video_url(self, name):
+        return f'{self.base_url}/v/{name}.mp4'
+
+    def dash_url(self, name):
+        return f'{self.base_url}/dash/{name}.mpd'
+
+    def playlist_url(self, name, count):
+        return f'{self.base_url}/playlist/{name}.xml?n={count}'
+
+    def count(self, sent):
+        with self._lock:
+            self.bytes_served += sent
+            self.requests_served += 1
+
+    def mpd(self, name):
+        duration = 60
+        adaptation_sets = []
+        for content in ('video', 'audio'):
+            representations = []
+            for rep_id, (mime, ext, fraction, height, bandwidth) in DASH_REPRESENTATIONS.items():
+                if not mime.startswith(content):
+                    continue
+                size = f' width="{height * 16 // 9}" height="{height}"' if height else ''
+                codecs = 'avc1.4d401f' if height else 'mp4a.40.2'
+                representations.append(
+                    f'<Representation id="{rep_id}" mimeType="{mime}" codecs="{codecs}" bandwidth="{bandwidth}"{size}>'
+                    f'<BaseURL>{name}/{rep_id}.{ext}</BaseURL></Representation>'
+                )
+            adaptation_sets.append(f'<AdaptationSet contentType="{content}">{"".join(representations)}</AdaptationSet>')
+
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" '
+            f'mediaPresentationDuration="PT{duration}S" profiles="urn:mpeg:dash:profile:isoff-on-demand:2011">'
+            f'<Period>{"".join(adaptation_sets)}</Period></MPD>'
+        )
+
+    def rss(self, name, count):
+        items = ''.join(
+            f'<item><title>{name} {i}</title><link>{self.video_url(f"{name}-{i}")}</link>'
+            f'<guid>{name}-{i}</guid>'
+            f'<enclosure url="{self.video_url(f"{name}-{i}")}" type="video/mp4" length="{self.size}"/></item>'
+            for i in range(1, count + 1)
+        )
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+            f'<title>{name}</title><link>{self.base_url}</link><description>Benchmark playlist</description>'
+            f'{items}</channel></rss>'
+        )
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-site', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
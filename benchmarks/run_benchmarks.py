@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Benchmark the download pipeline against a local fake site
+
+Every scenario runs in its own process (so peak RSS is per scenario) and
+reports jobs/sec, p50/p99 job latency, bytes/sec and peak RSS.
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --scenarios web cli-video --jobs 20 --concurrency 4
+    python benchmarks/run_benchmarks.py --bandwidth 2M --latency 0.05 --json results.json
+    python benchmarks/run_benchmarks.py --compare results.json   # exit code 1 on regression
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_site import FakeSite
+
+# name -> (description, needs ffmpeg)
+SCENARIOS = {
+    'cli-video': ("download_video, progressive file", False),
+    'cli-video-dash': ("download_video, DASH 720p video + audio merge", True),
+    'cli-audio': ("download_audio, MP3 conversion", True),
+    'cli-playlist': ("download_video in playlist mode, one job = one playlist", False),
+    'web': ("web_app /api/download job + /api/files", False),
+    'gui': ("GUI download path, window hidden", False),
+}
+
+
+def parse_size(value):
+    """'2M' -> 2097152, '500k' -> 512000, '0' -> 0"""
+    units = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+    value = str(value).strip().lower()
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(float(value))
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes (None if unknown)"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', None) or info.rss
+    except ImportError:
+        return None
+
+
+# === Scenario runners (run inside the child process) ===
+# Each gets the fake site and a job index, and returns True when the job succeeded
+
+def run_jobs(job, count, concurrency):
+    """Run `job(i)` `count` times on `concurrency` threads, returns (latencies, failures, wall time)"""
+    latencies = []
+    failures = 0
+    lock = threading.Lock()
+
+    def timed(i):
+        nonlocal failures
+        started = time.perf_counter()
+        try:
+            ok = job(i)
+        except Exception as e:
+            print(f"Job {i} failed: {e}", file=sys.stderr)
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                failures += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        list(pool.map(timed, range(count)))
+    return latencies, failures, time.perf_counter() - started
+
+
+def make_cli_job(scenario, site, args):
+    import youtube_downloader
+
+    if scenario == 'cli-video':
+        return lambda i: youtube_downloader.download_video(site.video_url(f'cli-{i}'), 'best')
+    if scenario == 'cli-video-dash':
+        return lambda i: youtube_downloader.download_video(site.dash_url(f'dash-{i}'), '720p')
+    if scenario == 'cli-audio':
+        return lambda i: youtube_downloader.download_audio(site.video_url(f'audio-{i}'), '192')
+    if scenario == 'cli-playlist':
+        return lambda i: youtube_downloader.download_video(
+            site.playlist_url(f'playlist-{i}', args.playlist_size), 'best', playlist_mode=True)
+    raise ValueError(scenario)
+
+
+def make_web_job(site, args):
+    import web_app
+    client = web_app.app.test_client()
+
+    def job(i):
+        response = client.post('/api/download', json={
+            'url': site.video_url(f'web-{i}'), 'type': 'video', 'quality': '720p',
+        })
+        if response.status_code != 202:
+            return False
+        status_url = response.get_json()['status_url']
+        while True:
+            status = client.get(status_url).get_json()
+            if status['status'] in ('finished', 'error'):
+                break
+            time.sleep(0.05)
+        if status['status'] != 'finished':
+            return False
+
+        file_response = client.get(status['download_url'])
+        ok = file_response.status_code == 200 and len(file_response.get_data()) > 0
+        file_response.close()
+        try:
+            os.remove(web_app.artifact_path(status['filename']))
+        except OSError:
+            pass
+        return ok
+
+    return job
+
+
+def run_gui_scenario(site, args):
+    """Drive YouTubeDownloaderApp.run_download with the window withdrawn, one job at a time"""
+    if sys.platform.startswith('linux') and not os.environ.get('DISPLAY'):
+        raise RuntimeError("needs a display (try running under xvfb-run)")
+
+    import youtube_downloader_gui as gui
+
+    errors = []
+
+    class Dialogs:
+        """Non-blocking stand-in for tkinter.messagebox, errors count as failed jobs"""
+        showinfo = staticmethod(lambda *a, **k: None)
+        showwarning = staticmethod(lambda *a, **k: None)
+        askyesno = staticmethod(lambda *a, **k: False)
+
+        @staticmethod
+        def showerror(title, message, **kwargs):
+            errors.append(message)
+
+    gui.messagebox = Dialogs
+    app = gui.YouTubeDownloaderApp()
+    app.withdraw()
+    app.download_folder = os.getcwd()
+
+    def job(i):
+        before = len(errors)
+        app.url_var.set(site.video_url(f'gui-{i}'))
+        app.mode_var.set('video')
+        app.quality_var.set('Best')
+        worker = threading.Thread(target=app.run_download, daemon=True)
+        worker.start()
+        # The real app runs the download on a thread while mainloop handles the widgets
+        while worker.is_alive():
+            app.update()
+            time.sleep(0.01)
+        # Error dialogs are posted to the UI bus, run what the worker left queued
+        app.ui_bus.drain()
+        return len(errors) == before
+
+    try:
+        # Tk objects belong to this thread, so GUI jobs never run concurrently
+        return run_jobs(job, args.jobs, 1)
+    finally:
+        app.destroy()
+
+
+def run_scenario(args):
+    """Child process entry point, writes the raw measurements to args.result_file"""
+    sys.path.insert(0, REPO_DIR)
+    scenario = args.run_scenario
+
+    with FakeSite(bandwidth=args.bandwidth, latency=args.latency, size=args.size) as site:
+        served_before = site.bytes_served
+        if scenario == 'gui':
+            latencies, failures, wall = run_gui_scenario(site, args)
+        elif scenario == 'web':
+            latencies, failures, wall = run_jobs(make_web_job(site, args), args.jobs, args.concurrency)
+        else:
+            latencies, failures, wall = run_jobs(make_cli_job(scenario, site, args), args.jobs, args.concurrency)
+        served = site.bytes_served - served_before
+
+    with open(args.result_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'latencies': latencies,
+            'failures': failures,
+            'wall_time': wall,
+            'bytes': served,
+            'peak_rss': peak_rss(),
+        }, f)
+
+
+# === Parent process ===
+
+def summarize(scenario, raw, args):
+    latencies = raw['latencies']
+    wall = raw['wall_time'] or float('nan')
+    return {
+        'scenario': scenario,
+        'jobs': len(latencies),
+        'failures': raw['failures'],
+        'jobs_per_sec': len(latencies) / wall,
+        'p50': percentile(latencies, 0.50),
+        'p99': percentile(latencies, 0.99),
+        'bytes_per_sec': raw['bytes'] / wall,
+        'peak_rss': raw['peak_rss'],
+        'settings': {
+            'jobs': args.jobs,
+            'concurrency': 1 if scenario == 'gui' else args.concurrency,
+            'bandwidth': args.bandwidth,
+            'latency': args.latency,
+            'size': args.size,
+        },
+    }
+
+
+def spawn_scenario(scenario, args):
+    """Run one scenario in a fresh process and working folder, returns (summary, skip reason)"""
+    if SCENARIOS[scenario][1] and not shutil.which('ffmpeg'):
+        return None, "ffmpeg not found"
+
+    work_dir = tempfile.mkdtemp(prefix=f'ytd-bench-{scenario}-')
+    result_file = os.path.join(work_dir, 'result.json')
+    command = [
+        sys.executable, os.path.abspath(__file__),
+        '--run-scenario', scenario,
+        '--result-file', result_file,
+        '--jobs', str(args.jobs),
+        '--concurrency', str(args.concurrency),
+        '--bandwidth', str(args.bandwidth),
+        '--latency', str(args.latency),
+        '--size', str(args.size),
+        '--playlist-size', str(args.playlist_size),
+    ]
+    # Fresh config / metadata cache folder, so every run starts cold
+    env = dict(os.environ, APPDATA=os.path.join(work_dir, 'appdata'))
+    output = None if args.verbose else subprocess.DEVNULL
+
+    try:
+        process = subprocess.run(command, cwd=work_dir, env=env, stdout=output,
+                                 stderr=None if args.verbose else subprocess.PIPE, text=True)
+        if process.returncode != 0 or not os.path.exists(result_file):
+            lines = (process.stderr or '').strip().splitlines()
+            return None, lines[-1] if lines else f"exit code {process.returncode}"
+        with open(result_file, 'r', encoding='utf-8') as f:
+            return summarize(scenario, json.load(f), args), None
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def format_bytes(value):
+    if value is None:
+        return '-'
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(value) < 1024:
+            return f"{value:.1f}{unit}"
+        value /= 1024
+    return f"{value:.1f}TB"
+
+
+def format_seconds(value):
+    return '-' if value is None else f"{value:.3f}s"
+
+
+def print_report(results, skipped):
+    header = f"{'scenario':<16}{'jobs':>6}{'fail':>6}{'jobs/s':>9}{'p50':>10}{'p99':>10}{'bytes/s':>12}{'peak RSS':>11}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['scenario']:<16}{r['jobs']:>6}{r['failures']:>6}{r['jobs_per_sec']:>9.2f}"
+              f"{format_seconds(r['p50']):>10}{format_seconds(r['p99']):>10}"
+              f"{format_bytes(r['bytes_per_sec']) + '/s':>12}{format_bytes(r['peak_rss']):>11}")
+    for scenario, reason in skipped:
+        print(f"{scenario:<16}skipped: {reason}")
+
+
+def compare(results, baseline_path, tolerance):
+    """Print metrics that got worse than the baseline by more than `tolerance`, returns True if any did"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {r['scenario']: r for r in json.load(f)['results']}
+
+    # metric -> True when higher is better
+    metrics = {'jobs_per_sec': True, 'bytes_per_sec': True, 'p50': False, 'p99': False, 'peak_rss': False}
+    regressed = False
+    for r in results:
+        old = baseline.get(r['scenario'])
+        if not old:
+            continue
+        if old.get('settings') != r['settings']:
+            print(f"[WARN] {r['scenario']}: settings differ from the baseline, comparison is approximate")
+        for metric, higher_is_better in metrics.items():
+            before, after = old.get(metric), r.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if (change < -tolerance) if higher_is_better else (change > tolerance):
+                regressed = True
+                print(f"[REGRESSION] {r['scenario']} {metric}: {before:.4g} -> {after:.4g} ({change:+.0%})")
+    if not regressed:
+        print(f"No regressions beyond {tolerance:.0%} against {baseline_path}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the download pipeline against a local fake site")
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS),
+                        help="scenarios to run (default: all)")
+    parser.add_argument('--jobs', type=int, default=10, help="jobs per scenario")
+    parser.add_argument('--concurrency', type=int, default=1, help="jobs running at the same time")
+    parser.add_argument('--bandwidth', type=parse_size, default=0,
+                        help="per-connection bandwidth in bytes/sec, e.g. 2M (default: unlimited)")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added before every response")
+    parser.add_argument('--size', type=parse_size, default=2 * 1024 * 1024, help="size of each video file, e.g. 2M")
+    parser.add_argument('--playlist-size', type=int, default=5, help="entries per playlist in cli-playlist")
+    parser.add_argument('--json', metavar='PATH', help="save the results as JSON")
+    parser.add_argument('--compare', metavar='PATH', help="compare against a saved JSON baseline")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="allowed relative regression (default: 0.10)")
+    parser.add_argument('--verbose', action='store_true', help="show the output of the scenarios")
+    parser.add_argument('--run-scenario', help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        run_scenario(args)
+        return 0
+
+    results = []
+    skipped = []
+    for scenario in args.scenarios:
+        print(f"Running {scenario}: {SCENARIOS[scenario][0]}...")
+        summary, reason = spawn_scenario(scenario, args)
+        if summary:
+            results.append(summary)
+        else:
+            skipped.append((scenario, reason))
+
+    print()
+    print_report(results, skipped)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'created_at': time.time(), 'results': results}, f, indent=2)
+        print(f"\nSaved results to {args.json}")
+
+    if args.compare:
+        print()
+        return 1 if compare(results, args.compare, args.tolerance) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""
+Cooperative cancellation for downloads
+A CancelToken is passed to a download as the 'cancel_token' option. Once it
+is cancelled the next request raises, the sockets of the requests in flight
+are shut down so a stalled read returns at once, the job's ffmpeg child is
+killed, and the partial files of the unfinished download are deleted.
+"""
+
+import os
+import glob
+import types
+import socket
+import weakref
+import threading
+from contextlib import contextmanager
+
+import yt_dlp
+from yt_dlp.postprocessor.ffmpeg import FFmpegPostProcessor
+
+from rate_limiter import RateLimitedYoutubeDL
+
+
+class DownloadCancelled(yt_dlp.utils.DownloadCancelled):
+    """Raised inside a cancelled download (yt-dlp passes it through instead of reporting an error)"""
+    msg = 'Download Cancelled by User'
+
+
+def _find_socket(response):
+    """The socket under a yt-dlp response (Response -> HTTPResponse -> buffered file -> SocketIO)"""
+    fp = response
+    for _ in range(6):
+        sock = getattr(fp, '_sock', None)
+        if isinstance(sock, socket.socket):
+            return sock
+        fp = getattr(fp, 'fp', None) or getattr(fp, '_fp', None) or getattr(fp, 'raw', None)
+        if fp is None:
+            return None
+    return None
+
+
+def abort_response(response):
+    """Make a read blocked on `response` in another thread fail right away"""
+    sock = _find_socket(response)
+    try:
+        if sock is not None:
+            # socket.socket's own shutdown, SSLSocket's would unwrap TLS under the reading thread
+            socket.socket.shutdown(sock, socket.SHUT_RDWR)
+        else:
+            response.close()
+    except OSError:
+        pass
+
+
+class CancelToken:
+    """Cancel flag for one job, shared by its download, extraction and ffmpeg threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._callbacks = {}
+        self._next_handle = 0
+        self._responses = weakref.WeakSet()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks.values())
+            self._callbacks.clear()
+            responses = list(self._responses)
+        for response in responses:
+            abort_response(response)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise DownloadCancelled()
+
+    def wait(self, timeout=None):
+        """Sleep up to `timeout` seconds, returns True as soon as the token is cancelled"""
+        return self._event.wait(timeout)
+
+    def add_callback(self, callback):
+        """Call callback() on cancel (at once if already cancelled), returns a function that unregisters it"""
+        with self._lock:
+            if not self._event.is_set():
+                handle = self._next_handle
+                self._next_handle += 1
+                self._callbacks[handle] = callback
+                return lambda: self._remove_callback(handle)
+        callback()
+        return lambda: None
+
+    def _remove_callback(self, handle):
+        with self._lock:
+            self._callbacks.pop(handle, None)
+
+    def track_response(self, response):
+        """Abort `response` on cancel (held weakly, closed responses drop out by themselves)"""
+        with self._lock:
+            if not self._event.is_set():
+                self._responses.add(response)
+                return
+        abort_response(response)
+
+
+_active = threading.local()
+
+
+@contextmanager
+def active_token(token):
+    """Make `token` the one subprocesses started on this thread register with"""
+    previous = getattr(_active, 'token', None)
+    _active.token = token
+    try:
+        yield token
+    finally:
+        _active.token = previous
+
+
+def get_active_token():
+    return getattr(_active, 'token', None)
+
+
+def remove_partial_files(filename):
+    """Delete an unfinished download and its temporary pieces (.part, .ytdl, fragments), returns what was removed"""
+    pattern = glob.escape(filename)
+    candidates = [filename, f'{filename}.part', f'{filename}.ytdl'] + glob.glob(f'{pattern}.part-Frag*')
+    removed = []
+    for path in candidates:
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        removed.append(path)
+    return removed
+
+
+def remove_unfinished_download(info):
+    """Delete what a download cancelled during post-processing left (only files fetched by this run)"""
+    if not info.get('__real_download'):
+        return []
+    removed = []
+    for path in list(info.get('__files_to_merge') or []) + [info.get('filepath')]:
+        if path:
+            removed.extend(remove_partial_files(path))
+    return removed
+
+
+class CancellablePopen(yt_dlp.utils.Popen):
+    """Child process killed (and its output file deleted) when the token active on its thread is cancelled"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.killed_by_token = False
+        token = get_active_token()
+        self._unregister = token.add_callback(self._cancel) if token is not None else None
+
+    def _cancel(self):
+        self.killed_by_token = True
+        self.kill()
+
+    def __exit__(self, *exc_info):
+        if self._unregister is not None:
+            self._unregister()
+        result = super().__exit__(*exc_info)
+        if self.killed_by_token:
+            # ffmpeg takes its output path last, the half-written file is of no use
+            args = self.args if isinstance(self.args, (list, tuple)) else []
+            if args and os.path.basename(str(args[0])).lower().startswith('ffmpeg'):
+                output = str(args[-1])
+                output = output[len('file:'):] if output.startswith('file:') else output
+                try:
+                    os.remove(output)
+                except OSError:
+                    pass
+        return result
+
+
+def _with_popen(func, popen):
+    """Copy of a yt-dlp function that starts its child processes with `popen` instead of yt-dlp's Popen"""
+    copy = types.FunctionType(func.__code__, {**func.__globals__, 'Popen': popen}, func.__name__,
+                              func.__defaults__, func.__closure__)
+    copy.__kwdefaults__ = func.__kwdefaults__
+    return copy
+
+
+# FFmpegPostProcessor.real_run_ffmpeg with its ffmpeg child registered with the active token.
+# Only bound to the post-processors CancellableYoutubeDL runs, yt-dlp's own module is left as it is.
+_cancellable_run_ffmpeg = _with_popen(FFmpegPostProcessor.real_run_ffmpeg, CancellablePopen)
+
+
+class CancellableYoutubeDL(RateLimitedYoutubeDL):
+    """
+    YoutubeDL that honours the 'cancel_token' option: extraction and media
+    requests check it, requests in flight are aborted on cancel, and the
+    files of the entry being downloaded are deleted when it is cancelled.
+    Its ffmpeg post-processors start their child through CancellablePopen, so
+    a cancel kills ffmpeg too.
+    """
+
+    def urlopen(self, req):
+        token = self.params.get('cancel_token')
+        if token is None:
+            return super().urlopen(req)
+        token.raise_if_cancelled()
+        response = super().urlopen(req)
+        token.track_response(response)
+        return response
+
+    def run_pp(self, pp, infodict):
+        if isinstance(pp, FFmpegPostProcessor):
+            # Bound on every run: post-processors are copied for deferred post-processing
+            pp.real_run_ffmpeg = types.MethodType(_cancellable_run_ffmpeg, pp)
+        return super().run_pp(pp, infodict)
+
+    def dl(self, name, info, subtitle=False, test=False):
+        started = getattr(self, '_started_files', None)
+        if started is not None and not test:
+            started.append(name)
+        return super().dl(name, info, subtitle, test)
+
+    def process_info(self, info_dict):
+        token = self.params.get('cancel_token')
+        if token is None:
+            return super().process_info(info_dict)
+        self._started_files = []
+        try:
+            token.raise_if_cancelled()
+            return super().process_info(info_dict)
+        except BaseException as e:
+            if not token.cancelled:
+                raise
+            for name in self._started_files:
+                removed = remove_partial_files(name)
+                if removed:
+                    self.to_screen(f"[cancel] Removed {len(removed)} partial file(s) of {os.path.basename(name)}")
+            if isinstance(e, DownloadCancelled):
+                raise
+            raise DownloadCancelled() from e
+        finally:
+            self._started_files = None
@@ -0,0 +1,88 @@
+"""
+Debounced single-worker background calls
+For lookups driven by typing (the GUI URL box): only the latest request is
+run, after the input has been quiet for a moment, on one long-lived thread.
+Every request gets a generation number so results that were overtaken by a
+newer request can be dropped instead of racing to the UI.
+"""
+
+import time
+import threading
+import traceback
+
+# Seconds of quiet input before a request runs
+DEFAULT_DELAY = 0.4
+
+
+class DebouncedWorker:
+    """
+    submit(key) schedules fn(key) on the worker thread; callback(generation, key, result)
+    gets the result, but only if no newer request was made in the meantime.
+    A request for the key that is already running is coalesced with it.
+    """
+
+    def __init__(self, fn, callback, delay=DEFAULT_DELAY, name='debounced-worker'):
+        self.fn = fn
+        self.callback = callback
+        self.delay = delay
+        self.name = name
+
+        self._cond = threading.Condition()
+        self._generation = 0
+        self._wanted = None  # (generation, key, due) of the latest request not started yet
+        self._thread = None
+
+    def submit(self, key):
+        """Request fn(key), replacing any request not started yet; returns its generation"""
+        with self._cond:
+            self._generation += 1
+            self._wanted = (self._generation, key, time.monotonic() + self.delay)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+            return self._generation
+
+    def cancel(self):
+        """Drop the pending request and the result of the running one"""
+        with self._cond:
+            self._generation += 1
+            self._wanted = None
+
+    def is_current(self, generation):
+        """Whether `generation` is still the latest request (re-check on the UI thread)"""
+        with self._cond:
+            return generation == self._generation
+
+    def _next(self):
+        with self._cond:
+            while True:
+                if self._wanted is None:
+                    self._cond.wait()
+                    continue
+                generation, key, due = self._wanted
+                remaining = due - time.monotonic()
+                if remaining > 0:
+                    # A newer submit() wakes us up and pushes the deadline back
+                    self._cond.wait(remaining)
+                    continue
+                self._wanted = None
+                return generation, key
+
+    def _run(self):
+        while True:
+            generation, key = self._next()
+            try:
+                result = self.fn(key)
+            except Exception:
+                traceback.print_exc()
+                result = None
+
+            with self._cond:
+                if self._wanted is not None and self._wanted[1] == key:
+                    # The same key was asked for again while it ran, this result answers it
+                    generation = self._wanted[0]
+                    self._wanted = None
+                current = generation == self._generation
+            if current:
+                self.callback(generation, key, result)
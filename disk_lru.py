@@ -0,0 +1,87 @@
+"""
+Size and count bounded LRU index of cache files in one folder
+The index lives in memory and is rebuilt from the folder at startup, with
+each file's mtime standing in for its last access.
+"""
+
+import os
+from collections import OrderedDict
+
+
+class DiskLRU:
+    """
+    Files ending in `suffix` in `directory`, least recently used first.
+    Not locked: the cache that owns it calls it under its own lock.
+    """
+
+    def __init__(self, directory, suffix, max_entries, max_bytes):
+        self.directory = directory
+        self.suffix = suffix
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._index = OrderedDict()  # file name -> size, oldest access first
+        self.total_bytes = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """Build the index from the files already on disk (mtime = last access)"""
+        found = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(self.suffix):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            found.append((st.st_mtime, entry.name, st.st_size))
+
+        for _, name, size in sorted(found):
+            self._index[name] = size
+            self.total_bytes += size
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def touch(self, name, size):
+        """Record a file as just written or read (also refreshes its mtime for the next startup)"""
+        if name in self._index:
+            self.total_bytes -= self._index.pop(name)
+        self._index[name] = size
+        self.total_bytes += size
+        try:
+            os.utime(self.path(name))
+        except OSError:
+            pass
+
+    def discard(self, name):
+        """Delete a file and forget it"""
+        if name in self._index:
+            self.total_bytes -= self._index.pop(name)
+        try:
+            os.remove(self.path(name))
+        except OSError:
+            pass
+
+    def evict(self, keep=None):
+        """Delete the least recently used files while over either bound (never `keep`, the file just written)"""
+        while self._index and (len(self._index) > self.max_entries or self.total_bytes > self.max_bytes):
+            name = next(iter(self._index))
+            if name == keep:
+                if len(self._index) == 1:
+                    break
+                self._index.move_to_end(name)
+                continue
+            self.discard(name)
+
+    def clear(self):
+        for name in list(self._index):
+            self.discard(name)
@@ -0,0 +1,174 @@
+"""
+Persistent download archive
+Records every finished download by its yt-dlp archive ID ("youtube <id>")
+with the output path and format in an indexed SQLite file, so playlists and
+channels that were fetched before only cost as much as their new entries.
+Shared by the CLI, the GUI and the web app.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+
+from app_paths import get_app_path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    archive_id TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    filepath TEXT,
+    format_id TEXT,
+    title TEXT,
+    downloaded_at REAL NOT NULL,
+    PRIMARY KEY (archive_id, profile)
+) WITHOUT ROWID
+"""
+
+# Another process (CLI next to the GUI) may hold the write lock for a moment
+BUSY_TIMEOUT = 10
+
+
+def get_archive_path():
+    """Get the archive database path (same base folder as the GUI config)"""
+    return get_app_path("archive.sqlite3")
+
+
+def get_archive_profile(ydl_opts):
+    """
+    Archive profile for a set of yt-dlp options, so the same video downloaded
+    as a video and as MP3 are tracked apart ('video', 'audio:mp3', ...)
+    """
+    for pp in ydl_opts.get('postprocessors') or []:
+        if pp.get('key') == 'FFmpegExtractAudio':
+            return f"audio:{pp.get('preferredcodec') or 'best'}"
+    return 'video'
+
+
+class DownloadArchive:
+    """
+    Finished downloads keyed by (archive ID, profile).
+    One connection per process, shared by every thread behind a lock.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_archive_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._views = {}
+        self._conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(SCHEMA)
+
+    def view(self, profile='video'):
+        """
+        Set-like view of one profile, to pass as yt-dlp's 'download_archive' option.
+        The same object is returned for a profile so pooled instances keep matching.
+        """
+        with self._lock:
+            view = self._views.get(profile)
+            if view is None:
+                view = self._views[profile] = ArchiveView(self, profile)
+            return view
+
+    def contains(self, archive_id, profile='video'):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT 1 FROM downloads WHERE archive_id = ? AND profile = ?', (archive_id, profile)).fetchone()
+        return row is not None
+
+    def get(self, archive_id, profile='video'):
+        """The recorded download as a dict, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT filepath, format_id, title, downloaded_at FROM downloads WHERE archive_id = ? AND profile = ?',
+                (archive_id, profile)).fetchone()
+        if row is None:
+            return None
+        filepath, format_id, title, downloaded_at = row
+        return {
+            'archive_id': archive_id,
+            'profile': profile,
+            'filepath': filepath,
+            'format_id': format_id,
+            'title': title,
+            'downloaded_at': downloaded_at,
+        }
+
+    def record(self, archive_id, profile='video', filepath=None, format_id=None, title=None):
+        """Add or update a finished download (known fields are kept when a new one is missing)"""
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO downloads (archive_id, profile, filepath, format_id, title, downloaded_at) '
+                'VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (archive_id, profile) DO UPDATE SET '
+                'filepath = COALESCE(excluded.filepath, filepath), '
+                'format_id = COALESCE(excluded.format_id, format_id), '
+                'title = COALESCE(excluded.title, title), '
+                'downloaded_at = excluded.downloaded_at',
+                (archive_id, profile, filepath, format_id, title, time.time()))
+
+    def forget(self, archive_id, profile=None):
+        """Drop an entry (every profile when `profile` is None)"""
+        with self._lock:
+            if profile is None:
+                self._conn.execute('DELETE FROM downloads WHERE archive_id = ?', (archive_id,))
+            else:
+                self._conn.execute(
+                    'DELETE FROM downloads WHERE archive_id = ? AND profile = ?', (archive_id, profile))
+
+    def count(self, profile=None):
+        with self._lock:
+            if profile is None:
+                return self._conn.execute('SELECT COUNT(*) FROM downloads').fetchone()[0]
+            return self._conn.execute('SELECT COUNT(*) FROM downloads WHERE profile = ?', (profile,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ArchiveView:
+    """One profile of a DownloadArchive, with the set interface yt-dlp expects"""
+
+    def __init__(self, archive, profile):
+        self.archive = archive
+        self.profile = profile
+
+    def __contains__(self, archive_id):
+        return self.archive.contains(archive_id, self.profile)
+
+    def __bool__(self):
+        # yt-dlp skips its lookups for an empty archive, not worth a COUNT per entry
+        return True
+
+    def __len__(self):
+        return self.archive.count(self.profile)
+
+    def add(self, archive_id):
+        self.archive.record(archive_id, self.profile)
+
+    def get(self, archive_id):
+        return self.archive.get(archive_id, self.profile)
+
+    def record(self, archive_id, filepath=None, format_id=None, title=None):
+        self.archive.record(archive_id, self.profile, filepath, format_id, title)
+
+    def forget(self, archive_id):
+        self.archive.forget(archive_id, self.profile)
+
+
+_default_archive = None
+_default_archive_lock = threading.Lock()
+
+
+def get_default_archive():
+    """Get the process-wide archive shared by every caller"""
+    global _default_archive
+    with _default_archive_lock:
+        if _default_archive is None:
+            _default_archive = DownloadArchive()
+        return _default_archive
@@ -0,0 +1,266 @@
+"""
+Persistent download queue for the GUI
+Queued downloads run on a configurable number of slots, each with its own
+progress record. The queue is saved on every status change, so a long
+batch picks up where it stopped when the app is started again.
+"""
+
+import os
+import json
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+from app_paths import get_app_path
+from cancellation import CancelToken, DownloadCancelled
+
+DEFAULT_SLOTS = 2
+MAX_SLOTS = 6
+
+# Items in these states still have work to do
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+def get_queue_path():
+    """Get the saved queue path (same base folder as the GUI config)"""
+    return get_app_path("queue.json")
+
+
+class QueueItem:
+    """One queued download with everything needed to run it later"""
+
+    FIELDS = ('id', 'url', 'mode', 'quality', 'audio_codec', 'playlist', 'playlist_items', 'folder', 'cookies',
+              'title', 'resume', 'status', 'error', 'added_at', 'finished_at')
+
+    def __init__(self, url, mode='video', quality='Best', audio_codec=None, playlist=False, playlist_items=None,
+                 folder=None, cookies=None, title=None, resume=None):
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.mode = mode
+        self.quality = quality
+        self.audio_codec = audio_codec
+        self.playlist = playlist
+        self.playlist_items = playlist_items
+        self.folder = folder
+        self.cookies = cookies or {}  # yt-dlp cookie options captured when the item was added
+        self.title = title
+        self.resume = resume  # interrupted download from the job journal this item continues
+
+        self.status = 'queued'  # queued -> running -> finished / archived / error / cancelled
+        self.error = None
+        self.added_at = time.time()
+        self.finished_at = None
+
+        # Not saved: live progress of a running item, and the token that cancels it
+        self.progress = {}
+        self.cancel_token = CancelToken()
+
+    @property
+    def done(self):
+        return self.status not in ACTIVE_STATUSES
+
+    @property
+    def cancel_requested(self):
+        return self.cancel_token.cancelled
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        item = cls(data['url'])
+        for field in cls.FIELDS:
+            if field in data:
+                setattr(item, field, data[field])
+        if item.status == 'running':
+            # The app was closed during this download, it starts over
+            item.status = 'queued'
+        return item
+
+
+class DownloadQueue:
+    """
+    Run queued items with run_item(item) on up to `slots` threads, oldest first.
+    run_item returns the final status ('finished' by default) or raises;
+    on_change(item) is called from the slot threads whenever an item changes,
+    on_remove(item) when remove() drops an item.
+    """
+
+    def __init__(self, run_item, slots=DEFAULT_SLOTS, path=None, on_change=None, on_remove=None):
+        self.run_item = run_item
+        self.path = path or get_queue_path()
+        self.on_change = on_change
+        self.on_remove = on_remove
+        self.slots = 0
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._items = OrderedDict()  # id -> QueueItem, in queue order
+        self._alive = set()  # indices of the slot threads currently running
+        self._load()
+        self._target_slots = max(1, min(slots, MAX_SLOTS))
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        for entry in data.get('items') or []:
+            try:
+                item = QueueItem.from_dict(entry)
+            except (KeyError, TypeError):
+                continue
+            self._items[item.id] = item
+
+    def _save(self):
+        """Write the queue to disk (caller holds the lock)"""
+        data = {'items': [item.to_dict() for item in self._items.values()]}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _changed(self, item):
+        if self.on_change:
+            self.on_change(item)
+
+    def start(self):
+        """Start the slot threads, items restored from disk resume right away"""
+        self.set_slots(self._target_slots)
+
+    def set_slots(self, slots):
+        """Change the number of concurrent downloads (extra slots stop after their current item)"""
+        slots = max(1, min(slots, MAX_SLOTS))
+        with self._lock:
+            self.slots = slots
+            for index in range(slots):
+                if index not in self._alive:
+                    self._alive.add(index)
+                    threading.Thread(target=self._worker, args=(index,), name=f'queue-slot-{index}',
+                                     daemon=True).start()
+            self._wakeup.notify_all()
+
+    def add(self, url, **options):
+        item = QueueItem(url, **options)
+        with self._lock:
+            self._items[item.id] = item
+            self._save()
+            self._wakeup.notify()
+        self._changed(item)
+        return item
+
+    def items(self):
+        """Snapshot of every item in queue order"""
+        with self._lock:
+            return list(self._items.values())
+
+    def counts(self):
+        """Number of items per status"""
+        counts = {}
+        with self._lock:
+            for item in self._items.values():
+                counts[item.status] = counts.get(item.status, 0) + 1
+        return counts
+
+    def update_progress(self, item, **progress):
+        """Merge live progress values into a running item (not saved)"""
+        with self._lock:
+            item.progress.update(progress)
+        self._changed(item)
+
+    def cancel(self, item_id):
+        """Cancel a waiting item, or ask a running one to stop"""
+        with self._lock:
+            item = self._items.get(item_id)
+            if item is None or item.done:
+                return
+            item.cancel_token.cancel()
+            if item.status == 'queued':
+                item.status = 'cancelled'
+                item.finished_at = time.time()
+                self._save()
+        self._changed(item)
+
+    def retry(self, item_id):
+        """Queue a failed or cancelled item again"""
+        with self._lock:
+            item = self._items.get(item_id)
+            if item is None or item.status not in ('error', 'cancelled'):
+                return
+            item.status = 'queued'
+            item.error = None
+            item.finished_at = None
+            item.progress = {}
+            item.cancel_token = CancelToken()
+            self._save()
+            self._wakeup.notify()
+        self._changed(item)
+
+    def remove(self, item_id):
+        """Drop an item that is not running"""
+        with self._lock:
+            item = self._items.get(item_id)
+            if item is None or item.status == 'running':
+                return
+            del self._items[item_id]
+            self._save()
+        if self.on_remove:
+            self.on_remove(item)
+        self._changed(item)
+
+    def clear_finished(self):
+        """Drop every item that completed successfully"""
+        with self._lock:
+            for item_id in [i for i, item in self._items.items() if item.status in ('finished', 'archived')]:
+                del self._items[item_id]
+            self._save()
+        self._changed(None)
+
+    def _next(self, index):
+        """Claim the oldest queued item for slot `index`, None when the slot should stop"""
+        with self._lock:
+            while True:
+                if index >= self.slots:
+                    self._alive.discard(index)
+                    return None
+                item = next((item for item in self._items.values() if item.status == 'queued'), None)
+                if item is not None:
+                    item.status = 'running'
+                    item.progress = {}
+                    self._save()
+                    return item
+                self._wakeup.wait()
+
+    def _worker(self, index):
+        while True:
+            item = self._next(index)
+            if item is None:
+                return
+            self._changed(item)
+
+            error = None
+            try:
+                status = self.run_item(item) or 'finished'
+            except DownloadCancelled:
+                status = 'cancelled'
+            except Exception as e:
+                status, error = 'error', str(e)
+            if item.cancel_requested and status == 'error':
+                # An exception raised by a hook can reach us wrapped in a DownloadError
+                status, error = 'cancelled', None
+
+            with self._lock:
+                item.status = status
+                item.error = error
+                item.finished_at = time.time()
+                self._save()
+            self._changed(item)
@@ -0,0 +1,203 @@
+"""
+Post-processing (ffmpeg merge / audio extraction) off the download threads
+A YoutubeDL normally runs its ffmpeg steps inline, so a transcode blocks the
+next network fetch. PipelinedYoutubeDL hands the post_process stage of every
+download to a shared executor sized to the CPU cores instead, and the
+download thread moves on while ffmpeg works.
+"""
+
+import os
+import copy
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from yt_dlp.postprocessor import MoveFilesAfterDownloadPP
+
+from cancellation import DownloadCancelled, active_token, remove_unfinished_download
+from job_journal import JournaledYoutubeDL
+
+# Every worker drives one ffmpeg child process at a time, so this bounds
+# the number of concurrent transcodes to the number of cores
+FFMPEG_WORKERS = os.cpu_count() or 2
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Get the process-wide post-processing executor"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=FFMPEG_WORKERS, thread_name_prefix='ffmpeg')
+        return _executor
+
+
+class PostProcessQueue:
+    """
+    Post-processing deferred by one job. Pass it as the 'postprocess_queue'
+    option, then wait() for the results or chain a callback with then().
+    """
+
+    def __init__(self, executor=None):
+        self.executor = executor or get_executor()
+        self._lock = threading.Lock()
+        self._futures = []
+
+    def submit(self, fn, *args):
+        future = self.executor.submit(fn, *args)
+        with self._lock:
+            self._futures.append(future)
+        return future
+
+    @property
+    def pending(self):
+        with self._lock:
+            return sum(1 for future in self._futures if not future.done())
+
+    def wait(self):
+        """Block until every task is done, returns their info dicts (raises the first error)"""
+        with self._lock:
+            futures = list(self._futures)
+        return [future.result() for future in futures]
+
+    def then(self, callback):
+        """
+        Future resolved with callback(tasks) once every task submitted so far is
+        done, `tasks` being their (finished) futures
+        """
+        with self._lock:
+            futures = list(self._futures)
+        chained = Future()
+        remaining = [len(futures)]
+        remaining_lock = threading.Lock()
+
+        def finish():
+            try:
+                chained.set_result(callback(futures))
+            except Exception as e:
+                chained.set_exception(e)
+
+        def on_done(_):
+            with remaining_lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                finish()
+
+        if not futures:
+            finish()
+        for future in futures:
+            future.add_done_callback(on_done)
+        return chained
+
+
+class PipelinedYoutubeDL(JournaledYoutubeDL):
+    """
+    YoutubeDL that defers its post_process stage (merge, FFmpegExtractAudio,
+    moving the final file) to the 'postprocess_queue' option when one is set.
+    Post hooks are called by the deferred task with the final file path, and
+    the download archive is only written once that file exists. The deferred
+    tasks run against this instance, so it must not serve another job (and its
+    logger and options must stay) until they are done: see when_idle().
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._deferred_lock = threading.Lock()
+        self._deferred = set()
+        self._idle_callbacks = []
+
+    def when_idle(self, callback):
+        """Call callback() once every post-processing task deferred by this instance is done (now if there is none)"""
+        with self._deferred_lock:
+            if self._deferred:
+                self._idle_callbacks.append(callback)
+                return
+        callback()
+
+    def _deferred_done(self, future):
+        with self._deferred_lock:
+            self._deferred.discard(future)
+            if self._deferred:
+                return
+            callbacks, self._idle_callbacks = self._idle_callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def process_info(self, info_dict):
+        # post_process() takes the post hooks for the deferred task, put them back for the next entry
+        post_hooks = self._post_hooks
+        try:
+            return super().process_info(info_dict)
+        finally:
+            self._post_hooks = post_hooks
+
+    def post_process(self, filename, info, files_to_move=None):
+        queue = self.params.get('postprocess_queue')
+        token = self.params.get('cancel_token')
+        if queue is None:
+            with active_token(token):
+                return super().post_process(filename, info, files_to_move)
+
+        # Snapshot what belongs to this download, the instance is reused right away
+        def snapshot(pp):
+            clone = copy.copy(pp)
+            clone._progress_hooks = list(pp._progress_hooks)
+            return clone
+
+        post_process_pps = [snapshot(pp) for pp in (info.get('__postprocessors') or []) + self._pps['post_process']]
+        after_move_pps = [snapshot(pp) for pp in self._pps['after_move']]
+        post_hooks, self._post_hooks = self._post_hooks, []
+
+        future = queue.submit(self._deferred_post_process, filename, dict(info), dict(files_to_move or {}),
+                              post_process_pps, after_move_pps, post_hooks, token)
+        with self._deferred_lock:
+            self._deferred.add(future)
+        future.add_done_callback(self._deferred_done)
+        info['filepath'] = filename
+        return info
+
+    def _deferred_post_process(self, filename, info, files_to_move, post_process_pps, after_move_pps, post_hooks,
+                               token=None):
+        """Same steps as YoutubeDL.post_process, run on the executor"""
+        info['filepath'] = filename
+        info['__files_to_move'] = files_to_move
+        with active_token(token):
+            try:
+                for pp in post_process_pps:
+                    if token is not None:
+                        token.raise_if_cancelled()
+                    info = self.run_pp(pp, info)
+                info = self.run_pp(MoveFilesAfterDownloadPP(self), info)
+                del info['__files_to_move']
+                for pp in after_move_pps:
+                    info = self.run_pp(pp, info)
+            except BaseException as e:
+                if token is None or not token.cancelled:
+                    raise
+                remove_unfinished_download(info)
+                if isinstance(e, DownloadCancelled):
+                    raise
+                raise DownloadCancelled() from e
+
+        for hook in post_hooks:
+            hook(info['filepath'])
+        self._archive_download(info)
+        return info
+
+    def record_download_archive(self, info_dict):
+        if self.params.get('postprocess_queue') is not None:
+            return  # _deferred_post_process records it with the final file
+        self._archive_download(info_dict)
+
+    def _archive_download(self, info):
+        """Archives that keep details (DownloadArchive views) also get the output path and format"""
+        record = getattr(self.archive, 'record', None)
+        if record is None or self.params.get('download_archive') is None:
+            return super().record_download_archive(info)
+        archive_id = self._make_archive_id(info)
+        if archive_id:
+            filepath = info.get('filepath')
+            record(archive_id, filepath=filepath and os.path.abspath(filepath), format_id=info.get('format_id'),
+                   title=info.get('title'))
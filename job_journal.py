@@ -0,0 +1,485 @@
+"""
+Job journal for resumable downloads
+Every media download is appended to a small JSON-lines file when it starts
+(URL, the format IDs picked, the output path and the options that shape the
+result), then as its bytes come in and when it ends. After a crash the open
+entries still point at their .part files, and downloading the same formats
+to the same path again lets yt-dlp continue them with HTTP range requests.
+Shared by the CLI, the GUI and the web app.
+"""
+
+import os
+import glob
+import json
+import time
+import uuid
+import socket
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from app_paths import get_app_path
+from cancellation import CancellableYoutubeDL
+
+# Seconds between two progress records of the same download
+DEFAULT_PROGRESS_INTERVAL = 5.0
+
+# The file is rewritten with only the open entries once it grows past this
+DEFAULT_COMPACT_BYTES = 1024 * 1024
+
+# Open entries without partial files are dropped on compaction after this many seconds
+STALE_AFTER = 24 * 60 * 60
+
+# Options recorded with a download, so a resume produces the same files
+RESUME_OPTIONS = ('postprocessors', 'merge_output_format', 'final_ext', 'cookiefile', 'cookiesfrombrowser')
+
+
+def get_journal_path():
+    """Get the journal path (same base folder as the GUI config)"""
+    return get_app_path("journal.jsonl")
+
+
+def get_job_url(info):
+    """The URL a download can be started again from"""
+    return info.get('webpage_url') or info.get('original_url') or info.get('url')
+
+
+def get_partial_size(filename):
+    """Bytes kept on disk for an unfinished download of `filename`, None when nothing is left"""
+    # The .ytdl file only holds the fragment state of a DASH / HLS download
+    size = 0 if os.path.exists(f'{filename}.ytdl') else None
+    for path in [f'{filename}.part'] + glob.glob(f'{glob.escape(filename)}.part-Frag*'):
+        try:
+            size = (size or 0) + os.path.getsize(path)
+        except OSError:
+            continue
+    return size
+
+
+def _lock_file(f):
+    """Take an exclusive lock on an open file without waiting (raises OSError when another holder has it)"""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+
+
+def _pid_alive(pid):
+    """Whether a process with this id runs on this machine (always True where that can't be checked safely)"""
+    if fcntl is None:
+        return True  # os.kill would terminate the process on Windows
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def get_resume_options(download):
+    """
+    yt-dlp options that continue an interrupted download (from JobJournal.interrupted()):
+    the same formats written to the same names, so the .part files are picked up
+    """
+    options = dict(download.get('options') or {})
+    if options.get('cookiesfrombrowser'):
+        options['cookiesfrombrowser'] = tuple(options['cookiesfrombrowser'])
+    folder, name = os.path.split(download['output'])
+    return {
+        **options,
+        'format': download['format'],
+        'paths': {'home': folder},
+        'outtmpl': os.path.splitext(name)[0].replace('%', '%%') + '.%(ext)s',
+        'noplaylist': True,
+        'continuedl': True,
+    }
+
+
+class JobJournal:
+    """
+    Append-only record of the downloads in progress.
+    Several processes can append to the same file; each one reads it once when
+    it opens it and keeps its own view of the open entries after that. Every
+    entry names its owner (host and pid) and holds a lock file while its
+    download runs, so downloads still running elsewhere are never taken for
+    interrupted ones.
+    """
+
+    def __init__(self, path=None, progress_interval=DEFAULT_PROGRESS_INTERVAL, compact_bytes=DEFAULT_COMPACT_BYTES):
+        self.path = path or get_journal_path()
+        self.progress_interval = progress_interval
+        self.lock_dir = os.path.join(os.path.dirname(os.path.abspath(self.path)), 'locks')
+        os.makedirs(self.lock_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._jobs = {}  # job id -> start record (with the latest 'bytes' / 'total') of every open entry
+        self._last_progress = {}  # job id -> time of its last progress record
+        self._held = {}  # job id -> open (locked) lock file of the downloads running in this process
+        self._file = None
+        self._load(compact_bytes)
+
+    def _load(self, compact_bytes):
+        lines = 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        self._apply(json.loads(line))
+                    except (ValueError, KeyError, TypeError, AttributeError):
+                        continue  # a line cut short by a crash
+        except OSError:
+            pass
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if size > compact_bytes or (lines and not self._jobs):
+            self._compact()
+        self._open()
+
+    def _apply(self, record):
+        event, job_id = record['event'], record['job']
+        if event == 'start':
+            self._jobs[job_id] = record
+        elif event == 'progress' and job_id in self._jobs:
+            self._jobs[job_id]['bytes'] = record.get('bytes')
+            if record.get('total'):
+                self._jobs[job_id]['total'] = record['total']
+        elif event == 'error' and job_id in self._jobs:
+            self._jobs[job_id]['error'] = record.get('error')
+        elif event == 'end':
+            self._jobs.pop(job_id, None)
+
+    def _compact(self):
+        """Rewrite the file with one line per open entry (drops finished and long dead ones)"""
+        now = time.time()
+        self._jobs = {
+            job_id: job for job_id, job in self._jobs.items()
+            if get_partial_size(job['filename']) is not None or now - job.get('started_at', 0) < STALE_AFTER
+            or self.is_running(job)
+        }
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for job in self._jobs.values():
+                    f.write(json.dumps(job, default=str) + '\n')
+            os.replace(tmp_path, self.path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _open(self):
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._inode = os.fstat(self._file.fileno()).st_ino
+
+    def _write(self, record):
+        """Append one line (caller holds the lock)"""
+        if self._file is None:
+            return
+        try:
+            if os.stat(self.path).st_ino != self._inode:
+                # Another process compacted the file, append to the new one
+                self._file.close()
+                self._open()
+        except OSError:
+            pass
+        self._file.write(json.dumps(record, default=str) + '\n')
+        self._file.flush()
+
+    def begin(self, url, filename, output, format_id=None, pinned_format=None, format_spec=None, options=None,
+              title=None, run=None):
+        """
+        Record a download of `filename` (final file `output`) starting, returns its job id.
+        Open entries for the same URL and output from an earlier run are closed, this one replaces them.
+        """
+        job = {
+            'event': 'start',
+            'job': uuid.uuid4().hex,
+            'run': run,
+            'url': url,
+            'title': title,
+            'filename': os.path.abspath(filename),
+            'output': os.path.abspath(output),
+            'format_id': format_id,
+            'format': pinned_format or format_id,
+            'format_spec': format_spec,
+            'options': options or {},
+            'started_at': time.time(),
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+        }
+        stem = os.path.splitext(job['output'])[0]
+        with self._lock:
+            for old_id, old in list(self._jobs.items()):
+                if (old['url'] == url and old.get('run') != run
+                        and os.path.splitext(old['output'])[0] == stem and not self.is_running(old)):
+                    self._end(old_id, 'superseded')
+            self._jobs[job['job']] = job
+            self._hold(job['job'])
+            self._write(job)
+        return job['job']
+
+    def _lock_path(self, job_id):
+        return os.path.join(self.lock_dir, f'{job_id}.lock')
+
+    def _hold(self, job_id):
+        """Lock the entry for as long as its download runs in this process (caller holds the lock)"""
+        try:
+            f = open(self._lock_path(job_id), 'a+')
+        except OSError:
+            return
+        try:
+            _lock_file(f)
+        except OSError:
+            f.close()
+            return
+        self._held[job_id] = f
+
+    def _release(self, job_id):
+        """Drop the lock file of an ended entry, unless its download still runs somewhere (caller holds the lock)"""
+        f = self._held.pop(job_id, None)
+        if f is None:
+            try:
+                f = open(self._lock_path(job_id), 'a+')
+            except OSError:
+                return
+            try:
+                _lock_file(f)
+            except OSError:
+                f.close()
+                return
+        f.close()
+        try:
+            os.remove(self._lock_path(job_id))
+        except OSError:
+            pass
+
+    def is_running(self, job):
+        """Whether the download of an open entry is still going on (here or in another process)"""
+        if job['job'] in self._held:
+            return True
+        lock_path = self._lock_path(job['job'])
+        if not os.path.exists(lock_path):
+            # No lock was taken for it: go by its owner
+            if job.get('host') != socket.gethostname() or not job.get('pid'):
+                return False
+            return job['pid'] != os.getpid() and _pid_alive(job['pid'])
+        try:
+            with open(lock_path, 'a+') as f:
+                _lock_file(f)
+        except OSError:
+            return True  # its owner still holds the lock
+        return False
+
+    def progress(self, job_id, downloaded_bytes, total_bytes=None):
+        """Record the bytes written so far (at most once per progress_interval per download)"""
+        now = time.monotonic()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or now - self._last_progress.get(job_id, 0) < self.progress_interval:
+                return
+            self._last_progress[job_id] = now
+            job['bytes'] = downloaded_bytes
+            if total_bytes:
+                job['total'] = total_bytes
+            self._write({'event': 'progress', 'job': job_id, 'bytes': downloaded_bytes, 'total': total_bytes})
+
+    def finish(self, job_id, status='finished'):
+        """Close an entry (finished, or cancelled with its files deleted)"""
+        with self._lock:
+            self._end(job_id, status)
+
+    def fail(self, job_id, error=None):
+        """
+        Mark an entry whose download stopped on an error. It stays open, so downloading
+        the same URL again still continues it, but interrupted() no longer offers it.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job['error'] = error or 'failed'
+            self._last_progress.pop(job_id, None)
+            self._release(job_id)
+            self._write({'event': 'error', 'job': job_id, 'error': job['error']})
+
+    def end_interrupted(self, url, output, status='abandoned'):
+        """Close the open entries of an interrupted download (as returned by interrupted()) nobody will continue"""
+        stem = os.path.splitext(os.path.abspath(output))[0]
+        with self._lock:
+            for job_id, job in list(self._jobs.items()):
+                if (job['url'] == url and os.path.splitext(job['output'])[0] == stem
+                        and not self.is_running(job)):
+                    self._end(job_id, status)
+
+    def _end(self, job_id, status):
+        if self._jobs.pop(job_id, None) is None:
+            return
+        self._last_progress.pop(job_id, None)
+        self._release(job_id)
+        self._write({'event': 'end', 'job': job_id, 'status': status})
+
+    def find_interrupted(self, url, filename, format_spec):
+        """Open entry left by an earlier run of the same request (same URL, output and format choice)"""
+        stem = os.path.splitext(os.path.abspath(filename))[0]
+        with self._lock:
+            candidates = [
+                job for job in self._jobs.values()
+                if job['url'] == url and job.get('format_spec') == format_spec
+                and os.path.splitext(job['output'])[0] == stem
+            ]
+        for job in reversed(candidates):
+            if get_partial_size(job['filename']) is not None and not self.is_running(job):
+                return job
+        return None
+
+    def interrupted(self):
+        """
+        Downloads that stopped half way and can be continued, one per output file
+        (downloads still running, in this process or another one, and downloads
+        that failed with an error are left out):
+        dicts with url, title, output, format, options, bytes (kept on disk) and total
+        """
+        with self._lock:
+            jobs = list(self._jobs.values())
+        downloads = {}
+        for job in jobs:
+            if job.get('error'):
+                continue
+            size = get_partial_size(job['filename'])
+            if size is None or self.is_running(job):
+                continue
+            key = (job['url'], job['output'])
+            download = downloads.get(key)
+            if download is None:
+                download = downloads[key] = {
+                    'url': job['url'],
+                    'title': job.get('title'),
+                    'output': job['output'],
+                    'format': job['format'],
+                    'options': job.get('options') or {},
+                    'bytes': 0,
+                    'total': 0,
+                    'started_at': job.get('started_at'),
+                }
+            download['bytes'] += size
+            download['total'] += job.get('total') or 0
+        return sorted(downloads.values(), key=lambda download: download['started_at'] or 0)
+
+    def close(self):
+        with self._lock:
+            for f in self._held.values():
+                f.close()
+            self._held.clear()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_default_journal = None
+_default_journal_lock = threading.Lock()
+
+
+def get_default_journal():
+    """Get the process-wide journal shared by every caller"""
+    global _default_journal
+    with _default_journal_lock:
+        if _default_journal is None:
+            _default_journal = JobJournal()
+        return _default_journal
+
+
+class JournaledYoutubeDL(CancellableYoutubeDL):
+    """
+    YoutubeDL that records its downloads in the job journal ('job_journal'
+    option: a JobJournal, True for the default one, False to turn it off).
+    When a request is made again after an interruption, the formats picked
+    the first time are downloaded again, so the .part files can be continued.
+    """
+
+    _journal_request = None
+
+    @property
+    def job_journal(self):
+        journal = self.params.get('job_journal', True)
+        if journal is True:
+            return get_default_journal()
+        return journal or None
+
+    def process_video_result(self, info_dict, download=True):
+        if not download or self.params.get('simulate') or self.params.get('skip_download'):
+            return super().process_video_result(info_dict, download)
+        journal = self.job_journal
+        if journal is None:
+            return super().process_video_result(info_dict, download)
+
+        job = journal.find_interrupted(get_job_url(info_dict), self.prepare_filename(info_dict),
+                                       self.params.get('format'))
+        available = {f.get('format_id') for f in info_dict.get('formats') or [info_dict]}
+        if job is None or not set(job['format'].split('+')) <= available:
+            return super().process_video_result(info_dict, download)
+
+        # The selection could pick other formats now (new streams, another client), keep the ones on disk
+        self.to_screen(f"[journal] Continuing the interrupted download of format {job['format']}")
+        format_selector = self.format_selector
+        self.format_selector = self.build_format_selector(job['format'])
+        try:
+            return super().process_video_result(info_dict, download)
+        finally:
+            self.format_selector = format_selector
+
+    def process_info(self, info_dict):
+        if self.params.get('simulate') or self.params.get('skip_download') or self.job_journal is None:
+            return super().process_info(info_dict)
+        requested = info_dict.get('requested_formats')
+        self._journal_request = {
+            'run': uuid.uuid4().hex,
+            'url': get_job_url(info_dict),
+            'title': info_dict.get('title'),
+            'pinned_format': '+'.join(f['format_id'] for f in requested) if requested else info_dict.get('format_id'),
+            'format_spec': self.params.get('format'),
+            'options': {key: self.params[key] for key in RESUME_OPTIONS if self.params.get(key) is not None},
+        }
+        try:
+            return super().process_info(info_dict)
+        finally:
+            self._journal_request = None
+
+    def dl(self, name, info, subtitle=False, test=False):
+        journal = self.job_journal
+        request = self._journal_request
+        if journal is None or request is None or subtitle or test or name == '-':
+            return super().dl(name, info, subtitle, test)
+
+        job_id = journal.begin(filename=name, output=info.get('_filename') or name, format_id=info.get('format_id'),
+                               **request)
+
+        def record_progress(d):
+            if d.get('status') == 'downloading' and d.get('downloaded_bytes') is not None:
+                journal.progress(job_id, d['downloaded_bytes'], d.get('total_bytes') or d.get('total_bytes_estimate'))
+
+        self._progress_hooks.append(record_progress)
+        try:
+            success, real_download = super().dl(name, info, subtitle, test)
+        except BaseException as e:
+            token = self.params.get('cancel_token')
+            if token is not None and token.cancelled:
+                journal.finish(job_id, 'cancelled')  # its partial files are deleted
+            elif isinstance(e, Exception):
+                journal.fail(job_id, str(e))
+            raise  # otherwise (crash, Ctrl+C) left open for interrupted(), the .part file can be continued
+        finally:
+            self._progress_hooks.remove(record_progress)
+        if success:
+            journal.finish(job_id)
+        else:
+            journal.fail(job_id)
+        return success, real_download
@@ -0,0 +1,169 @@
+"""
+Background job queue for the web app
+Long running downloads are submitted here and run on a bounded pool of
+worker threads, HTTP handlers only enqueue jobs and report their status
+"""
+
+import time
+import uuid
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_PENDING = 100
+DEFAULT_KEEP_FINISHED = 3600  # seconds a finished job stays queryable
+
+
+class QueueFullError(Exception):
+    """Raised when too many jobs are already waiting"""
+
+
+class Job:
+    """A single unit of work and its externally visible state"""
+
+    def __init__(self, func, args, kwargs, key=None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+        self.status = 'queued'  # queued -> running -> finished / error
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+        # Bumped on every change so watchers can tell if they are up to date
+        self.version = 0
+        self.lock = threading.Lock()
+        self._changed = threading.Condition(self.lock)
+
+    def _touch(self):
+        self.version += 1
+        self.updated_at = time.time()
+        self._changed.notify_all()
+
+    def update(self, **progress):
+        """Merge new progress values (called from the worker thread)"""
+        with self.lock:
+            self.progress.update(progress)
+            self._touch()
+
+    def set_status(self, status, result=None, error=None):
+        with self.lock:
+            self.status = status
+            self.result = result
+            self.error = error
+            self._touch()
+
+    def wait_for_update(self, version, timeout=None):
+        """Block until the job changes past `version` (or timeout), returns the current version"""
+        with self.lock:
+            if self.version == version and not self.done:
+                self._changed.wait(timeout)
+            return self.version
+
+    @property
+    def done(self):
+        return self.status in ('finished', 'error')
+
+    def to_dict(self):
+        with self.lock:
+            data = {
+                'job_id': self.id,
+                'status': self.status,
+                'progress': dict(self.progress),
+                'created_at': self.created_at,
+                'updated_at': self.updated_at,
+            }
+            if self.status == 'finished' and self.result:
+                data.update(self.result)
+            if self.status == 'error':
+                data['error'] = self.error
+            return data
+
+
+class JobQueue:
+    """
+    Run submitted jobs on `workers` threads, at most `max_pending` waiting at once.
+    Jobs submitted with the same `key` share one Job while it is in flight, and
+    afterwards for as long as `reuse_finished(job)` says its result is still valid.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING, keep_finished=DEFAULT_KEEP_FINISHED,
+                 reuse_finished=None):
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+        self.reuse_finished = reuse_finished
+
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._by_key = {}
+        self._pending = 0
+
+    def submit(self, func, *args, key=None, **kwargs):
+        """
+        Queue func(job, *args, **kwargs) and return the Job right away (or the existing one for `key`).
+        func may return a Future, the job then finishes when that future does.
+        """
+        with self._lock:
+            self._prune()
+            if key:
+                existing = self._by_key.get(key)
+                if existing and self._reusable(existing):
+                    return existing
+
+            if self._pending >= self.max_pending:
+                raise QueueFullError("Too many downloads in progress, try again later")
+            job = Job(func, args, kwargs, key=key)
+            self._pending += 1
+            self._jobs[job.id] = job
+            if key:
+                self._by_key[key] = job
+
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job):
+        with self._lock:
+            self._pending -= 1
+        job.set_status('running')
+        try:
+            result = job.func(job, *job.args, **job.kwargs)
+        except Exception as e:
+            job.set_status('error', error=str(e))
+            return
+
+        if isinstance(result, Future):
+            # The rest of the work runs elsewhere (e.g. the ffmpeg pool), this worker is free again
+            result.add_done_callback(lambda future: self._complete(job, future))
+        else:
+            job.set_status('finished', result=result)
+
+    def _complete(self, job, future):
+        try:
+            job.set_status('finished', result=future.result())
+        except Exception as e:
+            job.set_status('error', error=str(e))
+
+    def _reusable(self, job):
+        if not job.done:
+            return True
+        if job.status != 'finished':
+            return False
+        return self.reuse_finished is None or self.reuse_finished(job)
+
+    def _prune(self):
+        """Forget finished jobs nobody asked about for a while"""
+        cutoff = time.time() - self.keep_finished
+        for job in [j for j in self._jobs.values() if j.done and j.updated_at < cutoff]:
+            del self._jobs[job.id]
+            if job.key and self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
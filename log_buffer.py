@@ -0,0 +1,108 @@
+"""
+Bounded log buffer for the GUI
+Keeps the last `capacity` lines in a ring, drops lines below the display
+level before they are queued, and can spill every line to a file so the
+full history survives even though the log view only shows the tail.
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+
+# Lines kept in the log view
+DEFAULT_LOG_CAPACITY = 2000
+
+LEVELS = {
+    'DEBUG': logging.DEBUG,
+    'INFO': logging.INFO,
+    'WARNING': logging.WARNING,
+    'ERROR': logging.ERROR,
+}
+
+
+def get_level(name, default=logging.INFO):
+    """Level number for a name like 'INFO' (unknown names give `default`)"""
+    return LEVELS.get(str(name or '').upper(), default)
+
+
+class LogRingBuffer:
+    """
+    append() is safe from any thread; the Tk thread calls take_pending() once
+    per tick and writes the result to the widget in one insert.
+    """
+
+    def __init__(self, capacity=DEFAULT_LOG_CAPACITY, level=logging.INFO, spill_path=None,
+                 spill_level=logging.DEBUG):
+        self.capacity = capacity
+        self.level = level
+        self.spill_level = spill_level
+
+        self._lock = threading.Lock()
+        self._lines = deque(maxlen=capacity)
+        self._pending = deque(maxlen=capacity)
+        self._overflowed = False
+        self._spill = None
+        self._spill_dirty = False
+        if spill_path:
+            self.set_spill_path(spill_path)
+
+    def append(self, message, level=logging.INFO):
+        """Queue a line for the view (if at or above the display level) and the spill file"""
+        with self._lock:
+            if self._spill is not None and level >= self.spill_level:
+                stamp = time.strftime('%Y-%m-%d %H:%M:%S')
+                self._spill.write(f"{stamp} {logging.getLevelName(level):<7} {message}\n")
+                self._spill_dirty = True
+            if level < self.level:
+                return False
+            if len(self._pending) == self.capacity:
+                # More than a whole view since the last flush, the widget gets rebuilt
+                self._overflowed = True
+            self._lines.append(message)
+            self._pending.append(message)
+            return True
+
+    def take_pending(self):
+        """
+        (lines, replace): the lines added since the last call, and whether they
+        replace the view entirely because older pending lines already fell out of the ring
+        """
+        with self._lock:
+            lines = list(self._pending)
+            replace = self._overflowed
+            self._pending.clear()
+            self._overflowed = False
+            if self._spill_dirty:
+                self._spill.flush()
+                self._spill_dirty = False
+        return lines, replace
+
+    def lines(self):
+        """Snapshot of the lines currently in the ring, oldest first"""
+        with self._lock:
+            return list(self._lines)
+
+    def clear(self):
+        """Empty the view (the spill file keeps its history)"""
+        with self._lock:
+            self._lines.clear()
+            self._pending.clear()
+            self._overflowed = False
+
+    def set_level(self, level):
+        with self._lock:
+            self.level = level
+
+    def set_spill_path(self, path):
+        """Start appending every line to `path` (None stops)"""
+        with self._lock:
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+            if path:
+                self._spill = open(path, 'a', encoding='utf-8')
+            self._spill_dirty = False
+
+    def close(self):
+        self.set_spill_path(None)
@@ -0,0 +1,210 @@
+"""
+Shared metadata cache for yt-dlp extract_info results
+Used by the CLI, the GUI and the web app so repeated lookups of the
+same video are answered locally instead of hitting the extractor again
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import yt_dlp
+from yt_dlp.networking.exceptions import HTTPError
+
+import ydl_pool
+from app_paths import get_app_path
+from disk_lru import DiskLRU
+
+# Stream URLs inside an info dict expire after a few hours, keep well below that
+DEFAULT_TTL = 3600
+DEFAULT_MAX_ENTRIES = 2000
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_HOT_ENTRIES = 64
+
+# What a stream URL from an old probe answers once it has expired or was revoked
+EXPIRED_STATUSES = (403, 410)
+
+
+def get_cache_dir():
+    """Get the on-disk metadata cache folder (same base folder as the GUI config)"""
+    return get_app_path("cache", "metadata")
+
+
+class MetadataCache:
+    """
+    Two tier cache of info dicts keyed by a string (usually the video ID).
+    The hot tier keeps serialized entries in memory, the disk tier stores one
+    file per key and is bounded by entry count and total size (LRU eviction).
+    """
+
+    def __init__(self, cache_dir=None, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES, hot_entries=DEFAULT_HOT_ENTRIES):
+        self.cache_dir = cache_dir or get_cache_dir()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hot_entries = hot_entries
+
+        self._lock = threading.Lock()
+        self._hot = OrderedDict()  # key -> (stored_at, info json text)
+        self._disk = DiskLRU(self.cache_dir, '.json', max_entries, max_bytes)
+
+    def _file_for(self, key):
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json'
+        return name, os.path.join(self.cache_dir, name)
+
+    def _remember_hot(self, key, stored_at, text):
+        self._hot[key] = (stored_at, text)
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.hot_entries:
+            self._hot.popitem(last=False)
+
+    def get(self, key):
+        """Return a fresh copy of the cached info dict, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            hot = self._hot.get(key)
+            if hot:
+                stored_at, text = hot
+                if now - stored_at < self.ttl:
+                    self._hot.move_to_end(key)
+                    return json.loads(text)
+                del self._hot[key]
+
+            name, path = self._file_for(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    size = os.fstat(f.fileno()).st_size
+                    header = json.loads(f.readline())
+                    text = f.read()
+            except (OSError, ValueError):
+                return None
+
+            if header.get('key') != key or now - header.get('stored_at', 0) >= self.ttl:
+                self._disk.discard(name)
+                return None
+
+            self._disk.touch(name, size)
+            self._remember_hot(key, header['stored_at'], text)
+
+        return json.loads(text)
+
+    def put(self, key, info):
+        """Store an info dict (sanitized so it is JSON serializable)"""
+        if not key or not info:
+            return
+        text = json.dumps(yt_dlp.YoutubeDL.sanitize_info(info))
+        stored_at = time.time()
+        header = json.dumps({'key': key, 'stored_at': stored_at})
+
+        with self._lock:
+            name, path = self._file_for(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(header + "\n")
+                    f.write(text)
+                os.replace(tmp_path, path)
+            except OSError:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                return
+
+            self._disk.touch(name, os.path.getsize(path))
+            self._remember_hot(key, stored_at, text)
+            self._disk.evict(keep=name)
+
+    def invalidate(self, key):
+        """Drop a single entry from both tiers"""
+        with self._lock:
+            self._hot.pop(key, None)
+            self._disk.discard(self._file_for(key)[0])
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._hot.clear()
+            self._disk.clear()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """Get the process-wide cache shared by every caller"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = MetadataCache()
+        return _default_cache
+
+
+def extract_info_cached(url, ydl_opts, key=None, cache=None):
+    """
+    Same as YoutubeDL(ydl_opts).extract_info(url, download=False), but answered
+    from the cache when `key` is known. Results are stored sanitized.
+    """
+    cache = cache or get_default_cache()
+    if key:
+        info = cache.get(key)
+        if info is not None:
+            return info
+
+    with ydl_pool.checkout(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+        if not info:
+            return None
+        info = ydl.sanitize_info(info)
+
+    if key:
+        cache.put(key, info)
+    return info
+
+
+def prepare_info_for_download(info):
+    """
+    Strip the per-run fields (requested formats, file names...) from a probed
+    info dict so it can be fed back into YoutubeDL.process_ie_result
+    """
+    entries = info.get('entries')
+    info = yt_dlp.YoutubeDL.sanitize_info(info, remove_private_keys=True)
+    if entries is not None:
+        info['entries'] = [
+            yt_dlp.YoutubeDL.sanitize_info(entry, remove_private_keys=True) if entry else entry
+            for entry in entries
+        ]
+    return info
+
+
+def is_stale_info_error(error):
+    """
+    Whether a DownloadError means the probed info went stale (stream URL expired
+    or revoked), as opposed to a failure a new extraction would not fix
+    (post-processing, disk full, ...)
+    """
+    cause = error.exc_info[1] if error.exc_info else None
+    if isinstance(cause, HTTPError):
+        return cause.status in EXPIRED_STATUSES
+    return isinstance(cause, yt_dlp.utils.ExtractorError)
+
+
+def download_with_info(ydl, url, info=None):
+    """
+    Download `url` with an existing YoutubeDL, reusing the info dict from an
+    earlier probe when given so the extractor only runs once per job.
+    Falls back to a fresh extraction if the probed stream URLs no longer work.
+    """
+    if info:
+        try:
+            return ydl.process_ie_result(prepare_info_for_download(info), download=True)
+        except yt_dlp.utils.DownloadError as e:
+            if not is_stale_info_error(e):
+                raise
+            ydl.report_warning(f"Cached info failed to download: {e}; extracting again")
+    return ydl.extract_info(url, download=True)
@@ -0,0 +1,381 @@
+"""
+Concurrent playlist download engine
+Expands a playlist with a flat extraction, then downloads the entries over
+a bounded pool of workers instead of strictly one after another
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import yt_dlp
+
+import metadata_cache
+import ydl_pool
+from ffmpeg_pool import PostProcessQueue
+from rate_limiter import HostSlots, DEFAULT_PER_HOST_LIMIT
+
+DEFAULT_WORKERS = 4
+# A sync stops paging after this many archived entries in a row
+DEFAULT_SYNC_STOP_AFTER = 1
+
+
+def select_entries(info, playlist_items=None):
+    """
+    Pair the entries of a flat playlist info dict with their 1-based playlist
+    index, keeping only the items requested by a yt-dlp style spec ("1,3,5-10")
+    """
+    entries = list(info.get('entries') or [])
+    indices = info.get('requested_entries') or range(1, len(entries) + 1)
+    indexed = [(index, entry) for index, entry in zip(indices, entries) if entry]
+
+    if not playlist_items:
+        return indexed
+
+    wanted = parse_playlist_items(playlist_items, max(indices, default=0))
+    return [(index, entry) for index, entry in indexed if index in wanted]
+
+
+def parse_playlist_items(playlist_items, count):
+    """Set of 1-based indices picked by a yt-dlp style spec ("1,3,5-10", "-5:") in a list of `count`"""
+    wanted = set()
+    for item in yt_dlp.utils.PlaylistEntries.parse_playlist_items(playlist_items):
+        if isinstance(item, slice):
+            start = item.start or 1
+            end = count if item.stop is None or item.stop == float('inf') else int(item.stop)
+            start = start + count + 1 if start < 0 else start
+            end = end + count + 1 if end < 0 else end
+            step = item.step or 1
+            wanted.update(range(start, end + 1, step) if step > 0 else range(start, end - 1, step))
+        else:
+            wanted.add(item + count + 1 if item < 0 else item)
+    return {index for index in wanted if 1 <= index <= count}
+
+
+def format_playlist_items(indices):
+    """Shortest yt-dlp spec for sorted 1-based indices ([1, 2, 3, 7] -> "1-3,7")"""
+    parts = []
+    start = previous = None
+    for index in indices:
+        if previous is not None and index == previous + 1:
+            previous = index
+            continue
+        if start is not None:
+            parts.append(str(start) if start == previous else f"{start}-{previous}")
+        start = previous = index
+    if start is not None:
+        parts.append(str(start) if start == previous else f"{start}-{previous}")
+    return ",".join(parts)
+
+
+class SelectionBitset:
+    """Selected flags of a growing list of playlist entries, one bit per entry"""
+
+    def __init__(self):
+        self._bits = bytearray()
+        self.size = 0
+
+    def extend(self, count, selected=True):
+        """Append `count` entries"""
+        for index in range(self.size, self.size + count):
+            if index // 8 >= len(self._bits):
+                self._bits.append(0)
+            if selected:
+                self._bits[index // 8] |= 1 << (index % 8)
+        self.size += count
+
+    def __getitem__(self, index):
+        return bool(self._bits[index // 8] & (1 << (index % 8)))
+
+    def __setitem__(self, index, selected):
+        if selected:
+            self._bits[index // 8] |= 1 << (index % 8)
+        else:
+            self._bits[index // 8] &= ~(1 << (index % 8)) & 0xFF
+
+    def set_all(self, selected):
+        self._bits[:] = (b'\xff' if selected else b'\x00') * len(self._bits)
+        if selected and self.size % 8:
+            # Keep the bits past the end clear so count() stays exact
+            self._bits[-1] &= (1 << (self.size % 8)) - 1
+
+    def set_many(self, indices, selected):
+        for index in indices:
+            self[index] = selected
+
+    def count(self):
+        return int.from_bytes(self._bits, 'little').bit_count()
+
+    def selected(self):
+        """Selected positions (0-based), in order"""
+        return [index for index in range(self.size) if self[index]]
+
+    def to_playlist_items(self):
+        """yt-dlp 'playlist_items' spec of the selection (1-based)"""
+        return format_playlist_items(index + 1 for index in self.selected())
+
+
+def get_entry_archive_id(entry, info=None):
+    """yt-dlp archive ID of a flat playlist entry ("youtube <id>"), None when it can't be told"""
+    ie_key = entry.get('ie_key') or entry.get('extractor_key') or (info or {}).get('extractor_key')
+    if not ie_key or not entry.get('id'):
+        return None
+    return yt_dlp.utils.make_archive_id(ie_key, entry['id'])
+
+
+class PlaylistDownloader:
+    """
+    Download the entries of a playlist with a pool of `workers` threads,
+    with at most `per_host_limit` requests open against the same site
+    (googlevideo.com for the media of a YouTube playlist) at once.
+    `on_progress` is called with aggregated stats for the whole playlist.
+    Entries already in the 'download_archive' option are reported as
+    'archived' without being resolved.
+    """
+
+    def __init__(self, ydl_opts, workers=DEFAULT_WORKERS, per_host_limit=DEFAULT_PER_HOST_LIMIT, on_progress=None):
+        self.ydl_opts = ydl_opts
+        self.workers = max(1, workers)
+        self.per_host_limit = max(1, per_host_limit)
+        self.on_progress = on_progress
+
+        self._lock = threading.Lock()
+        self._host_slots = HostSlots(self.per_host_limit)
+        self._progress = {}  # (playlist index, file name) -> (downloaded, total, speed)
+        self._totals = [0, 0, 0]  # running sums of the values in _progress
+        self._done = 0
+        self._failed = 0
+        self._total = 0
+
+    def _probe_options(self):
+        probe_opts = {
+            key: value for key, value in self.ydl_opts.items()
+            if key not in ('progress_hooks', 'postprocessor_hooks', 'post_hooks', 'postprocessors', 'playlist_items')
+        }
+        probe_opts.update({
+            'quiet': True,
+            'extract_flat': 'in_playlist',
+            'skip_download': True,
+            'noplaylist': False,
+        })
+        return probe_opts
+
+    def expand(self, url, info=None):
+        """Get the flat playlist info (entries are listed but not resolved)"""
+        if info is not None:
+            return info
+
+        with ydl_pool.checkout(self._probe_options()) as ydl:
+            info = ydl.extract_info(url, download=False)
+            return ydl.sanitize_info(info) if info else None
+
+    def expand_new(self, url, stop_after=DEFAULT_SYNC_STOP_AFTER, max_entries=None, newest_first=True):
+        """
+        Get the flat playlist info with only the entries added since the last sync.
+        The listing is read lazily in its own order. When that order is newest first
+        (channel tabs, uploads playlists) paging stops after `stop_after` archived
+        entries in a row, so old pages are never requested; other listings
+        (regular playlists, oldest first) are walked to the end.
+        """
+        archive = self.ydl_opts.get('download_archive')
+        if archive is None or isinstance(archive, (str, os.PathLike)):
+            raise ValueError("Syncing needs a download archive object")
+
+        with ydl_pool.checkout(self._probe_options()) as ydl:
+            # process=False keeps the entries a lazy generator / paged list
+            info = ydl.extract_info(url, download=False, process=False)
+            while info and info.get('_type') in ('url', 'url_transparent'):
+                info = ydl.extract_info(info['url'], download=False, process=False, ie_key=info.get('ie_key'))
+            if not info:
+                return None
+
+            entries = info.get('entries')
+            new_entries = []
+            archived_in_a_row = 0
+            for entry in entries if entries is not None else []:
+                if not entry:
+                    continue
+                archive_id = get_entry_archive_id(entry, info)
+                if archive_id and archive_id in archive:
+                    archived_in_a_row += 1
+                    if newest_first and archived_in_a_row >= stop_after:
+                        break
+                    continue
+                archived_in_a_row = 0
+                new_entries.append(entry)
+                if max_entries and len(new_entries) >= max_entries:
+                    break
+            if hasattr(entries, 'close'):
+                entries.close()
+
+            playlist = ydl.sanitize_info({key: value for key, value in info.items() if key != 'entries'})
+            playlist['_type'] = 'playlist'
+            playlist['entries'] = [ydl.sanitize_info(entry) for entry in new_entries]
+            return playlist
+
+    def download(self, url, info=None, playlist_items=None):
+        """Download the playlist, returns one result dict per entry in playlist order"""
+        info = self.expand(url, info)
+        if not info:
+            return []
+
+        entries = select_entries(info, playlist_items)
+        archived = self._find_archived(entries, info)
+        playlist_extra = {
+            'playlist': info.get('title') or info.get('id'),
+            'playlist_id': info.get('id'),
+            'playlist_title': info.get('title'),
+            'playlist_uploader': info.get('uploader'),
+            'playlist_channel': info.get('channel'),
+            'playlist_count': info.get('playlist_count') or len(info.get('entries') or []),
+            'n_entries': len(entries),
+        }
+
+        with self._lock:
+            self._progress.clear()
+            self._totals = [0, 0, 0]
+            self._done = self._failed = 0
+            self._total = len(entries) - len(archived)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='playlist') as pool:
+            futures = [
+                pool.submit(self._download_entry, position, index, entry, playlist_extra)
+                for position, (index, entry) in enumerate(entries, 1)
+                if index not in archived
+            ]
+            # Each worker hands back a future for its entry's post-processing
+            finishing = [future.result() for future in futures]
+        results = [future.result() for future in finishing] + list(archived.values())
+        return sorted(results, key=lambda result: result['index'])
+
+    def _find_archived(self, entries, info):
+        """Results for the entries the download archive already has, by playlist index"""
+        archive = self.ydl_opts.get('download_archive')
+        # A file name is left to yt-dlp, only archive objects can be asked up front
+        if archive is None or isinstance(archive, (str, os.PathLike)):
+            return {}
+
+        archived = {}
+        for index, entry in entries:
+            result = self._archived_result(index, entry, get_entry_archive_id(entry, info))
+            if result:
+                archived[index] = result
+        return archived
+
+    def _archived_result(self, index, entry, archive_id):
+        """Result for an entry found in the download archive, None if it isn't there"""
+        archive = self.ydl_opts.get('download_archive')
+        if archive is None or isinstance(archive, (str, os.PathLike)) or not archive_id or archive_id not in archive:
+            return None
+        recorded = (archive.get(archive_id) if hasattr(archive, 'get') else None) or {}
+        return {
+            'index': index,
+            'id': entry.get('id'),
+            'title': entry.get('title') or recorded.get('title'),
+            'status': 'archived',
+            'filepath': recorded.get('filepath'),
+            'error': None,
+        }
+
+    def _download_entry(self, position, index, entry, playlist_extra):
+        entry_info = archive_id = None
+        result = {
+            'index': index,
+            'id': entry.get('id'),
+            'title': entry.get('title'),
+            'status': 'error',
+            'filepath': None,
+            'error': None,
+        }
+
+        def on_progress(d):
+            self._on_entry_progress(index, d)
+
+        def on_finished(filepath):
+            result['filepath'] = filepath
+
+        # ffmpeg steps run on the shared pool while this worker starts the next download
+        postprocessing = PostProcessQueue()
+
+        opts = dict(self.ydl_opts)
+        opts.pop('playlist_items', None)
+        opts.update({
+            'postprocess_queue': postprocessing,
+            'host_slots': self._host_slots,
+            'noplaylist': True,
+            # Failures are isolated per entry and reported in the result instead
+            'ignoreerrors': False,
+            'progress_hooks': list(opts.get('progress_hooks') or []) + [on_progress],
+            'post_hooks': list(opts.get('post_hooks') or []) + [on_finished],
+        })
+
+        try:
+            with ydl_pool.checkout(opts) as ydl:
+                extra = dict(playlist_extra, playlist_index=index, playlist_autonumber=position)
+                entry_info = ydl.process_ie_result(
+                    metadata_cache.prepare_info_for_download(entry), download=True, extra_info=extra)
+            if entry_info:
+                result['status'] = 'ok'
+                result['title'] = entry_info.get('title') or result['title']
+                result['id'] = entry_info.get('id') or result['id']
+                archive_id = get_entry_archive_id(entry_info)
+            else:
+                result['error'] = 'No information extracted'
+        except Exception as e:
+            result['error'] = str(e)
+
+        def finish(tasks):
+            for task in tasks:
+                if task.exception() and result['status'] == 'ok':
+                    result['status'] = 'error'
+                    result['error'] = str(task.exception())
+            # Entries that only tell their ID once resolved are skipped by yt-dlp itself
+            if result['status'] == 'ok' and not result['filepath'] and not tasks:
+                archived = self._archived_result(index, entry_info, archive_id)
+                if archived:
+                    result.update(archived)
+            self._entry_finished(result)
+            return result
+
+        return postprocessing.then(finish)
+
+    def _entry_finished(self, result):
+        with self._lock:
+            if result['status'] in ('ok', 'archived'):
+                self._done += 1
+            else:
+                self._failed += 1
+            stats = self._stats()
+        if self.on_progress:
+            self.on_progress(stats)
+
+    def _on_entry_progress(self, index, d):
+        key = (index, d.get('filename'))
+        if d['status'] == 'downloading':
+            total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+            record = (d.get('downloaded_bytes') or 0, total, d.get('speed') or 0)
+        elif d['status'] == 'finished':
+            size = d.get('total_bytes') or d.get('downloaded_bytes') or 0
+            record = (size, size, 0)
+        else:
+            return
+
+        with self._lock:
+            previous = self._progress.get(key, (0, 0, 0))
+            self._progress[key] = record
+            for i in range(3):
+                self._totals[i] += record[i] - previous[i]
+            stats = self._stats()
+        if self.on_progress:
+            self.on_progress(stats)
+
+    def _stats(self):
+        downloaded, total, speed = self._totals
+        return {
+            'entries_done': self._done,
+            'entries_failed': self._failed,
+            'entries_total': self._total,
+            'downloaded_bytes': downloaded,
+            'total_bytes': total,
+            'speed': max(speed, 0),
+        }
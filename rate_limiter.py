@@ -0,0 +1,238 @@
+"""
+Adaptive rate limiter for requests made through yt-dlp
+Requests go out without any delay until a site answers 429 / 403, then that
+site gets a token bucket whose rate is halved on every throttled response and
+raised step by step while responses are clean (AIMD). Once the rate is back
+at the ceiling the bucket is dropped and requests are unlimited again.
+A group of downloads can also share HostSlots, which caps how many of their
+requests are open against one site at the same time.
+"""
+
+import time
+import weakref
+import threading
+from urllib.parse import urlparse
+
+import yt_dlp
+from yt_dlp.networking.exceptions import HTTPError
+
+THROTTLE_STATUS = (429, 403)
+
+DEFAULT_START_RATE = 2.0   # requests/sec right after the first throttled response
+DEFAULT_MIN_RATE = 0.1
+DEFAULT_MAX_RATE = 20.0    # reaching this again lifts the limit
+DEFAULT_INCREASE = 0.25    # added to the rate per clean response
+DEFAULT_DECREASE = 0.5     # rate multiplier per throttled response
+DEFAULT_BURST = 4
+MAX_RETRY_AFTER = 120
+DEFAULT_PER_HOST_LIMIT = 3
+# Seconds between two cancel checks while waiting for a host slot
+SLOT_POLL_INTERVAL = 0.25
+
+
+def get_rate_key(url):
+    """Requests are grouped by site (googlevideo.com, not rr3---sn-xxx.googlevideo.com)"""
+    host = urlparse(url).hostname or ''
+    parts = host.split('.')
+    return '.'.join(parts[-2:]) if len(parts) > 2 and not host.replace('.', '').isdigit() else host
+
+
+class _Bucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.tokens = 0.0  # start empty, the site just told us to slow down
+        self.burst = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class AdaptiveRateLimiter:
+    """Per-site token buckets that only exist while a site is throttling us"""
+
+    def __init__(self, start_rate=DEFAULT_START_RATE, min_rate=DEFAULT_MIN_RATE, max_rate=DEFAULT_MAX_RATE,
+                 increase=DEFAULT_INCREASE, decrease=DEFAULT_DECREASE, burst=DEFAULT_BURST):
+        self.start_rate = start_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = burst
+
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def acquire(self, key, cancel_token=None):
+        """
+        Block until a request to `key` may go out, returns the seconds waited.
+        With a cancel_token the wait ends as soon as it is cancelled (its raise_if_cancelled() raises).
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    return waited
+                now = time.monotonic()
+                if now >= bucket.blocked_until:
+                    bucket.refill(now)
+                    if bucket.tokens >= 1:
+                        bucket.tokens -= 1
+                        return waited
+                    delay = (1 - bucket.tokens) / bucket.rate
+                else:
+                    delay = bucket.blocked_until - now
+            if cancel_token is not None:
+                if cancel_token.wait(delay):
+                    cancel_token.raise_if_cancelled()
+            else:
+                time.sleep(delay)
+            waited += delay
+
+    def on_success(self, key):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                return
+            bucket.rate += self.increase
+            if bucket.rate >= self.max_rate:
+                del self._buckets[key]
+
+    def on_throttled(self, key, retry_after=None):
+        """Slow `key` down, returns the new rate"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket(self.start_rate, self.burst)
+            else:
+                bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+                bucket.refill(now)
+                bucket.tokens = min(bucket.tokens, 0.0)
+            if retry_after:
+                bucket.blocked_until = max(bucket.blocked_until, now + min(retry_after, MAX_RETRY_AFTER))
+            return bucket.rate
+
+    def current_rate(self, key):
+        """The enforced rate for `key`, None while it is unlimited"""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            return bucket.rate if bucket else None
+
+
+_default_limiter = None
+_default_limiter_lock = threading.Lock()
+
+
+def get_default_limiter():
+    """Get the process-wide limiter shared by every download"""
+    global _default_limiter
+    with _default_limiter_lock:
+        if _default_limiter is None:
+            _default_limiter = AdaptiveRateLimiter()
+        return _default_limiter
+
+
+class HostSlots:
+    """
+    At most `limit` open requests per site (get_rate_key) across the downloads
+    sharing this object. A slot is held until the response is closed or
+    garbage collected. A thread that already holds a slot for a site is not
+    made to wait for another one, since a download may open its next range
+    request before the previous response is gone.
+    """
+
+    def __init__(self, limit=DEFAULT_PER_HOST_LIMIT):
+        self.limit = max(1, limit)
+        self._lock = threading.Lock()
+        self._slots = {}  # key -> BoundedSemaphore
+        self._held = {}   # (thread id, key) -> open responses
+
+    def acquire(self, key, cancel_token=None):
+        """Block until a request to `key` may be opened, returns the handle to release"""
+        owner = (threading.get_ident(), key)
+        with self._lock:
+            if owner in self._held:
+                self._held[owner] += 1
+                return owner
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._slots[key] = threading.BoundedSemaphore(self.limit)
+
+        if cancel_token is None:
+            slot.acquire()
+        else:
+            while not slot.acquire(timeout=SLOT_POLL_INTERVAL):
+                cancel_token.raise_if_cancelled()
+
+        with self._lock:
+            self._held[owner] = self._held.get(owner, 0) + 1
+        return owner
+
+    def release(self, owner):
+        with self._lock:
+            count = self._held.pop(owner) - 1
+            if count:
+                self._held[owner] = count
+                return
+            slot = self._slots[owner[1]]
+        slot.release()
+
+    def hold(self, response, owner):
+        """Keep the slot of `owner` until `response` is closed or collected"""
+        done = weakref.finalize(response, self.release, owner)
+        ref = weakref.ref(response)
+        close = type(response).close
+
+        # Holds the response weakly, so it is still collected (and released) when never closed
+        def close_response():
+            done()
+            response = ref()
+            if response is not None:
+                close(response)
+
+        response.close = close_response
+
+
+def parse_retry_after(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimitedYoutubeDL(yt_dlp.YoutubeDL):
+    """
+    YoutubeDL whose requests (extractor pages, API calls and media downloads all
+    go through urlopen) pass through the shared adaptive limiter, and take a
+    slot of the 'host_slots' option (a HostSlots) when one is set
+    """
+
+    def __init__(self, params=None, auto_init=True, limiter=None):
+        self.rate_limiter = limiter or get_default_limiter()
+        super().__init__(params, auto_init)
+
+    def urlopen(self, req):
+        url = req if isinstance(req, str) else getattr(req, 'url', None) or req.get_full_url()
+        key = get_rate_key(url)
+        cancel_token = self.params.get('cancel_token')
+        host_slots = self.params.get('host_slots')
+        slot = host_slots.acquire(key, cancel_token) if host_slots else None
+        try:
+            self.rate_limiter.acquire(key, cancel_token)
+            response = super().urlopen(req)
+        except BaseException as e:
+            if slot:
+                host_slots.release(slot)
+            if isinstance(e, HTTPError) and e.status in THROTTLE_STATUS:
+                retry_after = parse_retry_after(e.response.headers.get('Retry-After'))
+                rate = self.rate_limiter.on_throttled(key, retry_after)
+                self.report_warning(f"{key} answered HTTP {e.status}, slowing down to {rate:.2f} requests/s")
+            raise
+        if slot:
+            host_slots.hold(response, slot)
+        self.rate_limiter.on_success(key)
+        return response
@@ -3,6 +3,7 @@ const cors = require('cors');
 const { exec, spawn } = require('child_process');
 const path = require('path');
 const fs = require('fs');
+const crypto = require('crypto');
 
 const app = express();
 app.use(cors());
@@ -43,22 +44,66 @@ for (const p of PYTHON_PATHS) {
 const TEMP_DIR = path.join(__dirname, 'temp_downloads');
 if (!fs.existsSync(TEMP_DIR)) fs.mkdirSync(TEMP_DIR);
 
-// Cleanup routine
-setInterval(() => {
-    fs.readdir(TEMP_DIR, (err, files) => {
-        if (err) return;
-        const now = Date.now();
-        files.forEach(file => {
-            const filePath = path.join(TEMP_DIR, file);
-            fs.stat(filePath, (err, stats) => {
-                if (err) return;
-                if (now - stats.mtimeMs > 3600000) { // 1 hour
-                    fs.unlink(filePath, () => { });
-                }
-            });
-        });
-    });
-}, 600000);
+// Eviction index: finished files with their size and last access, least recently used first
+// (a Map keeps insertion order). The folder is scanned once at startup, after that cleanup
+// only touches the files it removes
+const TEMP_MAX_BYTES = Number(process.env.TEMP_MAX_BYTES) || 5 * 1024 * 1024 * 1024;
+const TEMP_MAX_AGE = (Number(process.env.TEMP_MAX_AGE) || 3600) * 1000;
+const artifacts = new Map(); // file name -> { size, lastAccess }
+const pinned = new Map();    // file name -> number of responses still sending it
+let artifactBytes = 0;
+
+function indexArtifact(name, lastAccess = Date.now()) {
+    let size;
+    try {
+        size = fs.statSync(path.join(TEMP_DIR, name)).size;
+    } catch (err) {
+        return false;
+    }
+    if (artifacts.has(name)) artifactBytes -= artifacts.get(name).size;
+    artifacts.delete(name);
+    artifacts.set(name, { size, lastAccess });
+    artifactBytes += size;
+    if (artifactBytes > TEMP_MAX_BYTES) setImmediate(evictArtifacts);
+    return true;
+}
+
+function touchArtifact(name) {
+    const entry = artifacts.get(name);
+    if (!entry) return false;
+    entry.lastAccess = Date.now();
+    artifacts.delete(name);
+    artifacts.set(name, entry);
+    return true;
+}
+
+function evictArtifacts() {
+    const now = Date.now();
+    const over = artifactBytes > TEMP_MAX_BYTES;
+    const lowWater = TEMP_MAX_BYTES * 0.9;
+    for (const [name, entry] of artifacts) {
+        const expired = now - entry.lastAccess > TEMP_MAX_AGE;
+        if (!expired && !(over && artifactBytes > lowWater)) break;
+        if (pinned.has(name)) continue;
+        artifacts.delete(name);
+        artifactBytes -= entry.size;
+        fs.unlink(path.join(TEMP_DIR, name), () => { });
+    }
+}
+
+fs.readdirSync(TEMP_DIR)
+    .map(name => {
+        try {
+            return { name, mtime: fs.statSync(path.join(TEMP_DIR, name)).mtimeMs };
+        } catch (err) {
+            return null;
+        }
+    })
+    .filter(Boolean)
+    .sort((a, b) => a.mtime - b.mtime)
+    .forEach(({ name, mtime }) => indexArtifact(name, mtime));
+evictArtifacts();
+setInterval(evictArtifacts, 60000);
 
 app.post('/api/info', (req, res) => {
     let { url } = req.body;
@@ -225,13 +270,68 @@ app.post('/api/info', (req, res) => {
     });
 });
 
+// Result store: identical requests (same video, type and quality) share one yt-dlp run,
+// and finished files are served again until the cleanup routine removes them
+const inFlight = new Map(); // result key -> list of waiting responses
+
+// Target audio codec -> format filters for source streams that need no re-encode (see audio_formats.py)
+const NATIVE_AUDIO_STREAMS = {
+    mp3: ['[acodec=mp3]'],
+    m4a: ['[acodec^=mp4a]', '[ext=m4a]'],
+    aac: ['[acodec^=mp4a]'],
+    opus: ['[acodec=opus]'],
+    vorbis: ['[acodec=vorbis]'],
+    flac: ['[acodec=flac]'],
+};
+
+function getVideoKey(url) {
+    const match = url.match(/(?:youtube\.com\/(?:watch\?(?:.*&)?v=|embed\/|v\/|shorts\/)|youtu\.be\/)([a-zA-Z0-9_-]{11})/);
+    return match ? `video:${match[1]}` : `url:${url.trim()}`;
+}
+
+function getResultKey(url, type, quality) {
+    const raw = JSON.stringify([getVideoKey(url), type || 'video', quality || '']);
+    return crypto.createHash('sha1').update(raw).digest('hex').slice(0, 16);
+}
+
+function findArtifact(resultKey) {
+    const match = [...artifacts.keys()].find(f => {
+        const ext = f.split(`_${resultKey}.`)[1];
+        // Skip per-format and partial files (id.f137.mp4, id.mp4.part, ...)
+        return ext && !ext.includes('.') && !['part', 'ytdl', 'temp'].includes(ext);
+    });
+    if (match && touchArtifact(match) && fs.existsSync(path.join(TEMP_DIR, match))) return match;
+    return undefined;
+}
+
 app.post('/api/download', (req, res) => {
     const { url, type, quality } = req.body;
     if (!url) return res.status(400).json({ error: 'Missing Data' });
 
-    const timestamp = Math.floor(Date.now() / 1000);
+    const resultKey = getResultKey(url, type, quality);
+
+    const existing = findArtifact(resultKey);
+    if (existing) {
+        console.log('Serving existing file:', existing);
+        return res.json({ download_url: `/api/files/${existing}`, filename: existing });
+    }
+
+    if (inFlight.has(resultKey)) {
+        console.log('Joining in-flight download:', resultKey);
+        inFlight.get(resultKey).push(res);
+        return;
+    }
+    inFlight.set(resultKey, [res]);
+
+    // Answer every request that joined this download
+    const respond = (status, body) => {
+        const waiting = inFlight.get(resultKey) || [];
+        inFlight.delete(resultKey);
+        waiting.forEach(r => r.status(status).json(body));
+    };
+
     // Use a safe filename template - use ID to avoid special character issues
-    const filenameTemplate = path.join(TEMP_DIR, `%(id)s_${timestamp}.%(ext)s`);
+    const filenameTemplate = path.join(TEMP_DIR, `%(id)s_${resultKey}.%(ext)s`);
 
     // Build args array without embedded quotes - spawn handles quoting automatically
     let args = [
@@ -278,6 +378,12 @@ app.post('/api/download', (req, res) => {
 
         args.push('--audio-format', format);
 
+        // Prefer a stream already in the target codec, yt-dlp then only copies it
+        // into the container instead of decoding and re-encoding
+        const native = (NATIVE_AUDIO_STREAMS[format] || []).map(filter => `bestaudio${filter}`);
+        // Quoted because the process runs through a shell ([ and ^ are special there)
+        args.push('-f', `"${[...native, 'bestaudio', 'best'].join('/')}"`);
+
         if (format === 'mp3') {
             if (bitrate === '320') {
                 args.push('--audio-quality', '0');
@@ -311,7 +417,7 @@ app.post('/api/download', (req, res) => {
         console.error('Spawn error:', err);
         if (!responded) {
             responded = true;
-            res.status(500).json({ error: 'Failed to start download process: ' + err.message });
+            respond(500, { error: 'Failed to start download process: ' + err.message });
         }
     });
 
@@ -336,22 +442,25 @@ app.post('/api/download', (req, res) => {
         // Find the generated file first - check even if there's an error
         // because yt-dlp sometimes returns error code 1 even on success (due to warnings)
         try {
-            const files = fs.readdirSync(TEMP_DIR);
-            const match = files.find(f => f.includes(timestamp.toString()));
+            // New files are not indexed yet, pick them up from this run's output
+            fs.readdirSync(TEMP_DIR)
+                .filter(f => f.includes(`_${resultKey}.`))
+                .forEach(f => indexArtifact(f));
+            const match = findArtifact(resultKey);
             if (match) {
                 const downloadUrl = `/api/files/${match}`;
                 console.log('Download successful, file:', match);
-                res.json({ download_url: downloadUrl, filename: match });
+                respond(200, { download_url: downloadUrl, filename: match });
             } else if (code !== 0) {
                 // Only report error if file wasn't found AND there was an error
                 console.error('Download Error, exit code:', code);
-                res.status(500).json({ error: 'Download failed. YouTube may be blocking this video.' });
+                respond(500, { error: 'Download failed. YouTube may be blocking this video.' });
             } else {
-                res.status(500).json({ error: 'File not found after download' });
+                respond(500, { error: 'File not found after download' });
             }
         } catch (err) {
             console.error('Error in close handler:', err);
-            res.status(500).json({ error: 'Server error: ' + err.message });
+            respond(500, { error: 'Server error: ' + err.message });
         }
     });
 });
@@ -361,11 +470,15 @@ app.get('/api/files/:filename', (req, res) => {
     const safename = path.basename(filename);
     const filepath = path.join(TEMP_DIR, safename);
     if (fs.existsSync(filepath)) {
-        res.download(filepath, (err) => {
-            // Optional: delete after download
-            //   if(!err) fs.unlink(filepath, ()=>{});
-            // Keeping it for now, relying on hourly cleanup
+        // Keep the file out of eviction until the response is done
+        pinned.set(safename, (pinned.get(safename) || 0) + 1);
+        touchArtifact(safename);
+        res.on('close', () => {
+            const count = pinned.get(safename) - 1;
+            if (count > 0) pinned.set(safename, count);
+            else pinned.delete(safename);
         });
+        res.download(filepath);
     } else {
         res.status(404).json({ error: 'File not found' });
     }
@@ -0,0 +1,370 @@
+"""
+Thumbnail cache for the GUI
+Thumbnails are fetched over a small pool of keep-alive connections, decoded
+and downscaled to the display size once, off the UI thread, and kept in a
+memory LRU backed by a size-bounded disk cache keyed by video ID. Showing a
+video again (or a playlist with hundreds of entries) costs no network and
+no full-resolution decode.
+"""
+
+import os
+import ssl
+import time
+import hashlib
+import threading
+import http.client
+from io import BytesIO
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+
+try:
+    from PIL import Image, ImageOps
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+from app_paths import get_app_path
+from disk_lru import DiskLRU
+
+# Size of the video info card thumbnail (16:9)
+DEFAULT_THUMBNAIL_SIZE = (160, 90)
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MEMORY_ENTRIES = 512
+DEFAULT_WORKERS = 4
+
+DEFAULT_MAX_IDLE_PER_HOST = 4
+DEFAULT_TIMEOUT = 10
+MAX_REDIRECTS = 3
+# A thumbnail that failed to load for any other reason is tried again after this many seconds
+DEFAULT_RETRY_AFTER = 60
+# HTTP statuses meaning the thumbnail does not exist, never retried
+MISSING_STATUSES = (404, 410)
+# Anything bigger is not a thumbnail
+MAX_DOWNLOAD_BYTES = 8 * 1024 * 1024
+
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0',
+    'Accept': 'image/webp,image/jpeg,image/png,image/*;q=0.8',
+}
+
+
+class ThumbnailUnavailable(OSError):
+    """The thumbnail is missing or unusable, fetching it again won't help"""
+
+
+def get_cache_dir():
+    """Get the on-disk thumbnail cache folder (same base folder as the GUI config)"""
+    return get_app_path("cache", "thumbnails")
+
+
+def get_thumbnail_url(info, min_width=DEFAULT_THUMBNAIL_SIZE[0]):
+    """
+    URL of the smallest thumbnail at least `min_width` wide in an info dict or
+    flat playlist entry (falls back to the largest one, then to 'thumbnail')
+    """
+    thumbnails = [t for t in info.get('thumbnails') or [] if t.get('url')]
+    sized = sorted((t for t in thumbnails if t.get('width')), key=lambda t: t['width'])
+    for thumbnail in sized:
+        if thumbnail['width'] >= min_width:
+            return thumbnail['url']
+    if sized:
+        return sized[-1]['url']
+    if info.get('thumbnail'):
+        return info['thumbnail']
+    return thumbnails[-1]['url'] if thumbnails else None
+
+
+def downscale(data, size=DEFAULT_THUMBNAIL_SIZE):
+    """Decode image bytes and crop/scale them to exactly `size`"""
+    image = Image.open(BytesIO(data))
+    # JPEG can decode straight to a fraction of its resolution, much cheaper than a full decode
+    image.draft('RGB', (size[0] * 2, size[1] * 2))
+    image = image.convert('RGB')
+    return ImageOps.fit(image, size, Image.LANCZOS)
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections per host, shared by the fetch threads"""
+
+    def __init__(self, max_idle_per_host=DEFAULT_MAX_IDLE_PER_HOST, timeout=DEFAULT_TIMEOUT):
+        self.max_idle_per_host = max_idle_per_host
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._idle = {}  # (scheme, netloc) -> [connection, ...]
+        self._ssl_context = ssl.create_default_context()
+
+    def _acquire(self, key):
+        """Returns (connection, reused)"""
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        scheme, netloc = key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout, context=self._ssl_context), False
+        return http.client.HTTPConnection(netloc, timeout=self.timeout), False
+
+    def _release(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _request(self, key, path):
+        """One GET on a pooled connection, retried once on a fresh one if the idle connection went stale"""
+        conn, reused = self._acquire(key)
+        try:
+            conn.request('GET', path, headers=REQUEST_HEADERS)
+            response = conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            if not reused:
+                raise
+            conn, _ = self._acquire_fresh(key)
+            try:
+                conn.request('GET', path, headers=REQUEST_HEADERS)
+                response = conn.getresponse()
+            except BaseException:
+                conn.close()
+                raise
+        return conn, response
+
+    def _acquire_fresh(self, key):
+        with self._lock:
+            # Every connection idle as long as the stale one is likely stale too
+            stale = self._idle.pop(key, [])
+        for conn in stale:
+            conn.close()
+        return self._acquire(key)
+
+    def fetch(self, url, max_bytes=MAX_DOWNLOAD_BYTES):
+        """
+        GET `url` and return the body (follows redirects). Raises ThumbnailUnavailable
+        when there is no usable thumbnail there, OSError on other failures.
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(url)
+            if parts.scheme not in ('http', 'https'):
+                raise ThumbnailUnavailable(f"Unsupported thumbnail URL: {url}")
+            key = (parts.scheme, parts.netloc)
+            path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+
+            conn, response = self._request(key, path)
+            try:
+                if response.status in (301, 302, 303, 307, 308) and response.getheader('Location'):
+                    response.read()
+                    url = urljoin(url, response.getheader('Location'))
+                    continue
+                if response.status != 200:
+                    response.read()
+                    error = ThumbnailUnavailable if response.status in MISSING_STATUSES else OSError
+                    raise error(f"HTTP {response.status} for {url}")
+                data = response.read(max_bytes + 1)
+                if len(data) > max_bytes:
+                    # The rest of the body is still on the wire, the connection can't be reused
+                    conn.close()
+                    conn = None
+                    raise ThumbnailUnavailable(f"Thumbnail too large: {url}")
+                return data
+            except BaseException:
+                if conn is not None:
+                    conn.close()
+                    conn = None
+                raise
+            finally:
+                if conn is not None:
+                    if response.will_close:
+                        conn.close()
+                    else:
+                        self._release(key, conn)
+        raise OSError(f"Too many redirects: {url}")
+
+    def close(self):
+        with self._lock:
+            connections = [conn for idle in self._idle.values() for conn in idle]
+            self._idle.clear()
+        for conn in connections:
+            conn.close()
+
+
+class ThumbnailCache:
+    """
+    Display-sized thumbnails (PIL images) keyed by video ID.
+    peek() only looks at memory and is safe on the UI thread; get() and
+    fetch_async() fall back to the disk cache, then to the network.
+    """
+
+    def __init__(self, cache_dir=None, size=DEFAULT_THUMBNAIL_SIZE, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES, memory_entries=DEFAULT_MEMORY_ENTRIES, workers=DEFAULT_WORKERS,
+                 connections=None, retry_after=DEFAULT_RETRY_AFTER):
+        self.cache_dir = cache_dir or get_cache_dir()
+        self.size = tuple(size)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.workers = workers
+        self.connections = connections or ConnectionPool()
+        self.retry_after = retry_after
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> image, least recently used first
+        self._disk = DiskLRU(self.cache_dir, '.jpg', max_entries, max_bytes)
+        self._inflight = {}           # key -> Future
+        self._failed = {}             # key -> monotonic time it may be retried at (inf: never)
+        self._executor = None
+
+    def _file_for(self, key):
+        size = f"{self.size[0]}x{self.size[1]}"
+        name = hashlib.sha1(f"{key}@{size}".encode('utf-8')).hexdigest() + '.jpg'
+        return name, os.path.join(self.cache_dir, name)
+
+    def _remember(self, key, image):
+        with self._lock:
+            self._memory[key] = image
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def peek(self, key):
+        """The thumbnail if it is in memory, else None (never blocks)"""
+        with self._lock:
+            image = self._memory.get(key)
+            if image is not None:
+                self._memory.move_to_end(key)
+            return image
+
+    def _load_from_disk(self, key):
+        name, path = self._file_for(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            image = Image.open(BytesIO(data))
+            image.load()
+        except (OSError, ValueError):
+            with self._lock:
+                if name in self._disk:
+                    self._disk.discard(name)
+            return None
+        with self._lock:
+            self._disk.touch(name, len(data))
+        return image
+
+    def _store_on_disk(self, key, image):
+        name, path = self._file_for(key)
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=85)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self._lock:
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(buffer.getvalue())
+                os.replace(tmp_path, path)
+            except OSError:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                return
+            self._disk.touch(name, buffer.tell())
+            self._disk.evict(keep=name)
+
+    def _load(self, key, url):
+        image = self._load_from_disk(key)
+        if image is None:
+            data = self.connections.fetch(url)
+            try:
+                image = downscale(data, self.size)
+            except (OSError, ValueError, Image.DecompressionBombError) as e:
+                raise ThumbnailUnavailable(f"Unreadable thumbnail: {url}") from e
+            self._store_on_disk(key, image)
+        self._remember(key, image)
+        return image
+
+    def get(self, key, url):
+        """The thumbnail for `key` (fetched from `url` on a miss), or None if it can't be had"""
+        if not HAS_PIL or not url:
+            return None
+        key = key or url
+        image = self.peek(key)
+        if image is not None:
+            return image
+        return self._run(key, url)
+
+    def _run(self, key, url):
+        with self._lock:
+            retry_at = self._failed.get(key)
+            if retry_at is not None:
+                if time.monotonic() < retry_at:
+                    return None
+                del self._failed[key]
+        try:
+            return self._load(key, url)
+        except ThumbnailUnavailable:
+            retry_at = float('inf')
+        except Exception:
+            # Timeouts, DNS or connection errors, 5xx: the thumbnail may load later
+            retry_at = time.monotonic() + self.retry_after
+        with self._lock:
+            self._failed[key] = retry_at
+        return None
+
+    def _run_async(self, key, url):
+        try:
+            return self._run(key, url)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def fetch_async(self, key, url, callback=None):
+        """
+        Load the thumbnail on a worker thread, returns a Future of the image (or None).
+        `callback(key, image)` runs on the worker thread; requests for a key already
+        being loaded share its Future.
+        """
+        key = key or url
+        image = self.peek(key)
+        if image is not None or not HAS_PIL or not url:
+            future = Future()
+            future.set_result(image)
+        else:
+            with self._lock:
+                future = self._inflight.get(key)
+                if future is None or future.cancelled():
+                    if self._executor is None:
+                        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='thumbnail')
+                    future = self._inflight[key] = self._executor.submit(self._run_async, key, url)
+        if callback is not None:
+            future.add_done_callback(lambda f: callback(key, None if f.cancelled() else f.result()))
+        return future
+
+    def clear(self):
+        """Drop every cached thumbnail"""
+        with self._lock:
+            self._memory.clear()
+            self._failed.clear()
+            self._disk.clear()
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.connections.close()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """Get the process-wide thumbnail cache shared by every caller"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ThumbnailCache()
+        return _default_cache
@@ -0,0 +1,56 @@
+"""
+UI update bus for the GUI
+Tk widgets may only be touched from the thread running mainloop. Download
+threads post their updates here instead, and the Tk thread drains them on
+a fixed after() tick. Updates posted under a key are coalesced, so a burst
+of progress callbacks costs one redraw per tick instead of one each.
+"""
+
+import itertools
+import threading
+import traceback
+from collections import OrderedDict
+
+# Redraws per second at most (50 ms)
+DEFAULT_TICK_MS = 50
+
+
+class UIUpdateBus:
+    """
+    post(key, fn, ...) keeps only the latest update for `key`;
+    call(fn, ...) is always run, in order. Both run on the Tk thread at the next drain().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()  # key -> (fn, args, kwargs), oldest first
+        self._sequence = itertools.count()
+
+    def post(self, key, fn, *args, **kwargs):
+        """Replace any pending update for `key` (it moves to the end of the queue)"""
+        with self._lock:
+            self._pending.pop(key, None)
+            self._pending[key] = (fn, args, kwargs)
+
+    def call(self, fn, *args, **kwargs):
+        with self._lock:
+            self._pending[('call', next(self._sequence))] = (fn, args, kwargs)
+
+    def drain(self):
+        """Run everything posted so far (Tk thread only), returns the number of updates run"""
+        with self._lock:
+            pending, self._pending = self._pending, OrderedDict()
+        for fn, args, kwargs in pending.values():
+            try:
+                fn(*args, **kwargs)
+            except Exception:
+                # One broken update (e.g. a widget closed meanwhile) must not stop the others
+                traceback.print_exc()
+        return len(pending)
+
+    def attach(self, widget, tick_ms=DEFAULT_TICK_MS):
+        """Drain on `widget`'s event loop every `tick_ms` until it is destroyed"""
+        def tick():
+            self.drain()
+            widget.after(tick_ms, tick)
+        widget.after(tick_ms, tick)
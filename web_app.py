@@ -1,8 +1,21 @@
-from flask import Flask, render_template, request, jsonify, send_file, after_this_request
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context
 import yt_dlp
+from yt_dlp.networking import Request
 import os
+import json
 import time
-import glob
+import hashlib
+import urllib.parse
+
+import metadata_cache
+from audio_formats import AUDIO_CODECS, build_audio_options, find_native_stream
+import ydl_pool
+from ffmpeg_pool import PostProcessQueue
+from artifact_store import ArtifactStore
+from download_archive import get_default_archive
+from job_queue import JobQueue, QueueFullError
+from job_journal import JobJournal
+from youtube_downloader import get_cache_key, get_archive_id
 
 app = Flask(__name__, static_folder='website', template_folder='website')
 
@@ -11,17 +24,40 @@ TEMP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp_downlo
 if not os.path.exists(TEMP_DIR):
     os.makedirs(TEMP_DIR)
 
-# Cleanup old files on startup
-def cleanup_temp():
-    try:
-        now = time.time()
-        for f in glob.glob(os.path.join(TEMP_DIR, '*')):
-            if os.stat(f).st_mtime < now - 3600: # Remove files older than 1 hour
-                os.remove(f)
-    except:
-        pass
+# Finished files are indexed in memory and evicted in the background by size and age
+artifact_store = ArtifactStore(
+    TEMP_DIR,
+    max_bytes=int(os.getenv('TEMP_MAX_BYTES', str(5 * 1024 * 1024 * 1024))),
+    max_age=int(os.getenv('TEMP_MAX_AGE', '3600')),
+)
+artifact_store.evict()
+artifact_store.start()
+
+# Server downloads keep their own job journal (outside TEMP_DIR, which the artifact store sweeps),
+# so the desktop apps never try to resume them into their own folders
+web_journal = JobJournal(os.getenv('WEB_JOURNAL_PATH') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'journal', 'web.jsonl'))
+
+# Let the front server (nginx X-Accel / Apache mod_xsendfile) send finished files itself
+app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+# Finished files never change under the same name, browsers may keep them until cleanup
+FILE_MAX_AGE = 3600
+
+# Downloads run on this pool instead of inside the request threads
+DOWNLOAD_WORKERS = int(os.getenv('DOWNLOAD_WORKERS', '2'))
 
-cleanup_temp()
+def artifact_path(filename):
+    return os.path.join(TEMP_DIR, os.path.basename(filename))
+
+# Identical requests share one job, finished files are reused until they are cleaned up
+job_queue = JobQueue(
+    workers=DOWNLOAD_WORKERS,
+    reuse_finished=lambda job: os.path.exists(artifact_path(job.result['filename'])),
+)
+
+# Progress streams send at most this many updates per second per watcher
+PROGRESS_EVENTS_PER_SECOND = 4
+PROGRESS_KEEPALIVE = 15
 
 @app.route('/')
 def home():
@@ -44,136 +80,430 @@ def get_info():
             'quiet': True,
             'no_warnings': True,
             'skip_download': True,
+            'noplaylist': True,
         }
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            
-            # Extract relevant formats
-            formats = []
-            
-            # Video formats
-            video_formats = {} # Dedup by height
-            for f in info.get('formats', []):
-                if f.get('vcodec') != 'none' and f.get('height'):
-                    h = f['height']
-                    # Prefer mp4 container
-                    if f.get('ext') == 'mp4':
-                        video_formats[h] = f['format_id']
+        # Repeat lookups are answered from the shared metadata cache
+        cache_key = get_cache_key(url)
+        info = metadata_cache.extract_info_cached(url, ydl_opts, key=cache_key)
+        if not info:
+            return jsonify({'error': 'Could not extract information'}), 500
+        
+        # Extract relevant formats
+        formats = []
+        
+        # Video formats
+        video_formats = {} # Dedup by height
+        for f in info.get('formats', []):
+            if f.get('vcodec') != 'none' and f.get('height'):
+                h = f['height']
+                # Prefer mp4 container
+                if f.get('ext') == 'mp4':
+                    video_formats[h] = f['format_id']
+        
+        # Sort heights desc
+        for h in sorted(video_formats.keys(), reverse=True):
+            formats.append({
+                'type': 'video',
+                'quality': f"{h}p",
+                'format_id': video_formats[h], # We will use special logic for download to merge audio
+                'label': f"Video (MP4) - {h}p"
+            })
             
-            # Sort heights desc
-            for h in sorted(video_formats.keys(), reverse=True):
-                formats.append({
-                    'type': 'video',
-                    'quality': f"{h}p",
-                    'format_id': video_formats[h], # We will use special logic for download to merge audio
-                    'label': f"Video (MP4) - {h}p"
-                })
-                
-            # Audio format
+        # Audio format
+        formats.append({
+            'type': 'audio',
+            'quality': '320kbps',
+            'format_id': 'bestaudio',
+            'label': "Audio (MP3) - Best Quality"
+        })
+
+        # Offered when the original stream can be kept as is (no re-encoding, fastest)
+        native_m4a = find_native_stream(info, 'm4a')
+        if native_m4a:
+            abr = f" {int(native_m4a['abr'])}kbps" if native_m4a.get('abr') else ""
             formats.append({
                 'type': 'audio',
-                'quality': '320kbps',
-                'format_id': 'bestaudio',
-                'label': "Audio (MP3) - Best Quality"
+                'quality': 'm4a',
+                'format_id': native_m4a['format_id'],
+                'label': f"Audio (M4A){abr} - Original, no conversion"
             })
 
-            return jsonify({
-                'title': info.get('title'),
-                'thumbnail': info.get('thumbnail'),
-                'duration': info.get('duration_string') or info.get('duration'),
-                'author': info.get('uploader'),
-                'formats': formats
-            })
+        # Original audio stream, sent to the browser while it is being fetched
+        formats.append({
+            'type': 'audio',
+            'quality': 'original',
+            'format_id': 'bestaudio',
+            'label': "Audio (Original) - Instant Stream",
+            'stream': True
+        })
+
+        return jsonify({
+            'title': info.get('title'),
+            'thumbnail': info.get('thumbnail'),
+            'duration': info.get('duration_string') or info.get('duration'),
+            'author': info.get('uploader'),
+            'formats': formats,
+            # Handed back to /api/download so it can reuse this extraction
+            'token': cache_key
+        })
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def build_format_options(format_type, quality):
+    """yt-dlp options that decide what ends up in the output file"""
+    if format_type == 'audio':
+        # 'm4a', 'opus'... keep that codec (copied when the site has it), anything else is MP3
+        if quality in AUDIO_CODECS:
+            return build_audio_options(quality)
+        return build_audio_options('mp3', '192')
+
+    # Video
+    height = (quality or 'best').replace('p', '')
+    return {
+        'format': f'bestvideo[height<={height}][ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
+        'merge_output_format': 'mp4',
+    }
+
+def get_result_key(url, format_options):
+    """Identify a download result by video and output settings (None if it can't be shared)"""
+    video_key = get_cache_key(url)
+    if not video_key:
+        return None
+    raw = json.dumps([video_key, format_options], sort_keys=True)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+def find_archived_artifact(url, result_key):
+    """
+    Look up the file an earlier job made for this result key in the download
+    archive (URLs that can't be keyed without extracting them fall back to the file names)
+    """
+    archive_id = get_archive_id(url)
+    if not archive_id:
+        return find_artifact(result_key)
+
+    profile = f'web:{result_key}'
+    archived = get_default_archive().get(archive_id, profile)
+    if not archived or not archived['filepath']:
+        return None
+    name = os.path.basename(archived['filepath'])
+    path = artifact_path(name)
+    if artifact_store.touch(name) and os.path.exists(path):
+        return path
+    # Evicted since, it has to be downloaded again
+    get_default_archive().forget(archive_id, profile)
+    return None
+
+def find_artifact(result_key):
+    """Find a finished file for this result key left by an earlier job"""
+    marker = f'_{result_key}.'
+    for name in artifact_store.names():
+        if marker not in name:
+            continue
+        ext = name.rsplit(marker, 1)[-1]
+        # Skip per-format and partial files (name.f137.mp4, name.mp4.part, ...)
+        if '.' not in ext and ext not in ('part', 'ytdl', 'temp') and artifact_store.touch(name):
+            path = artifact_path(name)
+            if os.path.exists(path):
+                return path
+    return None
+
+def run_download_job(job, url, format_type, format_options, result_key=None, token=None):
+    """Download (and convert) one request on a job worker thread"""
+    if result_key:
+        existing = find_archived_artifact(url, result_key)
+        if existing:
+            return {
+                'download_url': f'/api/files/{os.path.basename(existing)}',
+                'filename': os.path.basename(existing)
+            }
+
+    # Same settings give the same name, so later requests can find the file
+    output_template = os.path.join(TEMP_DIR, f'%(title)s_{result_key or job.id[:16]}.%(ext)s')
+
+    def progress_hook(d):
+        if d['status'] == 'downloading':
+            job.update(
+                stage='downloading',
+                downloaded_bytes=d.get('downloaded_bytes'),
+                total_bytes=d.get('total_bytes') or d.get('total_bytes_estimate'),
+                speed=d.get('speed'),
+                eta=d.get('eta'),
+            )
+        elif d['status'] == 'finished':
+            job.update(stage='processing')
+
+    def postprocessor_hook(d):
+        job.update(stage='processing', postprocessor=d.get('postprocessor'), postprocessor_status=d['status'])
+
+    # Merging / MP3 conversion runs on the ffmpeg pool, this worker is freed for the next download
+    postprocessing = PostProcessQueue()
+    final_paths = []
+
+    ydl_opts = {
+        'outtmpl': output_template,
+        'noplaylist': True,
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True, # progress is reported through the job instead
+        'progress_hooks': [progress_hook],
+        'postprocessor_hooks': [postprocessor_hook],
+        'post_hooks': [final_paths.append],
+        'postprocess_queue': postprocessing,
+        'job_journal': web_journal,
+        # Use project bin ffmpeg if available
+        'ffmpeg_location': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bin'),
+        **format_options,
+    }
+
+    # Only trust a token that belongs to this URL
+    info = None
+    if token and token == get_cache_key(url):
+        info = metadata_cache.get_default_cache().get(token)
+
+    job.update(stage='starting')
+    with ydl_pool.checkout(ydl_opts) as ydl:
+        info = metadata_cache.download_with_info(ydl, url, info)
+        planned = ydl.prepare_filename(info)
+
+    def finish(tasks):
+        for task in tasks:
+            task.result()
+
+        filename = final_paths[-1] if final_paths else planned
+        if format_type == 'audio' and not final_paths:
+            codec = format_options['postprocessors'][0]['preferredcodec']
+            filename = os.path.splitext(filename)[0] + '.' + codec
+        
+        # Verify file exists
+        if not os.path.exists(filename):
+            # Sometimes file extension differs
+            base = os.path.splitext(filename)[0]
+            for ext in ['.mp4', '.mkv', '.webm', '.mp3', '.m4a', '.opus']:
+                if os.path.exists(base + ext):
+                    filename = base + ext
+                    break
+
+        if not os.path.exists(filename):
+            raise Exception('Download failed to produce file')
+
+        artifact_store.add(filename)
+        if result_key and info and info.get('extractor_key') and info.get('id'):
+            archive_id = yt_dlp.utils.make_archive_id(info['extractor_key'], info['id'])
+            get_default_archive().record(archive_id, f'web:{result_key}', filename, info.get('format_id'), info.get('title'))
+
+        return {
+            'download_url': f'/api/files/{os.path.basename(filename)}',
+            'filename': os.path.basename(filename)
+        }
+
+    return postprocessing.then(finish)
+
 @app.route('/api/download', methods=['POST'])
 def download():
     data = request.json
     url = data.get('url')
     format_type = data.get('type') # 'video' or 'audio'
     quality = data.get('quality') # e.g. '1080p' or '320kbps'
+    token = data.get('token') # from /api/info, lets us skip a second extraction
     
     if not url:
         return jsonify({'error': 'Missing data'}), 400
 
+    format_options = build_format_options(format_type, quality)
+    result_key = get_result_key(url, format_options)
+
+    # The download itself runs on the job queue, the client polls /api/jobs/<id>
     try:
-        # Create unique filename ID
-        timestamp = int(time.time())
-        output_template = os.path.join(TEMP_DIR, f'%(title)s_{timestamp}.%(ext)s')
-        
-        ydl_opts = {
-            'outtmpl': output_template,
-            'quiet': True,
-            'no_warnings': True,
-            # Use project bin ffmpeg if available
-            'ffmpeg_location': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bin'),
-        }
+        job = job_queue.submit(run_download_job, url, format_type, format_options, result_key, token, key=result_key)
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503
 
-        if format_type == 'audio':
-            ydl_opts.update({
-                'format': 'bestaudio/best',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-            })
-        else:
-            # Video
-            height = quality.replace('p', '')
-            ydl_opts.update({
-                'format': f'bestvideo[height<={height}][ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
-                'merge_output_format': 'mp4',
-            })
+    return jsonify({
+        'job_id': job.id,
+        'status_url': f'/api/jobs/{job.id}',
+        'events_url': f'/api/jobs/{job.id}/events'
+    }), 202
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            filename = ydl.prepare_filename(info)
-            
-            if format_type == 'audio':
-                filename = os.path.splitext(filename)[0] + '.mp3'
-            
-            # Verify file exists
-            if not os.path.exists(filename):
-                # Sometimes file extension differs
-                base = os.path.splitext(filename)[0]
-                for ext in ['.mp4', '.mkv', '.webm', '.mp3']:
-                    if os.path.exists(base + ext):
-                        filename = base + ext
-                        break
-
-            if not os.path.exists(filename):
-                return jsonify({'error': 'Download failed to produce file'}), 500
-
-            # Schedule cleanup after sending
-            @after_this_request
-            def remove_file(response):
-                try:
-                    # Delay slightly or just rely on global cleanup if lock issues occur on Windows
-                    # Windows often locks files being sent. 
-                    # We will comment out immediate delete and rely on periodic cleanup or try/except
-                    # os.remove(filename) 
-                    pass
-                except Exception as e:
-                    print(e)
-                return response
-
-            return jsonify({
-                'download_url': f'/api/files/{os.path.basename(filename)}',
-                'filename': os.path.basename(filename)
-            })
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-Sent Events stream of a job's progress, ends with a 'done' event"""
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'error': 'Unknown job'}), 404
+
+    def stream():
+        version = -1
+        while True:
+            current = job.wait_for_update(version, PROGRESS_KEEPALIVE)
+            if current == version:
+                yield ": keepalive\n\n"
+                continue
+            version = current
+
+            data = job.to_dict()
+            event = 'done' if job.done else 'progress'
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+            if job.done:
+                return
+
+            # Coalesce bursts of hook calls into a fixed update rate
+            time.sleep(1.0 / PROGRESS_EVENTS_PER_SECOND)
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+# Block size read from upstream and written to the client in stream mode
+STREAM_BLOCK_SIZE = 64 * 1024
 
+def build_stream_format(format_type, quality):
+    """Format selector for single-file HTTP formats (no merge or conversion needed)"""
+    single_file = '[protocol^=http][protocol!*=dash]'
+    if format_type == 'audio':
+        return f'bestaudio{single_file}'
+    height = (quality or '').replace('p', '')
+    if height.isdigit():
+        return f'best[height<=?{height}]{single_file}/best{single_file}'
+    return f'best{single_file}'
+
+def stream_format(ydl, fmt):
+    """Yield the bytes of a selected format as they arrive from upstream (the caller gives `ydl` back)"""
+    headers = fmt.get('http_headers') or {}
+    filesize = fmt.get('filesize')
+    # Some sites (YouTube) throttle long requests, fetch in ranges like yt-dlp does
+    chunk_size = (fmt.get('downloader_options') or {}).get('http_chunk_size')
+
+    if not chunk_size:
+        with ydl.urlopen(Request(fmt['url'], headers=headers)) as response:
+            while True:
+                block = response.read(STREAM_BLOCK_SIZE)
+                if not block:
+                    return
+                yield block
+
+    start = 0
+    while not filesize or start < filesize:
+        end = start + chunk_size - 1
+        if filesize:
+            end = min(end, filesize - 1)
+        received = 0
+        range_headers = {**headers, 'Range': f'bytes={start}-{end}'}
+        with ydl.urlopen(Request(fmt['url'], headers=range_headers)) as response:
+            while True:
+                block = response.read(STREAM_BLOCK_SIZE)
+                if not block:
+                    break
+                received += len(block)
+                yield block
+        if received < end - start + 1:
+            return
+        start += received
+
+@app.route('/api/stream')
+def stream():
+    """
+    Send an audio-only or progressive format straight to the client while it
+    downloads, nothing is written to TEMP_DIR. Formats that need merging or
+    conversion are rejected, use /api/download for those.
+    """
+    url = request.args.get('url')
+    format_type = request.args.get('type', 'audio')
+    quality = request.args.get('quality')
+    token = request.args.get('token')
+
+    if not url:
+        return jsonify({'error': 'No URL provided'}), 400
+
+    cache_key = get_cache_key(url)
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'noplaylist': True,
+        'format': build_stream_format(format_type, quality),
+        'job_journal': False,  # streamed to the client, nothing on disk to resume
+    }
+
+    try:
+        info = None
+        if token and token == cache_key:
+            info = metadata_cache.get_default_cache().get(token)
+        if info is None:
+            info = metadata_cache.extract_info_cached(url, {**ydl_opts, 'skip_download': True}, key=cache_key)
+        if not info:
+            return jsonify({'error': 'Could not extract information'}), 500
+
+        # Checked out until the response is closed
+        pool = ydl_pool.get_default_pool()
+        ydl = pool.acquire(ydl_opts)
+        try:
+            fmt = ydl.process_ie_result(metadata_cache.prepare_info_for_download(info), download=False)
+        except yt_dlp.utils.DownloadError:
+            pool.release(ydl)
+            return jsonify({'error': 'No single-file format available for streaming, use /api/download'}), 409
+        except BaseException:
+            pool.release(ydl, discard=True)
+            raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+    filename = f"{yt_dlp.utils.sanitize_filename(fmt.get('title') or 'download')}.{fmt.get('ext') or 'bin'}"
+    headers = {
+        'Content-Disposition': "attachment; filename*=UTF-8''" + urllib.parse.quote(filename),
+        'X-Accel-Buffering': 'no',
+    }
+    if fmt.get('filesize'):
+        headers['Content-Length'] = str(fmt['filesize'])
+
+    mimetype = {
+        'mp4': 'video/mp4', 'm4a': 'audio/mp4', 'webm': 'video/webm' if format_type != 'audio' else 'audio/webm',
+        'mp3': 'audio/mpeg', 'ogg': 'audio/ogg', 'opus': 'audio/ogg',
+    }.get(fmt.get('ext'), 'application/octet-stream')
+
+    response = Response(stream_with_context(stream_format(ydl, fmt)), mimetype=mimetype, headers=headers)
+    # The server closes the response even when the client left before the body was read,
+    # a generator that never started would never reach a finally block
+    response.call_on_close(lambda: pool.release(ydl))
+    return response
+
 @app.route('/api/files/<filename>')
 def serve_file(filename):
     # Security check: ensure no path traversal
-    filename = os.path.basename(filename)
-    return send_file(os.path.join(TEMP_DIR, filename), as_attachment=True)
+    path = artifact_path(filename)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return jsonify({'error': 'File not found'}), 404
+
+    # Strong validator built from file metadata only, so conditional requests
+    # (If-None-Match / If-Range) never need to read the file
+    etag = f"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"
+
+    # Werkzeug answers Range / If-Range / If-None-Match itself, full responses go
+    # through wsgi.file_wrapper (sendfile on servers like gunicorn) or X-Sendfile
+    response = send_file(
+        path,
+        as_attachment=True,
+        conditional=True,
+        etag=etag,
+        last_modified=st.st_mtime,
+        max_age=FILE_MAX_AGE,
+    )
+
+    # Keep the file until the response body has been sent
+    name = os.path.basename(path)
+    artifact_store.pin(name)
+    response.call_on_close(lambda: artifact_store.unpin(name))
+    return response
 
 if __name__ == '__main__':
     print("Starting Web App on http://localhost:5000")
@@ -21,6 +21,9 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     });
 
+    // Token from /api/info, lets the server reuse the extracted info
+    let infoToken = null;
+
     // Analyze Click
     analyzeBtn.addEventListener('click', async () => {
         const url = urlInput.value.trim();
@@ -47,6 +50,7 @@ document.addEventListener('DOMContentLoaded', () => {
             if (data.error) throw new Error(data.error);
 
             // Populate Info
+            infoToken = data.token || null;
             videoTitle.textContent = data.title;
             videoThumb.src = data.thumbnail;
             videoMeta.textContent = `Duration: ${data.duration} | By: ${data.author}`;
@@ -58,7 +62,8 @@ document.addEventListener('DOMContentLoaded', () => {
                 opt.value = JSON.stringify({
                     type: fmt.type,
                     quality: fmt.quality,
-                    format_id: fmt.format_id
+                    format_id: fmt.format_id,
+                    stream: !!fmt.stream
                 });
                 opt.textContent = fmt.label;
                 formatSelect.appendChild(opt);
@@ -81,6 +86,15 @@ document.addEventListener('DOMContentLoaded', () => {
         const formatData = JSON.parse(formatSelect.value);
         const url = urlInput.value.trim();
 
+        // Stream formats are sent by the server as they download, no waiting
+        if (formatData.stream) {
+            const params = new URLSearchParams({ url, type: formatData.type, quality: formatData.quality });
+            if (infoToken) params.set('token', infoToken);
+            statusMsg.textContent = 'Starting stream...';
+            window.location.href = `/api/stream?${params}`;
+            return;
+        }
+
         // UI
         downloadBtn.innerHTML = '<ion-icon name="cloud-download"></ion-icon> Processing...';
         downloadBtn.disabled = true;
@@ -94,13 +108,19 @@ document.addEventListener('DOMContentLoaded', () => {
                 body: JSON.stringify({
                     url: url,
                     type: formatData.type,
-                    quality: formatData.quality
+                    quality: formatData.quality,
+                    token: infoToken
                 })
             });
 
-            const data = await response.json();
+            const job = await response.json();
 
-            if (data.error) throw new Error(data.error);
+            if (job.error) throw new Error(job.error);
+
+            // The server queues the download, follow it until the file is ready
+            const data = window.EventSource && job.events_url
+                ? await streamJob(job.events_url)
+                : await waitForJob(job.status_url);
 
             // Trigger Download
             statusMsg.textContent = 'Starting file download...';
@@ -115,6 +135,53 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // Poll a queued download job until it finishes
+    async function waitForJob(statusUrl) {
+        while (true) {
+            const response = await fetch(statusUrl);
+            const job = await response.json();
+
+            if (job.status === 'finished') return job;
+            if (job.status === 'error' || job.error) throw new Error(job.error || 'Download failed');
+
+            showJobProgress(job);
+            await new Promise(resolve => setTimeout(resolve, 1000));
+        }
+    }
+
+    // Follow a queued download job through its Server-Sent Events stream
+    function streamJob(eventsUrl) {
+        return new Promise((resolve, reject) => {
+            const source = new EventSource(eventsUrl);
+
+            source.addEventListener('progress', (e) => showJobProgress(JSON.parse(e.data)));
+
+            source.addEventListener('done', (e) => {
+                source.close();
+                const job = JSON.parse(e.data);
+                if (job.status === 'finished') resolve(job);
+                else reject(new Error(job.error || 'Download failed'));
+            });
+
+            source.onerror = () => {
+                source.close();
+                reject(new Error('Lost connection to the server'));
+            };
+        });
+    }
+
+    function showJobProgress(job) {
+        const progress = job.progress || {};
+        if (progress.stage === 'downloading' && progress.total_bytes) {
+            const percent = Math.floor(progress.downloaded_bytes / progress.total_bytes * 100);
+            statusMsg.textContent = `Downloading on server... ${percent}%`;
+        } else if (progress.stage === 'processing') {
+            statusMsg.textContent = 'Converting on server...';
+        } else if (job.status === 'queued') {
+            statusMsg.textContent = 'Waiting in queue...';
+        }
+    }
+
     // Cinematic Theme Switcher Logic
     const themeToggle = document.getElementById('themeToggle');
     const body = document.body;
@@ -0,0 +1,206 @@
+"""
+Pool of long-lived YoutubeDL instances
+Building a YoutubeDL loads the extractors, parses the cookie jar and opens a
+fresh set of HTTP connections. Instances are kept per set of options instead,
+so back-to-back jobs reuse warm extractors, cookies and keep-alive connections.
+"""
+
+import json
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+
+import yt_dlp
+
+from ffmpeg_pool import PipelinedYoutubeDL
+
+# Options that change from one job to the next, applied at checkout instead of being part of the key
+PER_CHECKOUT_OPTIONS = (
+    'progress_hooks', 'postprocessor_hooks', 'post_hooks', 'logger', 'outtmpl', 'paths', 'postprocess_queue',
+    'cancel_token', 'host_slots',
+)
+
+DEFAULT_MAX_IDLE_PER_KEY = 4
+DEFAULT_MAX_IDLE = 16
+DEFAULT_IDLE_TIMEOUT = 300
+
+# Errors that leave the instance in a usable state, anything else discards it
+REUSABLE_ERRORS = (yt_dlp.utils.DownloadError, yt_dlp.utils.ExtractorError)
+
+
+def get_options_key(ydl_opts):
+    """Key for the static part of the options (objects like archives compare by identity)"""
+    static = {key: value for key, value in ydl_opts.items() if key not in PER_CHECKOUT_OPTIONS}
+    return json.dumps(static, sort_keys=True, default=lambda value: f'<{type(value).__name__} {id(value):x}>')
+
+
+class YoutubeDLPool:
+    """
+    Hand out YoutubeDL instances keyed by their static options.
+    A checked out instance belongs to one caller until it is released, then its
+    hooks, logger and output template go back to the pooled defaults.
+    """
+
+    def __init__(self, max_idle_per_key=DEFAULT_MAX_IDLE_PER_KEY, max_idle=DEFAULT_MAX_IDLE,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.max_idle_per_key = max_idle_per_key
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+
+        self._lock = threading.Lock()
+        self._idle = {}  # options key -> [(returned at, ydl), ...], most recent last
+        self._idle_count = 0
+
+    def _create(self, ydl_opts):
+        static = {key: value for key, value in ydl_opts.items() if key not in PER_CHECKOUT_OPTIONS}
+        ydl = PipelinedYoutubeDL(static)
+        ydl._pool_key = get_options_key(ydl_opts)
+        ydl._pool_defaults = {
+            'outtmpl': dict(ydl.params['outtmpl']),
+            'pp_hooks': {id(pp): list(pp._progress_hooks) for pps in ydl._pps.values() for pp in pps},
+        }
+        return ydl
+
+    def _prepare(self, ydl, ydl_opts):
+        """Apply the per-job options and reset the per-run counters"""
+        defaults = ydl._pool_defaults
+        ydl._progress_hooks = list(ydl_opts.get('progress_hooks') or [])
+        ydl._post_hooks = list(ydl_opts.get('post_hooks') or [])
+        ydl._postprocessor_hooks = list(ydl_opts.get('postprocessor_hooks') or [])
+        for pps in ydl._pps.values():
+            for pp in pps:
+                pp._progress_hooks = defaults['pp_hooks'].get(id(pp), []) + ydl._postprocessor_hooks
+
+        ydl.params['logger'] = ydl_opts.get('logger')
+        ydl.params['postprocess_queue'] = ydl_opts.get('postprocess_queue')
+        ydl.params['cancel_token'] = ydl_opts.get('cancel_token')
+        ydl.params['host_slots'] = ydl_opts.get('host_slots')
+        ydl.params['paths'] = ydl_opts.get('paths') or {}
+        ydl.params['outtmpl'] = dict(defaults['outtmpl'])
+        if ydl_opts.get('outtmpl'):
+            outtmpl = ydl_opts['outtmpl']
+            ydl.params['outtmpl'].update(outtmpl if isinstance(outtmpl, dict) else {'default': outtmpl})
+
+        ydl._download_retcode = 0
+        ydl._num_downloads = 0
+        ydl._num_videos = 0
+        ydl._playlist_level = 0
+        ydl._playlist_urls = set()
+        ydl._printed_messages = set()
+        return ydl
+
+    def acquire(self, ydl_opts):
+        """Check out an instance for these options (pair with release())"""
+        key = get_options_key(ydl_opts)
+        ydl = None
+        with self._lock:
+            expired = self._prune()
+            idle = self._idle.get(key)
+            if idle:
+                _, ydl = idle.pop()
+                self._idle_count -= 1
+                if not idle:
+                    del self._idle[key]
+        for instance in expired:
+            instance.close()
+        if ydl is None:
+            ydl = self._create(ydl_opts)
+        return self._prepare(ydl, ydl_opts)
+
+    def release(self, ydl, discard=False):
+        """
+        Give an instance back (or close it when `discard` is set or the pool is full).
+        An instance with post-processing still deferred is only given back once that is done.
+        """
+        when_idle = getattr(ydl, 'when_idle', None)
+        if when_idle is not None:
+            when_idle(lambda: self._release(ydl, discard))
+        else:
+            self._release(ydl, discard)
+
+    def _release(self, ydl, discard):
+        key = getattr(ydl, '_pool_key', None)
+        closing = []
+        with self._lock:
+            if discard or key is None or len(self._idle.get(key, ())) >= self.max_idle_per_key:
+                closing.append(ydl)
+            else:
+                # Drop references to the caller's hooks and logger while idle
+                self._prepare(ydl, {})
+                self._idle.setdefault(key, []).append((time.monotonic(), ydl))
+                self._idle_count += 1
+                closing.extend(self._trim())
+        for instance in closing:
+            instance.close()
+
+    @contextmanager
+    def checkout(self, ydl_opts):
+        """
+        with pool.checkout(ydl_opts) as ydl: ...
+        The instance is returned to the pool afterwards, unless an unexpected error left it in an unknown state
+        """
+        ydl = self.acquire(ydl_opts)
+        try:
+            yield ydl
+        except REUSABLE_ERRORS:
+            self.release(ydl)
+            raise
+        except BaseException:
+            self.release(ydl, discard=True)
+            raise
+        else:
+            self.release(ydl)
+
+    def _prune(self):
+        """Remove the instances idle for too long, returns them so they are closed outside the lock"""
+        cutoff = time.monotonic() - self.idle_timeout
+        expired = []
+        for key in list(self._idle):
+            fresh = [(at, ydl) for at, ydl in self._idle[key] if at >= cutoff]
+            expired.extend(ydl for at, ydl in self._idle[key] if at < cutoff)
+            if fresh:
+                self._idle[key] = fresh
+            else:
+                del self._idle[key]
+        self._idle_count -= len(expired)
+        return expired
+
+    def _trim(self):
+        """Remove the least recently returned instances while over max_idle"""
+        removed = []
+        while self._idle_count > self.max_idle:
+            key = min(self._idle, key=lambda k: self._idle[k][0][0])
+            removed.append(self._idle[key].pop(0)[1])
+            if not self._idle[key]:
+                del self._idle[key]
+            self._idle_count -= 1
+        return removed
+
+    def close(self):
+        """Close every idle instance (saves cookie jars)"""
+        with self._lock:
+            instances = [ydl for idle in self._idle.values() for _, ydl in idle]
+            self._idle.clear()
+            self._idle_count = 0
+        for ydl in instances:
+            ydl.close()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool():
+    """Get the process-wide pool, closed automatically at exit"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = YoutubeDLPool()
+            atexit.register(_default_pool.close)
+        return _default_pool
+
+
+def checkout(ydl_opts):
+    """Shortcut for get_default_pool().checkout(ydl_opts)"""
+    return get_default_pool().checkout(ydl_opts)
@@ -9,13 +9,34 @@ import yt_dlp
 import sys
 import re
 import os
-import random
+import json
 import time
 import shutil
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metadata_cache
+from download_archive import get_archive_profile, get_default_archive
+from audio_formats import build_audio_options, find_native_stream
+import ydl_pool
+from ffmpeg_pool import PostProcessQueue
+from playlist_engine import PlaylistDownloader, DEFAULT_SYNC_STOP_AFTER
+from job_journal import get_default_journal, get_resume_options
 
 # Path to cookies file - place cookies.txt in the same folder as this script
 COOKIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cookies.txt')
 
+# Number of playlist videos downloaded at the same time
+PLAYLIST_WORKERS = 4
+
+# Number of batch lines downloaded at the same time
+BATCH_WORKERS = 4
+BATCH_MODES = ('video', 'audio', 'm4a')
+
+# Skip videos recorded in the download archive (--no-archive turns it off)
+USE_ARCHIVE = True
+
 # VPS-friendly options to help bypass YouTube restrictions
 VPS_OPTIONS = {
     # Bypass geo-restrictions
@@ -27,11 +48,6 @@ VPS_OPTIONS = {
     'fragment_retries': 10,
     'file_access_retries': 5,
     
-    # Sleep between requests to avoid rate limiting
-    'sleep_interval': 1,
-    'max_sleep_interval': 5,
-    'sleep_interval_requests': 1,
-    
     # HTTP settings
     'socket_timeout': 30,
     'http_headers': {
@@ -99,6 +115,81 @@ def get_playlist_url(playlist_id):
     return f"https://www.youtube.com/playlist?list={playlist_id}"
 
 
+def get_channel_videos_url(url):
+    """
+    Get the tab URL of a channel URL (youtube.com/@name -> youtube.com/@name/videos),
+    None if the URL is not a channel. Channel tabs list the newest videos first.
+    """
+    match = re.match(r'(?:https?://)?(?:www\.|m\.)?youtube\.com/((?:@|channel/|c/|user/)[^/?#]+)(/[^?#]*)?', url.strip())
+    if not match:
+        return None
+    tab = (match.group(2) or '').strip('/')
+    return f"https://www.youtube.com/{match.group(1)}/{tab or 'videos'}"
+
+
+def get_cache_key(url, playlist_mode=False):
+    """Get the metadata cache key for a URL (None if it should not be cached)"""
+    if playlist_mode:
+        playlist_id = extract_playlist_id(url)
+        return f"playlist:{playlist_id}" if playlist_id else None
+    
+    video_id = extract_video_id(url)
+    if video_id:
+        return f"video:{video_id}"
+    
+    # Bare playlist URLs are fully extracted here, don't mix them with flat listings
+    if is_playlist_url(url):
+        return None
+    
+    return f"url:{url.strip()}"
+
+
+def get_archive_id(url):
+    """Download archive ID of a video URL without extracting it (None for playlists / unknown URLs)"""
+    video_id = extract_video_id(url)
+    return yt_dlp.utils.make_archive_id('Youtube', video_id) if video_id else None
+
+
+def find_archived_download(url, ydl_opts, info=None):
+    """
+    The archive record of this single video for these options, or None.
+    A video whose recorded file was deleted since is forgotten, so it downloads again.
+    """
+    archive = ydl_opts.get('download_archive')
+    if archive is None:
+        return None
+    archive_id = get_archive_id(url)
+    if not archive_id and info and info.get('extractor_key') and info.get('id'):
+        archive_id = yt_dlp.utils.make_archive_id(info['extractor_key'], info['id'])
+    if not archive_id or archive_id not in archive:
+        return None
+    
+    archived = archive.get(archive_id) or {'filepath': None, 'title': None}
+    if archived['filepath'] and not os.path.exists(archived['filepath']):
+        archive.forget(archive_id)
+        return None
+    return archived
+
+
+def report_archived(url, ydl_opts, info=None):
+    """Tell the user when this video was downloaded before, returns True if so"""
+    archived = find_archived_download(url, ydl_opts, info)
+    if not archived:
+        return False
+    where = f": {archived['filepath']}" if archived['filepath'] else ""
+    print(f"\n[ARCHIVE] Already downloaded{where}")
+    print("          Run with --no-archive to download it again.")
+    return True
+
+
+def get_cached_info(url, playlist_mode=False):
+    """Get the info dict from an earlier probe of this URL, if still cached"""
+    cache_key = get_cache_key(url, playlist_mode)
+    if not cache_key:
+        return None
+    return metadata_cache.get_default_cache().get(cache_key)
+
+
 def validate_url(url):
     """Validate YouTube URL"""
     url = url.strip()
@@ -127,6 +218,15 @@ def get_video_info(url, playlist_mode=False):
         **VPS_OPTIONS,
     }
     
+    # Serve repeat lookups from the metadata cache
+    cache = metadata_cache.get_default_cache()
+    cache_key = get_cache_key(url, playlist_mode)
+    if cache_key:
+        info = cache.get(cache_key)
+        if info:
+            print("Using cached information...")
+            return info
+    
     # Add cookies if file exists
     if os.path.exists(COOKIES_FILE):
         ydl_opts['cookiefile'] = COOKIES_FILE
@@ -134,11 +234,9 @@ def get_video_info(url, playlist_mode=False):
     else:
         print(f"Warning: cookies.txt not found at {COOKIES_FILE}")
     
-    # Add random delay to avoid detection
-    time.sleep(random.uniform(0.5, 2))
-    
+    # No fixed delay, the shared rate limiter only slows down once the site throttles us
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        with ydl_pool.checkout(ydl_opts) as ydl:
             print("Extracting information...")
             info = ydl.extract_info(url, download=False)
             
@@ -146,6 +244,8 @@ def get_video_info(url, playlist_mode=False):
                 print("Error: Could not extract information")
                 return None
             
+            info = ydl.sanitize_info(info)
+            cache.put(cache_key, info)
             return info
             
     except Exception as e:
@@ -184,9 +284,8 @@ def display_playlist_info(info):
     return video_count
 
 
-def download_video(url, quality='best', playlist_mode=False, playlist_items=None):
-    """Download video with specified quality"""
-    
+def get_video_options(quality='best', playlist_mode=False, playlist_items=None):
+    """yt-dlp options for a video download"""
     quality_options = {
         'best': 'bestvideo+bestaudio/best',
         '2160p': 'bestvideo[height<=2160]+bestaudio/best[height<=2160]',
@@ -216,28 +315,14 @@ def download_video(url, quality='best', playlist_mode=False, playlist_items=None
     if os.path.exists(COOKIES_FILE):
         ydl_opts['cookiefile'] = COOKIES_FILE
     
-    # Add random delay before download
-    delay = random.uniform(1, 3)
-    print(f"Waiting {delay:.1f}s before starting download...")
-    time.sleep(delay)
+    if USE_ARCHIVE:
+        ydl_opts['download_archive'] = get_default_archive().view(get_archive_profile(ydl_opts))
     
-    try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            mode_text = "PLAYLIST" if playlist_mode else "VIDEO"
-            print(f"\nDownloading {mode_text} with quality: {quality}...")
-            ydl.download([url])
-            print(f"\n[SUCCESS] {mode_text} download completed!")
-            return True
-            
-    except Exception as e:
-        print(f"\n[ERROR] Error downloading:")
-        print(f"   {str(e)}")
-        return False
+    return ydl_opts
 
 
-def download_audio(url, quality='320', playlist_mode=False, playlist_items=None):
-    """Download audio and convert to MP3"""
-    
+def get_audio_options(quality='320', playlist_mode=False, playlist_items=None, codec='mp3'):
+    """yt-dlp options for an audio download in `codec`"""
     audio_quality_map = {
         '320': '0',
         '256': '1',
@@ -250,17 +335,12 @@ def download_audio(url, quality='320', playlist_mode=False, playlist_items=None)
     quality_setting = audio_quality_map.get(quality, '0')
     
     ydl_opts = {
-        'format': 'bestaudio/best',
         'outtmpl': '%(playlist_title)s/%(title)s.%(ext)s' if playlist_mode else '%(title)s.%(ext)s',
         'progress_hooks': [progress_hook],
         'noplaylist': not playlist_mode,
         'ignoreerrors': True if playlist_mode else False,
         **VPS_OPTIONS,
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': quality_setting,
-        }],
+        **build_audio_options(codec, quality_setting),
     }
     
     if playlist_items:
@@ -270,18 +350,87 @@ def download_audio(url, quality='320', playlist_mode=False, playlist_items=None)
     if os.path.exists(COOKIES_FILE):
         ydl_opts['cookiefile'] = COOKIES_FILE
     
-    # Add random delay before download
-    delay = random.uniform(1, 3)
-    print(f"Waiting {delay:.1f}s before starting download...")
-    time.sleep(delay)
+    if USE_ARCHIVE:
+        ydl_opts['download_archive'] = get_default_archive().view(get_archive_profile(ydl_opts))
+    
+    return ydl_opts
+
+
+def download_video(url, quality='best', playlist_mode=False, playlist_items=None, info=None, workers=PLAYLIST_WORKERS):
+    """Download video with specified quality (reuses `info` from an earlier probe if given)"""
+    
+    ydl_opts = get_video_options(quality, playlist_mode, playlist_items)
+    
+    # Skip a second extraction when this URL was probed recently
+    if info is None:
+        info = get_cached_info(url, playlist_mode)
+    
+    if not playlist_mode and report_archived(url, ydl_opts, info):
+        return True
+    
+    try:
+        mode_text = "PLAYLIST" if playlist_mode else "VIDEO"
+        if playlist_mode and workers > 1:
+            print(f"\nDownloading {mode_text} with quality: {quality} ({workers} at a time)...")
+            download_playlist_entries(url, ydl_opts, info, playlist_items, workers)
+            print(f"\n[SUCCESS] {mode_text} download completed!")
+            return True
+        
+        # In a playlist, the next video downloads while ffmpeg handles the previous one
+        postprocessing = PostProcessQueue()
+        with ydl_pool.checkout({**ydl_opts, 'postprocess_queue': postprocessing}) as ydl:
+            print(f"\nDownloading {mode_text} with quality: {quality}...")
+            metadata_cache.download_with_info(ydl, url, info)
+        postprocessing.wait()
+        print(f"\n[SUCCESS] {mode_text} download completed!")
+        return True
+            
+    except Exception as e:
+        print(f"\n[ERROR] Error downloading:")
+        print(f"   {str(e)}")
+        return False
+
+
+def download_audio(url, quality='320', playlist_mode=False, playlist_items=None, info=None, workers=PLAYLIST_WORKERS,
+                   codec='mp3'):
+    """
+    Download audio as `codec` (MP3 by default), reusing `info` from an earlier probe if given.
+    A stream already in that codec is preferred, so it is only copied, not re-encoded.
+    """
+    
+    ydl_opts = get_audio_options(quality, playlist_mode, playlist_items, codec)
+    
+    # Skip a second extraction when this URL was probed recently
+    if info is None:
+        info = get_cached_info(url, playlist_mode)
+    
+    if not playlist_mode and report_archived(url, ydl_opts, info):
+        return True
+    
+    # Tell the user up front whether this is a copy or a transcode
+    if info and not playlist_mode and find_native_stream(info, codec):
+        action = f"keeping the original {codec.upper()} stream (no re-encoding)"
+    elif codec == 'mp3':
+        action = f"converting to MP3 ({quality} kbps)"
+    else:
+        action = f"converting to {codec.upper()}"
     
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            mode_text = "PLAYLIST AUDIO" if playlist_mode else "AUDIO"
-            print(f"\nDownloading {mode_text} and converting to MP3 ({quality} kbps)...")
-            ydl.download([url])
+        mode_text = "PLAYLIST AUDIO" if playlist_mode else "AUDIO"
+        if playlist_mode and workers > 1:
+            print(f"\nDownloading {mode_text}, {action} ({workers} at a time)...")
+            download_playlist_entries(url, ydl_opts, info, playlist_items, workers)
             print(f"\n[SUCCESS] {mode_text} download and conversion completed!")
             return True
+        
+        # In a playlist, the next video downloads while ffmpeg handles the previous one
+        postprocessing = PostProcessQueue()
+        with ydl_pool.checkout({**ydl_opts, 'postprocess_queue': postprocessing}) as ydl:
+            print(f"\nDownloading {mode_text}, {action}...")
+            metadata_cache.download_with_info(ydl, url, info)
+        postprocessing.wait()
+        print(f"\n[SUCCESS] {mode_text} download and conversion completed!")
+        return True
             
     except Exception as e:
         print(f"\n[ERROR] Error downloading audio:")
@@ -289,6 +438,134 @@ def download_audio(url, quality='320', playlist_mode=False, playlist_items=None)
         return False
 
 
+def format_bytes(size):
+    """Human readable size (e.g. 3.6 GB)"""
+    size = float(size or 0)
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def describe_interrupted(download):
+    """One line about an interrupted download: title and how much of it is on disk"""
+    done = format_bytes(download['bytes'])
+    if download['total']:
+        done = f"{done} of {format_bytes(download['total'])}"
+    return f"{download['title'] or download['url']} ({done} kept)"
+
+
+def resume_interrupted():
+    """
+    Continue every download the job journal says was cut short (crash, closed
+    window, killed process): the same formats to the same files, so only the
+    missing bytes are fetched. Downloads that failed with an error are left
+    out, downloading their URL again continues them.
+    """
+    interrupted = get_default_journal().interrupted()
+    if not interrupted:
+        print("Nothing to resume.")
+        return True
+    
+    ok = True
+    for download in interrupted:
+        print(f"\nResuming: {describe_interrupted(download)}")
+        ydl_opts = {
+            'progress_hooks': [progress_hook],
+            **VPS_OPTIONS,
+            **get_resume_options(download),
+        }
+        if USE_ARCHIVE:
+            ydl_opts['download_archive'] = get_default_archive().view(get_archive_profile(ydl_opts))
+        try:
+            postprocessing = PostProcessQueue()
+            with ydl_pool.checkout({**ydl_opts, 'postprocess_queue': postprocessing}) as ydl:
+                ydl.download([download['url']])
+            postprocessing.wait()
+            print(f"\n[SUCCESS] Saved to {download['output']}")
+        except Exception as e:
+            print(f"\n[ERROR] Could not resume {download['url']}:")
+            print(f"   {str(e)}")
+            ok = False
+    return ok
+
+
+def download_playlist_entries(url, ydl_opts, info=None, playlist_items=None, workers=PLAYLIST_WORKERS):
+    """Download playlist videos in parallel, returns the per-video results in playlist order"""
+    # Per-video progress lines would interleave, show the playlist totals instead
+    entry_opts = {**ydl_opts, 'progress_hooks': [], 'quiet': True, 'noprogress': True}
+    downloader = PlaylistDownloader(entry_opts, workers=workers, on_progress=playlist_progress_hook)
+    results = downloader.download(url, info=info, playlist_items=playlist_items)
+    
+    failed = [r for r in results if r['status'] not in ('ok', 'archived')]
+    archived = [r for r in results if r['status'] == 'archived']
+    print()
+    for r in failed:
+        print(f"   [SKIPPED] {r['index']}. {r['title'] or r['id']}: {r['error']}")
+    archived_text = f" ({len(archived)} already downloaded before)" if archived else ""
+    print(f"Downloaded {len(results) - len(failed) - len(archived)} of {len(results)} videos{archived_text}")
+    return results
+
+
+def sync_playlist(url, mode='video', quality=None, workers=PLAYLIST_WORKERS, stop_after=DEFAULT_SYNC_STOP_AFTER):
+    """
+    Download only what was added to a channel or playlist since the last run.
+    The listing is walked newest first and paging stops at the first video
+    already in the download archive, so old pages are never fetched.
+    Returns True if every new video downloaded.
+    """
+    playlist_id = extract_playlist_id(url)
+    sync_url = get_playlist_url(playlist_id) if playlist_id else get_channel_videos_url(url)
+    if not sync_url:
+        print(f"Error: not a channel or playlist URL: {url}")
+        return False
+    if not USE_ARCHIVE:
+        print("Error: sync needs the download archive, don't combine it with --no-archive")
+        return False
+    
+    if mode == 'video':
+        ydl_opts = get_video_options(quality or 'best', playlist_mode=True)
+    else:
+        ydl_opts = get_audio_options(quality or '320', playlist_mode=True, codec='m4a' if mode == 'm4a' else 'mp3')
+    
+    # Regular playlists list their oldest video first, new ones are appended at the end.
+    # Only channel tabs and uploads playlists (UU...) can stop at the first archived video.
+    newest_first = not playlist_id or playlist_id.startswith('UU')
+    if newest_first:
+        print(f"\nChecking {sync_url} for new videos...")
+    else:
+        print(f"\nChecking {sync_url} for new videos (whole playlist, it is listed oldest first)...")
+    try:
+        info = PlaylistDownloader(ydl_opts).expand_new(sync_url, stop_after=stop_after, newest_first=newest_first)
+    except Exception as e:
+        print("\n[ERROR] Error fetching the listing:")
+        print(f"   {str(e)}")
+        return False
+    if not info:
+        print("Error: Could not extract information")
+        return False
+    
+    new_count = len(info['entries'])
+    title = info.get('title') or info.get('id')
+    if not new_count:
+        print(f"[UP TO DATE] Nothing new in: {title}")
+        return True
+    
+    print(f"{new_count} new video(s) in: {title}")
+    results = download_playlist_entries(sync_url, ydl_opts, info=info, workers=workers)
+    return all(r['status'] in ('ok', 'archived') for r in results)
+
+
+def playlist_progress_hook(stats):
+    """Display aggregated playlist progress"""
+    done = stats['entries_done'] + stats['entries_failed']
+    size_str = f"{stats['downloaded_bytes'] / (1024*1024):.1f} MB"
+    speed = stats['speed']
+    speed_str = f"{speed / (1024*1024):.2f} MB/s" if speed else "Unknown"
+    print(f"\rPlaylist: {done}/{stats['entries_total']} videos | {size_str} | Speed: {speed_str}   ", end='', flush=True)
+
+
 def progress_hook(d):
     """Display download progress"""
     if d['status'] == 'downloading':
@@ -359,7 +636,220 @@ def select_audio_quality():
     return audio_quality_map.get(audio_choice, '320')
 
 
+def parse_batch_line(line, default_mode='video', default_quality=None):
+    """
+    Parse one batch line: "URL [mode] [quality]", e.g. "https://youtu.be/ID audio 192".
+    Returns None for blank lines and # comments, raises ValueError for a bad mode.
+    """
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    
+    parts = line.split()
+    url = parts[0]
+    mode = parts[1].lower() if len(parts) > 1 else default_mode
+    if mode not in BATCH_MODES:
+        raise ValueError(f"unknown mode '{parts[1]}' (use {', '.join(BATCH_MODES)})")
+    
+    quality = parts[2] if len(parts) > 2 else default_quality
+    if not quality:
+        quality = 'best' if mode == 'video' else '320'
+    return {'url': url, 'mode': mode, 'quality': quality.lower().replace('kbps', '')}
+
+
+def read_batch(source, default_mode='video', default_quality=None):
+    """Read batch items from a file path or '-' for stdin, bad lines become error items"""
+    if source == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    
+    items = []
+    for number, line in enumerate(lines, 1):
+        try:
+            item = parse_batch_line(line, default_mode, default_quality)
+        except ValueError as e:
+            item = {'url': line.split()[0], 'mode': None, 'quality': None, 'error': str(e)}
+        if item:
+            item['line'] = number
+            items.append(item)
+    return items
+
+
+def download_batch_item(item):
+    """Download one batch item without any prompts, returns its manifest record"""
+    record = {
+        'line': item.get('line'),
+        'url': item['url'],
+        'mode': item.get('mode'),
+        'quality': item.get('quality'),
+        'status': 'error',
+        'title': None,
+        'output': None,
+        'files': [],
+        'bytes': 0,
+        'duration': 0.0,
+        'error': item.get('error'),
+        'started_at': time.time(),
+    }
+    started = time.perf_counter()
+    
+    try:
+        if record['error']:
+            return record
+        
+        url = item['url'].strip()
+        if not validate_url(url):
+            record['error'] = 'Invalid YouTube URL'
+            return record
+        
+        # Same rules as the interactive defaults: video+playlist URLs mean the single video
+        video_id = extract_video_id(url)
+        playlist_id = extract_playlist_id(url)
+        playlist_mode = bool(playlist_id and not video_id)
+        if playlist_mode:
+            url = get_playlist_url(playlist_id)
+        elif video_id:
+            url = get_clean_video_url(video_id)
+        
+        if item['mode'] == 'video':
+            ydl_opts = get_video_options(item['quality'], playlist_mode)
+        else:
+            codec = 'm4a' if item['mode'] == 'm4a' else 'mp3'
+            ydl_opts = get_audio_options(item['quality'], playlist_mode, codec=codec)
+        ydl_opts.update({'quiet': True, 'no_warnings': True, 'noprogress': True, 'progress_hooks': []})
+        
+        info = get_cached_info(url, playlist_mode)
+        archived = None if playlist_mode else find_archived_download(url, ydl_opts, info)
+        if archived:
+            record.update(status='archived', title=archived['title'], output=archived['filepath'])
+            return record
+        
+        if playlist_mode:
+            results = PlaylistDownloader(ydl_opts, workers=PLAYLIST_WORKERS).download(url, info=info)
+            record['files'] = [r['filepath'] for r in results if r['status'] == 'ok' and r['filepath']]
+            failed = [r for r in results if r['status'] not in ('ok', 'archived')]
+            record['title'] = (info or {}).get('title')
+            if failed:
+                record['error'] = f"{len(failed)} of {len(results)} videos failed"
+            elif results and not record['files']:
+                record['status'] = 'archived'
+                return record
+        else:
+            postprocessing = PostProcessQueue()
+            ydl_opts.update({'post_hooks': [record['files'].append], 'postprocess_queue': postprocessing})
+            with ydl_pool.checkout(ydl_opts) as ydl:
+                result = metadata_cache.download_with_info(ydl, url, info)
+            postprocessing.wait()
+            record['title'] = (result or {}).get('title')
+            # URLs that only tell their ID once extracted are skipped by yt-dlp itself
+            if not record['files'] and result:
+                entries = [entry for entry in result.get('entries') or [result] if entry]
+                archived = [find_archived_download(url if entry is result else '', ydl_opts, entry) for entry in entries]
+                if archived and all(archived):
+                    record.update(status='archived', output=archived[0]['filepath'] if len(archived) == 1 else None)
+                    return record
+        
+        record['bytes'] = sum(os.path.getsize(path) for path in record['files'] if os.path.exists(path))
+        if len(record['files']) == 1:
+            record['output'] = record['files'][0]
+        if record['files'] and not record['error']:
+            record['status'] = 'ok'
+        elif record['files']:
+            record['status'] = 'partial'
+        elif not record['error']:
+            record['error'] = 'No file was produced'
+    except Exception as e:
+        record['error'] = str(e)
+    finally:
+        record['duration'] = round(time.perf_counter() - started, 3)
+        record['finished_at'] = time.time()
+    return record
+
+
+def run_batch(source, manifest_path, workers=BATCH_WORKERS, default_mode='video', default_quality=None):
+    """
+    Download every line of a batch file (or stdin) over `workers` threads.
+    One JSON record per item is appended to the manifest as soon as it finishes.
+    Returns True when every item succeeded.
+    """
+    items = read_batch(source, default_mode, default_quality)
+    print(f"Batch: {len(items)} items, {workers} at a time, manifest: {manifest_path}")
+    
+    lock = threading.Lock()
+    counts = {'ok': 0, 'archived': 0, 'partial': 0, 'error': 0}
+    
+    with open(manifest_path, 'a', encoding='utf-8') as manifest:
+        def run(item):
+            record = download_batch_item(item)
+            with lock:
+                manifest.write(json.dumps(record) + "\n")
+                manifest.flush()
+                counts[record['status']] += 1
+                done = sum(counts.values())
+                size_str = f"{record['bytes'] / (1024*1024):.1f} MB"
+                if record['status'] == 'archived':
+                    detail = f"already downloaded {record['output'] or ''}".rstrip()
+                elif record['files']:
+                    detail = record['output'] or f"{len(record['files'])} files"
+                else:
+                    detail = record['error']
+                print(f"[{done}/{len(items)}] {record['status'].upper():<7} {item['url']} ({size_str}, {record['duration']:.1f}s) {detail}")
+        
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='batch') as pool:
+            list(pool.map(run, items))
+    
+    print(f"\nBatch finished: {counts['ok']} ok, {counts['archived']} already downloaded, "
+          f"{counts['partial']} partial, {counts['error']} failed")
+    return counts['partial'] == 0 and counts['error'] == 0
+
+
+def parse_args(argv=None):
+    """Command line options (no options = interactive mode)"""
+    parser = argparse.ArgumentParser(description="Download YouTube videos, playlists and audio")
+    parser.add_argument('url', nargs='?', help="video or playlist URL (asked for when missing)")
+    parser.add_argument('--batch', metavar='FILE',
+                        help="non-interactive: download every URL in FILE ('-' for stdin), "
+                             "one per line as: URL [video|audio|m4a] [quality]")
+    parser.add_argument('--workers', type=int, default=BATCH_WORKERS, help=f"batch downloads at the same time (default: {BATCH_WORKERS})")
+    parser.add_argument('--manifest', metavar='PATH', help="JSON-lines results file (default: batch-<date>.jsonl)")
+    parser.add_argument('--mode', choices=BATCH_MODES, default='video',
+                        help="batch / sync mode (for batch lines without one, default: video)")
+    parser.add_argument('--quality', help="batch / sync quality (for batch lines without one, e.g. 720p, 192)")
+    parser.add_argument('--no-archive', action='store_true',
+                        help="download again even if the download archive says it was fetched before")
+    parser.add_argument('--sync', action='store_true',
+                        help="non-interactive: download only the videos added to the channel / playlist URL "
+                             "since the last sync (channels stop at the first videos already downloaded, "
+                             "playlists are listed oldest first and read in full)")
+    parser.add_argument('--resume', action='store_true',
+                        help="non-interactive: continue the downloads that were interrupted last time")
+    parser.add_argument('--sync-stop-after', type=int, default=DEFAULT_SYNC_STOP_AFTER, metavar='N',
+                        help=f"stop paging a channel after N already downloaded videos in a row (default: {DEFAULT_SYNC_STOP_AFTER})")
+    return parser.parse_args(argv)
+
+
 def main():
+    global USE_ARCHIVE
+    args = parse_args()
+    USE_ARCHIVE = not args.no_archive
+    
+    if args.resume:
+        sys.exit(0 if resume_interrupted() else 1)
+    
+    if args.sync:
+        if not args.url:
+            print("Error: --sync needs a channel or playlist URL")
+            sys.exit(2)
+        ok = sync_playlist(args.url, args.mode, args.quality, stop_after=max(1, args.sync_stop_after))
+        sys.exit(0 if ok else 1)
+    
+    if args.batch:
+        manifest_path = args.manifest or time.strftime("batch-%Y%m%d-%H%M%S.jsonl")
+        ok = run_batch(args.batch, manifest_path, args.workers, args.mode, args.quality)
+        sys.exit(0 if ok else 1)
+    
     print("=" * 70)
     print("       YouTube Video/Audio Downloader")
     print("          Supports Videos & Playlists")
@@ -370,9 +860,15 @@ def main():
         print("\n[WARNING] ffmpeg not found! Audio/MP3 conversion may not work.")
         print("          Install ffmpeg: https://ffmpeg.org/download.html")
     
+    interrupted = get_default_journal().interrupted()
+    if interrupted:
+        print(f"\n[INFO] {len(interrupted)} interrupted download(s) can be continued with --resume:")
+        for download in interrupted[:5]:
+            print(f"   {describe_interrupted(download)}")
+    
     # Get URL
-    if len(sys.argv) > 1:
-        url = sys.argv[1]
+    if args.url:
+        url = args.url
     else:
         url = input("\nEnter YouTube URL (video or playlist): ").strip()
     
@@ -476,18 +972,23 @@ def main():
     print("=" * 70)
     print("1. VIDEO (MP4)")
     print("2. AUDIO (MP3)")
+    print("3. AUDIO (M4A, original stream - no re-encoding when available)")
     print("=" * 70)
     
-    mode_choice = input("\nSelect mode (1 for Video, 2 for Audio) [default: 1]: ").strip()
+    mode_choice = input("\nSelect mode (1 for Video, 2 for Audio, 3 for M4A) [default: 1]: ").strip()
     
     if mode_choice == '2':
         # Audio mode
         audio_quality = select_audio_quality()
-        download_audio(url, audio_quality, playlist_mode=download_playlist, playlist_items=playlist_items)
+        download_audio(url, audio_quality, playlist_mode=download_playlist, playlist_items=playlist_items, info=info)
+    elif mode_choice == '3':
+        # M4A mode, quality only applies if the audio has to be converted
+        download_audio(url, '320', playlist_mode=download_playlist, playlist_items=playlist_items, info=info,
+                       codec='m4a')
     else:
         # Video mode
         video_quality = select_video_quality()
-        download_video(url, video_quality, playlist_mode=download_playlist, playlist_items=playlist_items)
+        download_video(url, video_quality, playlist_mode=download_playlist, playlist_items=playlist_items, info=info)
 
 
 if __name__ == "__main__":
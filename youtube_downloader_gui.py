@@ -5,35 +5,74 @@ import sys
 import os
 import shutil
 from tkinter import filedialog, messagebox
-import yt_dlp
 import re
 import time
 import random
 import zipfile
+import logging
+import urllib.request
+import metadata_cache
+import thumbnail_cache
+from audio_formats import build_audio_options
+import ydl_pool
+from ffmpeg_pool import PostProcessQueue
+from playlist_engine import SelectionBitset, parse_playlist_items
+from ui_bus import UIUpdateBus
+from log_buffer import LogRingBuffer, get_level
+from debounce import DebouncedWorker
+from download_queue import DownloadQueue, DEFAULT_SLOTS, MAX_SLOTS
+from cancellation import CancelToken
+from app_paths import get_app_dir, get_app_path
+from download_archive import get_archive_profile, get_default_archive
+from job_journal import get_default_journal, get_resume_options
+from youtube_downloader import get_cache_key, get_cached_info, find_archived_download, get_archive_id
 try:
     from PIL import Image
-    from io import BytesIO
-    import urllib.request
     HAS_PIL = True
 except ImportError:
     HAS_PIL = False
 
+# Playlist entries are handed to the selection dialog this many at a time
+PLAYLIST_PAGE_SIZE = 50
+
 # Set theme
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("blue")
 
 class PlaylistSelectionDialog(ctk.CTkToplevel):
-    def __init__(self, parent, video_list, title="Select Videos"):
+    """
+    Checklist of playlist videos that fills in while the playlist is still being
+    listed. Only the visible rows have widgets (scrolling re-labels them) and the
+    selection is a bitset, so long playlists open instantly. Thumbnails of the
+    visible rows are loaded in the background by the shared thumbnail cache.
+    """
+    VISIBLE_ROWS = 15
+    THUMBNAIL_SIZE = (48, 27)
+
+    def __init__(self, parent, video_list=None, title="Select Videos"):
         super().__init__(parent)
         self.title(title)
-        self.geometry("600x600")
+        self.geometry("600x760")
         self.result = None
         
-        self.video_list = video_list # List of dicts: {'id': 1, 'title': '...'}
-        self.check_vars = []
+        self.titles = []
+        self.thumbnails = [] # (video ID, thumbnail URL) or None, per video
+        self.thumb_images = {} # video ID -> CTkImage
+        self.thumb_requests = {} # video ID -> Future, requested once each
+        self.ui_bus = getattr(parent, 'ui_bus', None)
+        self.show_thumbnails = HAS_PIL and self.ui_bus is not None
+        if self.show_thumbnails:
+            self.thumbnail_cache = thumbnail_cache.get_default_cache()
+            blank = Image.new("RGB", thumbnail_cache.DEFAULT_THUMBNAIL_SIZE, (60, 60, 60))
+            self.placeholder = ctk.CTkImage(light_image=blank, dark_image=blank, size=self.THUMBNAIL_SIZE)
+        self.selection = SelectionBitset()
+        self.view = None # Positions matching the filter, None = every video
+        self.first_row = 0
+        self.loading = True
+        self.closed = threading.Event() # Tells the listing thread to stop paging
         
         # Header
-        self.label = ctk.CTkLabel(self, text=f"Select Videos to Download ({len(video_list)} found)", font=ctk.CTkFont(size=16, weight="bold"))
+        self.label = ctk.CTkLabel(self, text="Loading videos...", font=ctk.CTkFont(size=16, weight="bold"))
         self.label.pack(pady=10)
         
         # Buttons Frame
@@ -46,52 +85,394 @@ class PlaylistSelectionDialog(ctk.CTkToplevel):
         self.deselect_all_btn = ctk.CTkButton(self.btn_frame, text="Deselect All", width=100, command=self.deselect_all)
         self.deselect_all_btn.pack(side="left", padx=5)
         
-        # Scrollable List
-        self.scroll_frame = ctk.CTkScrollableFrame(self)
-        self.scroll_frame.pack(fill="both", expand=True, padx=20, pady=10)
-        
-        for i, video in enumerate(self.video_list):
-            var = ctk.BooleanVar(value=True) # Default selected
-            self.check_vars.append(var)
-            idx = i + 1
-            title = video.get('title', 'Unknown')
-            chk = ctk.CTkCheckBox(self.scroll_frame, text=f"{idx}. {title}", variable=var)
-            chk.pack(anchor="w", pady=2)
+        # Filter: narrows the list, the buttons act on every match
+        self.filter_frame = ctk.CTkFrame(self, fg_color="transparent")
+        self.filter_frame.pack(fill="x", padx=20, pady=5)
+        
+        self.filter_entry = ctk.CTkEntry(self.filter_frame, placeholder_text="Filter by title...")
+        self.filter_entry.pack(side="left", fill="x", expand=True, padx=5)
+        self.filter_entry.bind("<KeyRelease>", lambda event: self.apply_filter())
+        
+        ctk.CTkButton(self.filter_frame, text="Select Shown", width=110,
+                      command=lambda: self.select_shown(True)).pack(side="left", padx=5)
+        ctk.CTkButton(self.filter_frame, text="Deselect Shown", width=110,
+                      command=lambda: self.select_shown(False)).pack(side="left", padx=5)
+        
+        # Range: same syntax as yt-dlp's --playlist-items
+        self.range_frame = ctk.CTkFrame(self, fg_color="transparent")
+        self.range_frame.pack(fill="x", padx=20, pady=5)
+        
+        self.range_entry = ctk.CTkEntry(self.range_frame, placeholder_text="Range, e.g. 1-50,80,-10:")
+        self.range_entry.pack(side="left", fill="x", expand=True, padx=5)
+        
+        ctk.CTkButton(self.range_frame, text="Select Range", width=110,
+                      command=lambda: self.select_range(True)).pack(side="left", padx=5)
+        ctk.CTkButton(self.range_frame, text="Deselect Range", width=110,
+                      command=lambda: self.select_range(False)).pack(side="left", padx=5)
+        
+        # Virtual list: a fixed set of rows over a scrollbar
+        self.list_frame = ctk.CTkFrame(self)
+        self.list_frame.pack(fill="both", expand=True, padx=20, pady=10)
+        
+        self.scrollbar = ctk.CTkScrollbar(self.list_frame, command=self.on_scroll)
+        self.scrollbar.pack(side="right", fill="y")
+        
+        self.rows = []
+        for row in range(self.VISIBLE_ROWS):
+            row_frame = ctk.CTkFrame(self.list_frame, fg_color="transparent")
+            row_frame.pack(fill="x", padx=10, pady=1)
+            thumb = None
+            if self.show_thumbnails:
+                thumb = ctk.CTkLabel(row_frame, text="", image=self.placeholder)
+                thumb.pack(side="left", padx=(0, 8))
+            var = ctk.BooleanVar(value=False)
+            chk = ctk.CTkCheckBox(row_frame, text="", variable=var, command=lambda r=row: self.toggle_row(r))
+            chk.pack(side="left")
+            self.rows.append((chk, var, thumb))
+        
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.bind(sequence, self.on_mousewheel)
             
         # Action Buttons
-        self.confirm_btn = ctk.CTkButton(self, text="Confirm Selection", command=self.confirm)
+        self.confirm_btn = ctk.CTkButton(self, text="Confirm Selection", command=self.confirm, state="disabled")
         self.confirm_btn.pack(pady=20)
         
+        if video_list is not None:
+            self.add_entries(video_list)
+            self.finish_loading()
+        else:
+            self.render()
+    
+    def add_entries(self, entries):
+        """Append a page of (flat) playlist entries, selected by default"""
+        if self.closed.is_set():
+            return
+        start = len(self.titles)
+        for entry in entries:
+            entry = entry or {}
+            self.titles.append(entry.get('title') or entry.get('id') or 'Unknown')
+            url = thumbnail_cache.get_thumbnail_url(entry)
+            self.thumbnails.append((entry.get('id') or url, url) if url else None)
+        self.selection.extend(len(entries))
+        if self.view is not None:
+            needle = self.filter_entry.get().strip().lower()
+            self.view.extend(pos for pos in range(start, len(self.titles)) if needle in self.titles[pos].lower())
+        self.update_header()
+        self.render()
+    
+    def finish_loading(self, error=None):
+        if self.closed.is_set():
+            return
+        self.loading = False
+        if error:
+            self.label.configure(text=error)
+            return
+        self.update_header()
+        self.confirm_btn.configure(state="normal")
+    
+    def update_header(self):
+        if self.loading:
+            text = f"Loading videos... {len(self.titles)} found so far"
+        else:
+            text = f"Select Videos to Download ({len(self.titles)} found)"
+        if self.view is not None:
+            text += f", {len(self.view)} shown"
+        self.label.configure(text=text)
+    
+    def shown_count(self):
+        return len(self.titles) if self.view is None else len(self.view)
+    
+    def shown_position(self, i):
+        return i if self.view is None else self.view[i]
+    
+    def render(self):
+        """Point the row widgets at the videos from first_row on"""
+        total = self.shown_count()
+        self.first_row = max(0, min(self.first_row, total - self.VISIBLE_ROWS))
+        for row, (chk, var, thumb) in enumerate(self.rows):
+            i = self.first_row + row
+            if i < total:
+                pos = self.shown_position(i)
+                chk.configure(text=f"{pos + 1}. {self.titles[pos]}", state="normal")
+                var.set(self.selection[pos])
+            else:
+                pos = None
+                chk.configure(text="", state="disabled")
+                var.set(False)
+            if thumb is not None:
+                thumb.configure(image=self.get_thumbnail(pos))
+        
+        if total > self.VISIBLE_ROWS:
+            self.scrollbar.set(self.first_row / total, (self.first_row + self.VISIBLE_ROWS) / total)
+        else:
+            self.scrollbar.set(0, 1)
+    
+    def get_thumbnail(self, pos):
+        """CTkImage for a row, the placeholder until its thumbnail is loaded"""
+        source = self.thumbnails[pos] if pos is not None else None
+        if not source:
+            return self.placeholder
+        key, url = source
+        image = self.thumb_images.get(key)
+        if image is None:
+            pil_image = self.thumbnail_cache.peek(key)
+            if pil_image is None:
+                if key not in self.thumb_requests:
+                    self.thumb_requests[key] = self.thumbnail_cache.fetch_async(key, url, self.on_thumbnail_loaded)
+                return self.placeholder
+            image = self.thumb_images[key] = ctk.CTkImage(
+                light_image=pil_image, dark_image=pil_image, size=self.THUMBNAIL_SIZE)
+        return image
+    
+    def on_thumbnail_loaded(self, key, image):
+        # Runs on a thumbnail thread, a burst of loads costs one re-render
+        if image is not None and not self.closed.is_set():
+            self.ui_bus.post(('thumbnails', id(self)), self.refresh_thumbnails)
+    
+    def refresh_thumbnails(self):
+        if not self.closed.is_set():
+            self.render()
+    
+    def scroll_to(self, first_row):
+        self.first_row = first_row
+        self.render()
+    
+    def on_scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * self.shown_count()))
+        elif action == "scroll":
+            step = self.VISIBLE_ROWS if unit == "pages" else 1
+            self.scroll_to(self.first_row + int(amount) * step)
+    
+    def on_mousewheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.first_row - 3)
+        elif event.num == 5 or event.delta < 0:
+            self.scroll_to(self.first_row + 3)
+    
+    def toggle_row(self, row):
+        i = self.first_row + row
+        if i < self.shown_count():
+            self.selection[self.shown_position(i)] = self.rows[row][1].get()
+    
+    def apply_filter(self):
+        needle = self.filter_entry.get().strip().lower()
+        if needle:
+            self.view = [pos for pos, title in enumerate(self.titles) if needle in title.lower()]
+        else:
+            self.view = None
+        self.first_row = 0
+        self.update_header()
+        self.render()
+    
+    def select_shown(self, selected):
+        if self.view is None:
+            self.selection.set_all(selected)
+        else:
+            self.selection.set_many(self.view, selected)
+        self.render()
+    
+    def select_range(self, selected):
+        spec = self.range_entry.get().strip()
+        if not spec:
+            return
+        try:
+            indices = parse_playlist_items(spec, len(self.titles))
+        except Exception:
+            messagebox.showerror("Invalid Range", f"Could not read the range: {spec}", parent=self)
+            return
+        self.selection.set_many((index - 1 for index in indices), selected)
+        self.render()
+        
     def select_all(self):
-        for var in self.check_vars: var.set(True)
+        self.selection.set_all(True)
+        self.render()
         
     def deselect_all(self):
-        for var in self.check_vars: var.set(False)
+        self.selection.set_all(False)
+        self.render()
         
     def confirm(self):
-        selected_indices = []
-        for i, var in enumerate(self.check_vars):
-            if var.get():
-                selected_indices.append(i + 1) # 1-based index for yt-dlp
-        self.result = selected_indices
+        self.result = self.selection
         self.destroy()
+    
+    def destroy(self):
+        self.closed.set()
+        # Thumbnails still queued for this dialog are not needed anymore
+        for future in self.thumb_requests.values():
+            future.cancel()
+        super().destroy()
+
+class DownloadQueueWindow(ctk.CTkToplevel):
+    """
+    Live view of the download queue, one row per download with its own progress.
+    Like the playlist dialog only the visible rows have widgets, so a long batch
+    costs the same to draw as a short one.
+    """
+    VISIBLE_ROWS = 7
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.app = app
+        self.queue = app.download_queue
+        self.title("Download Queue")
+        self.geometry("640x640")
+        self.items = []
+        self.first_row = 0
+        
+        # Header
+        self.header = ctk.CTkFrame(self, fg_color="transparent")
+        self.header.pack(fill="x", padx=20, pady=(15, 5))
+        
+        self.label = ctk.CTkLabel(self.header, text="", font=ctk.CTkFont(size=14, weight="bold"))
+        self.label.pack(side="left")
+        
+        ctk.CTkButton(self.header, text="Clear Finished", width=110,
+                      command=self.queue.clear_finished).pack(side="right", padx=5)
+        
+        self.slots_menu = ctk.CTkOptionMenu(self.header, width=70, values=[str(n) for n in range(1, MAX_SLOTS + 1)],
+                                            command=lambda value: app.set_queue_slots(int(value)))
+        self.slots_menu.set(str(app.queue_slots))
+        self.slots_menu.pack(side="right", padx=5)
+        ctk.CTkLabel(self.header, text="At once:").pack(side="right")
+        
+        # Virtual list: a fixed set of rows over a scrollbar
+        self.list_frame = ctk.CTkFrame(self)
+        self.list_frame.pack(fill="both", expand=True, padx=20, pady=10)
+        
+        self.scrollbar = ctk.CTkScrollbar(self.list_frame, command=self.on_scroll)
+        self.scrollbar.pack(side="right", fill="y")
+        
+        self.rows = []
+        for _ in range(self.VISIBLE_ROWS):
+            row_frame = ctk.CTkFrame(self.list_frame, corner_radius=8)
+            row_frame.pack(fill="x", padx=10, pady=4)
+            top = ctk.CTkFrame(row_frame, fg_color="transparent")
+            top.pack(fill="x", padx=8, pady=(6, 0))
+            remove_btn = ctk.CTkButton(top, text="✕", width=30, fg_color="transparent",
+                                       hover_color=("gray80", "gray25"))
+            remove_btn.pack(side="right")
+            action_btn = ctk.CTkButton(top, text="", width=70)
+            action_btn.pack(side="right", padx=5)
+            title_label = ctk.CTkLabel(top, text="", anchor="w")
+            title_label.pack(side="left", fill="x", expand=True)
+            bar = ctk.CTkProgressBar(row_frame, height=8)
+            bar.pack(fill="x", padx=8, pady=(4, 0))
+            status_label = ctk.CTkLabel(row_frame, text="", anchor="w", font=ctk.CTkFont(size=11),
+                                        text_color="gray")
+            status_label.pack(fill="x", padx=8, pady=(0, 4))
+            self.rows.append((title_label, status_label, bar, action_btn, remove_btn))
+        
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.bind(sequence, self.on_mousewheel)
+        
+        self.render()
+    
+    def render(self):
+        """Redraw the header and point the row widgets at the items from first_row on"""
+        self.items = self.queue.items()
+        counts = {}
+        for item in self.items:
+            counts[item.status] = counts.get(item.status, 0) + 1
+        self.label.configure(
+            text=f"{len(self.items)} downloads: {counts.get('running', 0)} running, "
+                 f"{counts.get('queued', 0)} waiting, "
+                 f"{counts.get('finished', 0) + counts.get('archived', 0)} done, {counts.get('error', 0)} failed")
+        
+        total = len(self.items)
+        self.first_row = max(0, min(self.first_row, total - self.VISIBLE_ROWS))
+        for row, widgets in enumerate(self.rows):
+            i = self.first_row + row
+            self.show_item(widgets, self.items[i] if i < total else None)
+        
+        if total > self.VISIBLE_ROWS:
+            self.scrollbar.set(self.first_row / total, (self.first_row + self.VISIBLE_ROWS) / total)
+        else:
+            self.scrollbar.set(0, 1)
+    
+    def show_item(self, widgets, item):
+        title_label, status_label, bar, action_btn, remove_btn = widgets
+        if item is None:
+            title_label.configure(text="")
+            status_label.configure(text="")
+            bar.set(0)
+            action_btn.configure(text="", state="disabled", command=None)
+            remove_btn.configure(state="disabled", command=None)
+            return
+        
+        title = item.title or item.url
+        if len(title) > 55:
+            title = title[:52] + "..."
+        title_label.configure(text=title)
+        
+        settings = f"{item.mode.capitalize()} {item.quality}"
+        progress = item.progress
+        if item.status == 'running':
+            total = progress.get('total')
+            fraction = (progress.get('downloaded') or 0) / total if total else 0
+            if progress.get('stage') == 'processing':
+                status = "Processing..."
+            elif total:
+                status = f"{int(fraction * 100)}%  {progress.get('speed') or '-'}  ETA {progress.get('eta') or '-'}"
+            else:
+                status = "Starting..."
+            if progress.get('playlist_index') and progress.get('playlist_count'):
+                status = f"[Video {progress['playlist_index']}/{progress['playlist_count']}] {status}"
+            bar.set(fraction)
+        else:
+            status = {
+                'queued': "Waiting",
+                'finished': "Completed",
+                'archived': "Already downloaded",
+                'cancelled': "Cancelled",
+                'error': f"Failed: {(item.error or '')[:70]}",
+            }.get(item.status, item.status)
+            bar.set(1 if item.status in ('finished', 'archived') else 0)
+        status_label.configure(text=f"{settings} | {status}")
+        
+        if item.status in ('queued', 'running'):
+            action_btn.configure(text="Cancel", state="normal", command=lambda: self.queue.cancel(item.id))
+        elif item.status in ('error', 'cancelled'):
+            action_btn.configure(text="Retry", state="normal", command=lambda: self.queue.retry(item.id))
+        else:
+            action_btn.configure(text="", state="disabled", command=None)
+        remove_btn.configure(state="disabled" if item.status == 'running' else "normal",
+                             command=lambda: self.queue.remove(item.id))
+    
+    def scroll_to(self, first_row):
+        self.first_row = first_row
+        self.render()
+    
+    def on_scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * len(self.items)))
+        elif action == "scroll":
+            step = self.VISIBLE_ROWS if unit == "pages" else 1
+            self.scroll_to(self.first_row + int(amount) * step)
+    
+    def on_mousewheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.first_row - 1)
+        elif event.num == 5 or event.delta < 0:
+            self.scroll_to(self.first_row + 1)
 
 class MyLogger:
     def __init__(self, gui):
         self.gui = gui
     
     def debug(self, msg):
-        if not msg.startswith('[debug] '):
-            self.gui.log_message(msg)
+        # yt-dlp sends its regular screen output through debug() too
+        level = logging.DEBUG if msg.startswith('[debug] ') else logging.INFO
+        self.gui.log_message(msg, level)
     
     def info(self, msg):
         self.gui.log_message(msg)
 
     def warning(self, msg):
-        self.gui.log_message(f"[Warning] {msg}")
+        self.gui.log_message(f"[Warning] {msg}", logging.WARNING)
 
     def error(self, msg):
-        self.gui.log_message(f"[Error] {msg}")
+        self.gui.log_message(f"[Error] {msg}", logging.ERROR)
 
 class YouTubeDownloaderApp(ctk.CTk):
     def __init__(self):
@@ -118,17 +499,43 @@ class YouTubeDownloaderApp(ctk.CTk):
         self.current_video_channel = None
         self.current_video_duration = None
         
-        # Control Flags
-        self.check_cancel = False
+        # Cancels the running download: aborts its requests and ffmpeg, deletes its partial files
+        self.cancel_token = CancelToken()
 
         # Cookies file path
         self.cookies_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cookies.txt')
 
+        # Worker threads hand their widget updates to the Tk thread through this bus
+        self.ui_bus = UIUpdateBus()
+        # Only the tail of the log is kept on screen, 'log_file' in the config keeps everything
+        self.log_buffer = LogRingBuffer()
+        self.log_level = "INFO"
+        self.log_file = ''
+
+        # Video info lookups for the URL box: one worker, latest URL only, after typing pauses
+        self.info_fetcher = DebouncedWorker(self.fetch_video_info, self.on_video_info_fetched, name='video-info')
+
+        # Queued downloads run on their own slots next to the main download, saved across restarts
+        self.download_queue = DownloadQueue(self.run_queue_item, on_change=self.on_queue_change,
+                                            on_remove=self.on_queue_remove)
+        self.queue_slots = DEFAULT_SLOTS
+        self.queue_window = None
+
         # Create UI
         self.create_widgets()
         
         # Check FFmpeg
         self.check_ffmpeg()
+        
+        self.ui_bus.attach(self)
+
+        # Resume the downloads left in the queue last time
+        waiting = self.download_queue.counts().get('queued', 0)
+        if waiting:
+            self.log_message(f"[Queue] Resuming {waiting} queued download(s)")
+        self.queue_interrupted_downloads()
+        self.download_queue.set_slots(self.queue_slots)
+        self.refresh_queue_view()
 
     def create_widgets(self):
         # Allow grid weights
@@ -457,6 +864,31 @@ class YouTubeDownloaderApp(ctk.CTk):
         # We can pack it but keep it disabled, or pack_forget until needed. 
         # Making it visible but disabled is better UX for discovery.
         self.open_folder_btn.pack(fill="x", pady=(0, 0))
+
+        # Queue: add the URL with the current settings, or open the queue window
+        self.queue_btn_frame = ctk.CTkFrame(self.action_frame, fg_color="transparent")
+        self.queue_btn_frame.pack(fill="x", pady=(10, 0))
+        self.queue_btn_frame.grid_columnconfigure((0, 1), weight=1)
+
+        self.add_queue_btn = ctk.CTkButton(
+            self.queue_btn_frame,
+            text="➕ Add to Queue",
+            font=ctk.CTkFont(size=14),
+            height=40,
+            command=self.add_to_queue
+        )
+        self.add_queue_btn.grid(row=0, column=0, padx=(0, 5), sticky="ew")
+
+        self.queue_btn = ctk.CTkButton(
+            self.queue_btn_frame,
+            text="📥 Queue",
+            font=ctk.CTkFont(size=14),
+            height=40,
+            fg_color=("gray70", "gray30"),
+            hover_color=("gray60", "gray25"),
+            command=self.show_queue
+        )
+        self.queue_btn.grid(row=0, column=1, padx=(5, 0), sticky="ew")
         
         # === Stats Frame ===
         self.stats_frame = ctk.CTkFrame(self.main_scrollable, corner_radius=10)
@@ -575,7 +1007,7 @@ class YouTubeDownloaderApp(ctk.CTk):
         
         # Initial Auth State
         self.custom_cookie_file = None
-        self.selected_playlist_items = None # Format: "1,2,5" (string) or list of indices
+        self.selected_playlist_items = None # yt-dlp playlist_items spec, e.g. "1-3,7"
         self.download_history = [] # List of {"title": "...", "date": "..."}
         
         # Load Config
@@ -586,16 +1018,12 @@ class YouTubeDownloaderApp(ctk.CTk):
         self.grid_rowconfigure(8, weight=0) 
 
     def get_config_path(self):
-        # Use APPDATA for reliable storage
-        app_data = os.getenv('APPDATA')
-        if not app_data:
-            app_data = os.path.expanduser("~") # Fallback to user home
-        
-        config_dir = os.path.join(app_data, "YT-Downloader")
+        # Same APPDATA folder as the caches, the archive and the queue
+        config_dir = get_app_dir()
         if not os.path.exists(config_dir):
             os.makedirs(config_dir)
             
-        return os.path.join(config_dir, "config.json")
+        return get_app_path("config.json")
 
     def load_config(self):
         self.config_file = self.get_config_path()
@@ -633,6 +1061,12 @@ class YouTubeDownloaderApp(ctk.CTk):
                 
                 # Restore History
                 self.download_history = data.get('download_history', [])
+
+                # Restore Log Settings
+                self.apply_log_settings(data.get('log_level', 'INFO'), data.get('log_file', ''))
+
+                # Restore Queue Slots
+                self.queue_slots = data.get('queue_slots', DEFAULT_SLOTS)
                 
             except Exception as e:
                 self.log_message(f"[Config] Error loading config: {e}")
@@ -647,7 +1081,10 @@ class YouTubeDownloaderApp(ctk.CTk):
                 'cookie_source': self.cookie_source_var.get(),
                 'cookie_file': self.custom_cookie_file if self.custom_cookie_file else '',
                 'download_folder': self.download_folder if hasattr(self, 'download_folder') else '',
-                'download_history': self.download_history
+                'download_history': self.download_history,
+                'log_level': self.log_level,
+                'log_file': self.log_file,
+                'queue_slots': self.queue_slots
             }
             with open(self.config_file, 'w') as f:
                 json.dump(data, f)
@@ -715,6 +1152,7 @@ class YouTubeDownloaderApp(ctk.CTk):
     
     def clear_log(self):
         """Clear the log textbox"""
+        self.log_buffer.clear()
         self.log_textbox.configure(state="normal")
         self.log_textbox.delete("1.0", "end")
         self.log_textbox.configure(state="disabled")
@@ -756,56 +1194,52 @@ class YouTubeDownloaderApp(ctk.CTk):
                 if browser_key:
                     ydl_opts['cookiesfrombrowser'] = (browser_key,)
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                if info:
-                    # Handle playlist URLs - get first video
-                    if 'entries' in info and info['entries']:
-                        info = info['entries'][0]
-                    
-                    title = info.get('title', 'Unknown')
-                    channel = info.get('channel', info.get('uploader', 'Unknown'))
-                    duration = info.get('duration', 0) or 0
-                    
-                    # Format duration
-                    hours = duration // 3600
-                    minutes = (duration % 3600) // 60
-                    seconds = duration % 60
-                    if hours > 0:
-                        duration_str = f"{hours}:{minutes:02d}:{seconds:02d}"
-                    else:
-                        duration_str = f"{minutes}:{seconds:02d}"
+            # Served from the shared metadata cache on repeat lookups
+            info = metadata_cache.extract_info_cached(url, ydl_opts, key=get_cache_key(url))
+            if info:
+                # Handle playlist URLs - get first video
+                if 'entries' in info and info['entries']:
+                    info = info['entries'][0]
+                
+                title = info.get('title', 'Unknown')
+                channel = info.get('channel', info.get('uploader', 'Unknown'))
+                duration = info.get('duration', 0) or 0
+                
+                # Format duration
+                hours = duration // 3600
+                minutes = (duration % 3600) // 60
+                seconds = duration % 60
+                if hours > 0:
+                    duration_str = f"{hours}:{minutes:02d}:{seconds:02d}"
+                else:
+                    duration_str = f"{minutes}:{seconds:02d}"
+                
+                # Fetch thumbnail (already downscaled to the card size, cached by video ID)
+                thumbnail_image = None
+                if HAS_PIL:
+                    thumbnail_image = thumbnail_cache.get_default_cache().get(
+                        info.get('id'), thumbnail_cache.get_thumbnail_url(info))
+
+                # Extract Available Qualities
+                available_qualities = ["Best"]
+                if 'formats' in info:
+                    formats = info['formats']
+                    heights = set()
+                    for f in formats:
+                        # Filter for video streams
+                        if f.get('vcodec') != 'none' and f.get('height'):
+                            heights.add(f['height'])
                     
-                    # Fetch thumbnail
-                    thumbnail_data = None
-                    if HAS_PIL and 'thumbnail' in info:
-                        try:
-                            thumb_url = info['thumbnail']
-                            with urllib.request.urlopen(thumb_url) as u:
-                                thumbnail_data = u.read()
-                        except:
-                            pass
-
-                    # Extract Available Qualities
-                    available_qualities = ["Best"]
-                    if 'formats' in info:
-                        formats = info['formats']
-                        heights = set()
-                        for f in formats:
-                            # Filter for video streams
-                            if f.get('vcodec') != 'none' and f.get('height'):
-                                heights.add(f['height'])
-                        
-                        sorted_heights = sorted(list(heights), reverse=True)
-                        available_qualities.extend([f"{h}p" for h in sorted_heights])
-
-                    return {
-                        'title': title,
-                        'channel': channel,
-                        'duration': duration_str,
-                        'thumbnail_data': thumbnail_data,
-                        'available_qualities': available_qualities
-                    }
+                    sorted_heights = sorted(list(heights), reverse=True)
+                    available_qualities.extend([f"{h}p" for h in sorted_heights])
+
+                return {
+                    'title': title,
+                    'channel': channel,
+                    'duration': duration_str,
+                    'thumbnail_image': thumbnail_image,
+                    'available_qualities': available_qualities
+                }
         except Exception as e:
             self.log_message(f"[Info] Could not fetch video info: {str(e)[:50]}")
             return None
@@ -838,7 +1272,7 @@ class YouTubeDownloaderApp(ctk.CTk):
         
         # Update File Name Preview
         sanitized_title = self.sanitize_filename(info['title'])
-        ext = "mp4" if self.mode_var.get() == "video" else "mp3"
+        ext = "mp4" if self.mode_var.get() == "video" else self.get_audio_codec()
         filename = f"{sanitized_title}.{ext}"
         if len(filename) > 60:
              filename = filename[:57] + "..."
@@ -853,11 +1287,9 @@ class YouTubeDownloaderApp(ctk.CTk):
                 self.quality_menu.set(qualities[0]) if qualities else None
 
         # Display Thumbnail
-        if HAS_PIL and info.get('thumbnail_data'):
+        if HAS_PIL and info.get('thumbnail_image'):
             try:
-                img_data = info['thumbnail_data']
-                pil_image = Image.open(BytesIO(img_data))
-                # Resize (keep aspect ratio approx 16:9)
+                pil_image = info['thumbnail_image']
                 ctk_image = ctk.CTkImage(light_image=pil_image, dark_image=pil_image, size=(160, 90))
                 
                 # Create label if not exists
@@ -921,9 +1353,7 @@ class YouTubeDownloaderApp(ctk.CTk):
              return
 
         # 2. Check AppData Local Bin
-        app_data = os.getenv('APPDATA')
-        if not app_data: app_data = os.path.expanduser("~")
-        self.local_bin_dir = os.path.join(app_data, "YT-Downloader", "bin")
+        self.local_bin_dir = get_app_path("bin")
         local_ffmpeg = os.path.join(self.local_bin_dir, "ffmpeg.exe")
         
         if os.path.exists(local_ffmpeg):
@@ -959,7 +1389,8 @@ class YouTubeDownloaderApp(ctk.CTk):
             threading.Thread(target=self.install_ffmpeg, daemon=True).start()
 
     def install_ffmpeg(self):
-        self.ffmpeg_btn.configure(state="disabled", text="Downloading...")
+        # Runs on a worker thread: widgets are only updated through self.ui_bus
+        self.ui_bus.call(self.ffmpeg_btn.configure, state="disabled", text="Downloading...")
         try:
             url = "https://www.gyan.dev/ffmpeg/builds/ffmpeg-release-essentials.zip"
             if not os.path.exists(self.local_bin_dir):
@@ -970,14 +1401,13 @@ class YouTubeDownloaderApp(ctk.CTk):
             # Progress reporting
             def report_hook(count, block_size, total_size):
                 percent = int(count * block_size * 100 / total_size)
-                if percent % 10 == 0:
-                    self.ffmpeg_btn.configure(text=f"DL: {percent}%")
+                self.ui_bus.post('ffmpeg_progress', self.ffmpeg_btn.configure, text=f"DL: {percent}%")
             
             self.log_message("[FFmpeg] Downloading binaries (gyan.dev)...")
             urllib.request.urlretrieve(url, zip_path, report_hook)
             
             self.log_message("[FFmpeg] Download complete. Extracting...")
-            self.ffmpeg_btn.configure(text="Extracting...")
+            self.ui_bus.post('ffmpeg_progress', self.ffmpeg_btn.configure, text="Extracting...")
             
             with zipfile.ZipFile(zip_path, 'r') as zip_ref:
                 # Search for ffmpeg.exe
@@ -999,26 +1429,56 @@ class YouTubeDownloaderApp(ctk.CTk):
             os.remove(zip_path)
             self.ffmpeg_path = os.path.join(self.local_bin_dir, "ffmpeg.exe")
             self.log_message("[FFmpeg] Installation Successful!")
-            self.ffmpeg_btn.configure(text="✅ Installed", fg_color="green")
-            self.after(3000, lambda: self.ffmpeg_btn.destroy())
+            self.ui_bus.post('ffmpeg_progress', self.ffmpeg_btn.configure, text="✅ Installed", fg_color="green")
+            self.ui_bus.call(self.after, 3000, self.ffmpeg_btn.destroy)
             
         except Exception as e:
             self.log_message(f"[FFmpeg] Error: {e}")
-            self.ffmpeg_btn.configure(text="⚠️ Retry", state="normal")
+            self.ui_bus.post('ffmpeg_progress', self.ffmpeg_btn.configure, text="⚠️ Retry", state="normal")
+
+    def log_message(self, message, level=logging.INFO):
+        """Safe from any thread: lines are queued and written to the log box once per UI tick"""
+        if self.log_buffer.append(message, level):
+            self.ui_bus.post('log', self.flush_log)
 
-    def log_message(self, message):
+    def flush_log(self):
+        lines, replace = self.log_buffer.take_pending()
+        if not lines:
+            return
         self.log_textbox.configure(state="normal")
-        self.log_textbox.insert("end", message + "\n")
+        if replace:
+            self.log_textbox.delete("1.0", "end")
+        self.log_textbox.insert("end", "\n".join(lines) + "\n")
+        # Trim the oldest lines so the widget never holds more than the ring
+        line_count = int(self.log_textbox.index("end-1c").split(".")[0]) - 1
+        excess = line_count - self.log_buffer.capacity
+        if excess > 0:
+            self.log_textbox.delete("1.0", f"{excess + 1}.0")
         self.log_textbox.see("end")
         self.log_textbox.configure(state="disabled")
 
+    def apply_log_settings(self, level_name, log_file):
+        """Display level and spill file from the config"""
+        self.log_level = level_name or "INFO"
+        self.log_buffer.set_level(get_level(self.log_level))
+        self.log_file = log_file or ''
+        try:
+            self.log_buffer.set_spill_path(self.log_file or None)
+        except OSError as e:
+            self.log_file = ''
+            self.log_message(f"[Config] Could not open log file: {e}", logging.WARNING)
+
+    def get_audio_codec(self):
+        """Codec for audio mode: M4A keeps the original stream, the kbps choices are MP3"""
+        return "m4a" if self.quality_var.get().startswith("M4A") else "mp3"
+
     def update_quality_options(self):
         mode = self.mode_var.get()
         if mode == "video":
             values = ["Best", "2160p", "1440p", "1080p", "720p", "480p", "360p"]
             self.quality_var.set("Best")
         else:
-            values = ["320 kbps", "256 kbps", "192 kbps", "128 kbps", "96 kbps", "64 kbps"]
+            values = ["320 kbps", "256 kbps", "192 kbps", "128 kbps", "96 kbps", "64 kbps", "M4A (original)"]
             self.quality_var.set("320 kbps")
         
         self.quality_menu.configure(values=values)
@@ -1026,7 +1486,7 @@ class YouTubeDownloaderApp(ctk.CTk):
         # Update filename preview if video info is shown
         if self.current_video_title and hasattr(self, 'video_filename_label'):
             sanitized_title = self.sanitize_filename(self.current_video_title)
-            ext = "mp4" if mode == "video" else "mp3"
+            ext = "mp4" if mode == "video" else self.get_audio_codec()
             filename = f"{sanitized_title}.{ext}"
             if len(filename) > 60:
                  filename = filename[:57] + "..."
@@ -1039,17 +1499,11 @@ class YouTubeDownloaderApp(ctk.CTk):
         self.video_info_card.grid_forget()
         self.current_video_title = None
         
-        # Validate URL and fetch info in background
+        # Validate URL and fetch info in background (stale lookups are dropped)
         if url and self.validate_youtube_url(url):
-            # Fetch video info in a thread to avoid blocking UI
-            def fetch_info():
-                info = self.fetch_video_info(url)
-                if info:
-                    # Update UI in main thread
-                    self.after(0, lambda: self.display_video_info(info))
-            
-            thread = threading.Thread(target=fetch_info, daemon=True)
-            thread.start()
+            self.info_fetcher.submit(url)
+        else:
+            self.info_fetcher.cancel()
         
         if 'list=' in url and not 'start_radio=' in url:
             # Show playlist frame and shift other elements down
@@ -1078,6 +1532,16 @@ class YouTubeDownloaderApp(ctk.CTk):
             self.log_frame.grid(row=8, column=0, padx=20, pady=(0, 20), sticky="nsew")
             
 
+    def on_video_info_fetched(self, generation, url, info):
+        # Runs on the info worker thread
+        if info:
+            self.ui_bus.call(self.show_fetched_info, generation, info)
+
+    def show_fetched_info(self, generation, info):
+        # The URL may have changed again since the worker finished
+        if self.info_fetcher.is_current(generation):
+            self.display_video_info(info)
+
     def on_cookie_source_change(self, choice):
         try:
             self.log_message(f"[Debug] Cookie source changed to: {choice}")
@@ -1135,6 +1599,9 @@ class YouTubeDownloaderApp(ctk.CTk):
             
         self.select_videos_btn.configure(text="Loading...", state="disabled")
         
+        # The dialog opens right away and fills in page by page
+        dialog = PlaylistSelectionDialog(self, title="Select Videos to Download")
+        
         def fetch_task():
             try:
                 ydl_opts = {
@@ -1152,42 +1619,56 @@ class YouTubeDownloaderApp(ctk.CTk):
                      key = browser_map.get(cookie_source)
                      if key: ydl_opts['cookiesfrombrowser'] = (key,)
 
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(url, download=False)
-                    if 'entries' in info:
-                        # It is a playlist
-                        entries = list(info['entries'])
-                        self.after(0, lambda: self.show_selection_dialog(entries))
-                    else:
+                with ydl_pool.checkout(ydl_opts) as ydl:
+                    # process=False keeps the entries a generator, pages are requested as we go
+                    info = ydl.extract_info(url, download=False, process=False)
+                    while info and info.get('_type') in ('url', 'url_transparent'):
+                        info = ydl.extract_info(info['url'], download=False, process=False, ie_key=info.get('ie_key'))
+                    
+                    if not info or info.get('entries') is None:
                         # Single video?
                         self.log_message("[Info] Not a playlist or no entries found.")
-                        self.after(0, lambda: self.select_videos_btn.configure(text="Select Videos...", state="normal"))
+                        self.ui_bus.call(dialog.finish_loading, "Not a playlist or no entries found.")
+                        return
+                    
+                    page = []
+                    for entry in info['entries']:
+                        if dialog.closed.is_set():
+                            break
+                        page.append(entry)
+                        if len(page) >= PLAYLIST_PAGE_SIZE:
+                            self.ui_bus.call(dialog.add_entries, page)
+                            page = []
+                    if page:
+                        self.ui_bus.call(dialog.add_entries, page)
+                    self.ui_bus.call(dialog.finish_loading)
                         
             except Exception as e:
                 self.log_message(f"[Error] Failed to fetch playlist: {e}")
-                self.after(0, lambda: self.select_videos_btn.configure(text="Select Videos...", state="normal"))
+                self.ui_bus.call(dialog.finish_loading, f"Failed to fetch playlist: {e}")
 
         threading.Thread(target=fetch_task, daemon=True).start()
+        self.show_selection_dialog(dialog)
 
-    def show_selection_dialog(self, video_list):
-        self.select_videos_btn.configure(text="Select Videos...", state="normal")
-        
-        dialog = PlaylistSelectionDialog(self, video_list, title="Select Videos to Download")
+    def show_selection_dialog(self, dialog):
         # Center the dialog
         dialog.geometry(f"+{self.winfo_x()+50}+{self.winfo_y()+50}")
         dialog.grab_set() # Modal
         self.wait_window(dialog)
+        self.select_videos_btn.configure(text="Select Videos...", state="normal")
         
         if dialog.result is not None:
-             self.selected_playlist_items = dialog.result
-             count = len(self.selected_playlist_items)
+             selection = dialog.result
+             count = selection.count()
              if count == 0:
                  self.select_videos_btn.configure(text="Nothing Selected", fg_color="gray")
                  self.selected_playlist_items = None
-             elif count == len(video_list):
+             elif count == selection.size:
                  self.select_videos_btn.configure(text="All Selected", fg_color="green")
                  self.selected_playlist_items = None # Reset to download all
              else:
+                 # Compact yt-dlp spec ("1-50,80") instead of every index
+                 self.selected_playlist_items = selection.to_playlist_items()
                  self.select_videos_btn.configure(text=f"Selected ({count})", fg_color="green")
                  self.playlist_option_var.set("playlist") # Force playlist mode
         else:
@@ -1195,7 +1676,7 @@ class YouTubeDownloaderApp(ctk.CTk):
              pass
 
     def cancel_download(self):
-        self.check_cancel = True
+        self.cancel_token.cancel()
         self.log_message("[User] Cancel requested...")
         self.progress_status.configure(text="Cancelling...", text_color="red")
         
@@ -1205,8 +1686,8 @@ class YouTubeDownloaderApp(ctk.CTk):
             messagebox.showerror("Error", "Please provide a URL")
             return
             
-        # Reset cancel flag
-        self.check_cancel = False
+        # Fresh token for this download
+        self.cancel_token = CancelToken()
 
         # Toggle Buttons
         self.download_btn.pack_forget()
@@ -1231,7 +1712,61 @@ class YouTubeDownloaderApp(ctk.CTk):
         thread.daemon = True
         thread.start()
 
+    def get_cookie_options(self, cookie_source, log=True):
+        """yt-dlp cookie options for the selected cookie source"""
+        if cookie_source == "Select File..." and self.custom_cookie_file:
+            if os.path.exists(self.custom_cookie_file):
+                if log:
+                    self.log_message(f"[Auth] Using Cookie File: {os.path.basename(self.custom_cookie_file)}")
+                return {'cookiefile': self.custom_cookie_file}
+            if log:
+                self.log_message(f"[Warning] Selected cookie file not found!")
+        
+        elif cookie_source in ["Chrome", "Firefox", "Edge", "Opera", "Brave"]:
+            browser_map = {
+                "Chrome": "chrome", "Firefox": "firefox", "Edge": "edge", 
+                "Opera": "opera", "Brave": "brave"
+            }
+            browser_key = browser_map.get(cookie_source)
+            if browser_key:
+                if log:
+                    self.log_message(f"[Auth] Extracting cookies from {cookie_source}...")
+                return {'cookiesfrombrowser': (browser_key,)}
+        return {}
+
+    def get_format_options(self, mode, quality, audio_codec, download_playlist):
+        """yt-dlp format and output options for a mode and quality choice"""
+        outtmpl = '%(playlist_title)s/%(title)s.%(ext)s' if download_playlist else '%(title)s.%(ext)s'
+
+        # Video Mode
+        if mode == "video":
+            # Check for dynamic "Height + p" format (e.g. "540p", "480p")
+            height_match = re.match(r'(\d+)p', quality)
+            if height_match:
+                h = height_match.group(1)
+                format_str = f'bestvideo[height<={h}]+bestaudio/best[height<={h}]/best'
+            else:
+                format_str = 'bestvideo+bestaudio/best'
+            
+            return {
+                'format': format_str,
+                'merge_output_format': 'mp4',
+                'outtmpl': outtmpl,
+            }
+
+        # Audio Mode
+        quality_val = quality.split()[0] # "320 kbps" -> "320"
+        audio_map = {'320': '0', '256': '1', '192': '2', '128': '5', '96': '6', '64': '8'}
+        
+        # Streams already in the target codec are only copied, not re-encoded
+        return {
+            'outtmpl': outtmpl,
+            **build_audio_options(audio_codec or "mp3", audio_map.get(quality_val, '0')),
+        }
+
     def run_download(self):
+        # Runs on a worker thread: widgets are only updated through self.ui_bus
+        cancel_token = self.cancel_token
         try:
             url = self.url_var.get().strip()
             mode = self.mode_var.get()
@@ -1248,6 +1783,7 @@ class YouTubeDownloaderApp(ctk.CTk):
             ydl_opts = {
                 'quiet': True,
                 'no_warnings': True,
+                'cancel_token': cancel_token,
                 'progress_hooks': [self.progress_hook],
                 'postprocessor_hooks': [self.post_processor_hook],
                 'logger': MyLogger(self),
@@ -1256,7 +1792,6 @@ class YouTubeDownloaderApp(ctk.CTk):
                 # VPS Options
                 'geo_bypass': True,
                 'retries': 10,
-                'sleep_interval': 1,
                 'concurrent_fragment_downloads': 5, # Speed boost
                 'http_chunk_size': 10485760, # 10MB chunks
             }
@@ -1267,7 +1802,7 @@ class YouTubeDownloaderApp(ctk.CTk):
             
             # Apply Playlist Selection
             if download_playlist and self.selected_playlist_items:
-                 items_str = ",".join(map(str, self.selected_playlist_items))
+                 items_str = self.selected_playlist_items
                  ydl_opts['playlist_items'] = items_str
                  self.log_message(f"[Playlist] Downloading selected items: {items_str}")
 
@@ -1279,103 +1814,81 @@ class YouTubeDownloaderApp(ctk.CTk):
                  self.log_message(f"[System] Saving to default folder")
 
             # === Authentication Logic ===
-            if cookie_source == "Select File..." and self.custom_cookie_file:
-                if os.path.exists(self.custom_cookie_file):
-                    ydl_opts['cookiefile'] = self.custom_cookie_file
-                    self.log_message(f"[Auth] Using Cookie File: {os.path.basename(self.custom_cookie_file)}")
-                else:
-                    self.log_message(f"[Warning] Selected cookie file not found!")
-            
-            elif cookie_source in ["Chrome", "Firefox", "Edge", "Opera", "Brave"]:
-                browser_map = {
-                    "Chrome": "chrome", "Firefox": "firefox", "Edge": "edge", 
-                    "Opera": "opera", "Brave": "brave"
-                }
-                browser_key = browser_map.get(cookie_source)
-                if browser_key:
-                    ydl_opts['cookiesfrombrowser'] = (browser_key,)
-                    self.log_message(f"[Auth] Extracting cookies from {cookie_source}...")
-            
-            elif os.path.exists(self.cookies_file) and cookie_source == "None":
-                 pass
+            ydl_opts.update(self.get_cookie_options(cookie_source))
+
+            ydl_opts.update(self.get_format_options(mode, quality, self.get_audio_codec(), download_playlist))
 
             # Video Mode
             if mode == "video":
-                # Check for dynamic "Height + p" format (e.g. "540p", "480p")
-                height_match = re.match(r'(\d+)p', quality)
-                if height_match:
-                    h = height_match.group(1)
-                    format_str = f'bestvideo[height<={h}]+bestaudio/best[height<={h}]/best'
-                elif quality == 'Best':
-                    format_str = 'bestvideo+bestaudio/best'
-                else:
-                    # Fallback
-                    format_str = 'bestvideo+bestaudio/best'
-                
-                ydl_opts.update({
-                    'format': format_str,
-                    'merge_output_format': 'mp4',
-                    'outtmpl': '%(playlist_title)s/%(title)s.%(ext)s' if download_playlist else '%(title)s.%(ext)s',
-                })
                 title_msg = f": {self.current_video_title}" if self.current_video_title else ""
                 self.log_message(f"[Start] Downloading Video ({quality}){title_msg}...")
                 if self.current_video_title:
                     title_display = self.current_video_title[:50] + "..." if len(self.current_video_title) > 50 else self.current_video_title
-                    self.progress_status.configure(text=f"Downloading: {title_display}", text_color="gray")
+                    self.ui_bus.call(self.progress_status.configure, text=f"Downloading: {title_display}", text_color="gray")
 
             # Audio Mode
             else:
-                quality_val = quality.split()[0] # "320 kbps" -> "320"
-                audio_map = {'320': '0', '256': '1', '192': '2', '128': '5', '96': '6', '64': '8'}
-                
-                ydl_opts.update({
-                    'format': 'bestaudio/best',
-                    'outtmpl': '%(playlist_title)s/%(title)s.%(ext)s' if download_playlist else '%(title)s.%(ext)s',
-                    'postprocessors': [{
-                        'key': 'FFmpegExtractAudio',
-                        'preferredcodec': 'mp3',
-                        'preferredquality': audio_map.get(quality_val, '0'),
-                    }],
-                })
                 title_msg = f": {self.current_video_title}" if self.current_video_title else ""
                 self.log_message(f"[Start] Downloading Audio ({quality}){title_msg}...")
                 if self.current_video_title:
-                    self.progress_status.configure(text=f"Downloading: {self.current_video_title[:50]}...", text_color="gray")
-
-            # Start Download
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                    self.ui_bus.call(self.progress_status.configure, text=f"Downloading: {self.current_video_title[:50]}...", text_color="gray")
+
+            # Videos downloaded before (same mode) are skipped, playlists only fetch the new ones
+            ydl_opts['download_archive'] = get_default_archive().view(get_archive_profile(ydl_opts))
+
+            # Reuse the info fetched when the URL was entered instead of extracting again
+            cached_info = get_cached_info(url, download_playlist)
+
+            archived = None if download_playlist else find_archived_download(url, ydl_opts, cached_info)
+            if archived:
+                self.log_message(f"[Archive] Already downloaded: {archived['filepath'] or archived['title'] or url}")
+                self.ui_bus.call(self.progress_bar.set, 1.0)
+                self.ui_bus.call(self.progress_percent.configure, text="100%")
+                self.ui_bus.call(self.progress_status.configure, text="Already downloaded", text_color="#2ECC71")
+                return
+
+            # Start Download (in a playlist, ffmpeg works on one video while the next downloads)
+            postprocessing = PostProcessQueue()
+            ydl_opts['postprocess_queue'] = postprocessing
+            with ydl_pool.checkout(ydl_opts) as ydl:
                 self.log_message(f"Processing: {url}")
-                ydl.download([url])
+                metadata_cache.download_with_info(ydl, url, cached_info)
+            postprocessing.wait()
             
             title_msg = f" - {self.current_video_title}" if self.current_video_title else ""
             self.log_message(f"[Success] Download Completed!{title_msg}")
-            self.progress_bar.set(1.0)
-            self.progress_percent.configure(text="100%")
+            self.ui_bus.call(self.progress_bar.set, 1.0)
+            self.ui_bus.call(self.progress_percent.configure, text="100%")
             
             completed_text = "Download completed!"
             if self.current_video_title:
                 completed_text = f"Downloaded: {self.current_video_title[:40]}"
                 if len(self.current_video_title) > 40:
                     completed_text += "..."
-            self.progress_status.configure(text=completed_text, text_color="#2ECC71")
+            self.ui_bus.call(self.progress_status.configure, text=completed_text, text_color="#2ECC71")
             
             # Enable Open Folder Button
             if hasattr(self, 'open_folder_btn'):
-                self.open_folder_btn.configure(state="normal")
+                self.ui_bus.call(self.open_folder_btn.configure, state="normal")
             
             # Add to History
             if self.current_video_title:
                 self.add_to_history(self.current_video_title)
             
-            messagebox.showinfo("Success", f"Download Completed Successfully!\n\n{self.current_video_title if self.current_video_title else 'File downloaded'}")
+            self.ui_bus.call(messagebox.showinfo, "Success", f"Download Completed Successfully!\n\n{self.current_video_title if self.current_video_title else 'File downloaded'}")
 
         except Exception as e:
             error_msg = str(e)
+            if cancel_token.cancelled:
+                # Requests, ffmpeg and partial files are already taken care of by the token
+                self.log_message("[User] Download cancelled.")
+                self.ui_bus.call(self.progress_status.configure, text="Cancelled", text_color="red")
+                return
             self.log_message(f"[Error] {error_msg}")
             
             # Check for specific browser cookie error
             if "Could not copy" in error_msg and "cookie database" in error_msg:
-                messagebox.showerror("Browser Error", 
+                self.ui_bus.call(messagebox.showerror, "Browser Error", 
                     f"Could not access {self.cookie_source_var.get()} cookies.\n\n"
                     "Please CLOSE your browser completely and try again.\n"
                     "(The database is locked while the browser is open)"
@@ -1383,7 +1896,7 @@ class YouTubeDownloaderApp(ctk.CTk):
             
             # Check for DPAPI/Decryption error
             elif "decrypt" in error_msg and "DPAPI" in error_msg:
-                messagebox.showerror("Encryption Error", 
+                self.ui_bus.call(messagebox.showerror, "Encryption Error", 
                     f"Could not decrypt {self.cookie_source_var.get()} cookies.\n\n"
                     "Chrome's encryption is blocking access.\n"
                     "Workarounds:\n"
@@ -1391,84 +1904,227 @@ class YouTubeDownloaderApp(ctk.CTk):
                     "2. Or select 'Select File...' and use a manually exported cookies.txt"
                 )
             else:
-                messagebox.showerror("Error", f"Download Failed:\n{error_msg}")
+                self.ui_bus.call(messagebox.showerror, "Error", f"Download Failed:\n{error_msg}")
         
         finally:
-            self.download_btn.pack(fill="x", pady=(0, 10))
-            self.cancel_btn.pack_forget()
+            self.ui_bus.call(self.download_btn.pack, fill="x", pady=(0, 10))
+            self.ui_bus.call(self.cancel_btn.pack_forget)
             
-            self.download_btn.configure(state="normal", text="⬇️ Start Download")
-            self.progress_bar.stop()
-            self.progress_bar.configure(mode="determinate")
+            self.ui_bus.call(self.download_btn.configure, state="normal", text="⬇️ Start Download")
+            self.ui_bus.call(self.progress_bar.stop)
+            self.ui_bus.call(self.progress_bar.configure, mode="determinate")
+
+    def add_to_queue(self):
+        """Queue every URL in the box with the current mode, quality and folder"""
+        urls = self.url_var.get().split()
+        if not urls:
+            messagebox.showerror("Error", "Please provide a URL")
+            return
+        
+        mode = self.mode_var.get()
+        quality = self.quality_var.get()
+        cookies = self.get_cookie_options(self.cookie_source_var.get(), log=False)
+        for url in urls:
+            playlist = 'list=' in url and self.playlist_option_var.get() == 'playlist'
+            self.download_queue.add(
+                url,
+                mode=mode,
+                quality=quality,
+                audio_codec=None if mode == "video" else self.get_audio_codec(),
+                playlist=playlist,
+                playlist_items=self.selected_playlist_items if playlist else None,
+                folder=self.download_folder,
+                cookies=cookies,
+                title=self.current_video_title if len(urls) == 1 else None,
+            )
+        self.log_message(f"[Queue] Added {len(urls)} download(s) ({mode}, {quality})")
+        self.url_var.set("")
+
+    def queue_interrupted_downloads(self):
+        """Queue the downloads the job journal says were cut short, they continue from their .part files"""
+        # Queue items that were running last time continue by themselves when they run again,
+        # and a resumed item that failed stays in the queue to be retried or removed
+        active = set()
+        resumed = set()
+        for item in self.download_queue.items():
+            if not item.done:
+                active.update(key for key in (item.url, get_archive_id(item.url)) if key)
+            if item.resume:
+                resumed.add((item.resume['url'], item.resume['output']))
+        
+        added = 0
+        for download in get_default_journal().interrupted():
+            if (download['url'] in active or get_archive_id(download['url']) in active
+                    or (download['url'], download['output']) in resumed):
+                continue
+            audio = next((pp for pp in download['options'].get('postprocessors') or []
+                          if pp.get('key') == 'FFmpegExtractAudio'), None)
+            self.download_queue.add(
+                download['url'],
+                mode='audio' if audio else 'video',
+                quality='(resumed)',
+                audio_codec=audio and audio.get('preferredcodec'),
+                folder=os.path.dirname(download['output']),
+                title=download['title'],
+                resume=download,
+            )
+            added += 1
+        if added:
+            self.log_message(f"[Queue] Continuing {added} interrupted download(s)")
+
+    def set_queue_slots(self, slots):
+        self.queue_slots = slots
+        self.download_queue.set_slots(slots)
+        self.save_config()
+
+    def show_queue(self):
+        if self.queue_window is not None and self.queue_window.winfo_exists():
+            self.queue_window.focus()
+            return
+        self.queue_window = DownloadQueueWindow(self)
+
+    def on_queue_remove(self, item):
+        # A removed resumed item gives up on its interrupted download: close it in the journal
+        if item.resume:
+            get_default_journal().end_interrupted(item.resume['url'], item.resume['output'], 'removed')
+
+    def on_queue_change(self, item):
+        # Runs on the queue slot threads, redrawn at most once per UI tick
+        self.ui_bus.post('queue', self.refresh_queue_view)
+
+    def refresh_queue_view(self):
+        counts = self.download_queue.counts()
+        running, waiting = counts.get('running', 0), counts.get('queued', 0)
+        text = "📥 Queue"
+        if running or waiting:
+            text += f" ({running} running, {waiting} waiting)"
+        self.queue_btn.configure(text=text)
+        if self.queue_window is not None and self.queue_window.winfo_exists():
+            self.queue_window.render()
+
+    def run_queue_item(self, item):
+        # Runs on a queue slot thread, next to other slots: progress goes to the item, not the main widgets
+        def progress_hook(d):
+            item.cancel_token.raise_if_cancelled()
+            if d['status'] == 'downloading':
+                self.download_queue.update_progress(
+                    item, stage='downloading',
+                    downloaded=d.get('downloaded_bytes') or 0,
+                    total=d.get('total_bytes') or d.get('total_bytes_estimate'),
+                    speed=d.get('_speed_str'), eta=d.get('_eta_str'),
+                    playlist_index=d.get('playlist_index'), playlist_count=d.get('playlist_count'),
+                )
+            elif d['status'] == 'finished':
+                self.download_queue.update_progress(item, stage='processing')
+        
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'cancel_token': item.cancel_token,
+            'progress_hooks': [progress_hook],
+            'logger': MyLogger(self),
+            'noplaylist': not item.playlist,
+            'geo_bypass': True,
+            'retries': 10,
+            'concurrent_fragment_downloads': 5,
+            'http_chunk_size': 10485760,
+        }
+        if getattr(self, 'ffmpeg_path', None):
+            ydl_opts['ffmpeg_location'] = self.ffmpeg_path
+        if item.playlist and item.playlist_items:
+            ydl_opts['playlist_items'] = item.playlist_items
+        if item.folder and os.path.exists(item.folder):
+            ydl_opts['paths'] = {'home': item.folder}
+        
+        cookies = dict(item.cookies)
+        if cookies.get('cookiesfrombrowser'):
+            cookies['cookiesfrombrowser'] = tuple(cookies['cookiesfrombrowser'])
+        ydl_opts.update(cookies)
+        if item.resume:
+            # Same formats and file names as the interrupted download, only the missing bytes are fetched
+            ydl_opts.update(get_resume_options(item.resume))
+        else:
+            ydl_opts.update(self.get_format_options(item.mode, item.quality, item.audio_codec, item.playlist))
+        ydl_opts['download_archive'] = get_default_archive().view(get_archive_profile(ydl_opts))
+        
+        cached_info = get_cached_info(item.url, item.playlist)
+        if not item.playlist:
+            archived = find_archived_download(item.url, ydl_opts, cached_info)
+            if archived:
+                self.log_message(f"[Queue] Already downloaded: {archived['filepath'] or archived['title'] or item.url}")
+                if item.resume:
+                    get_default_journal().end_interrupted(item.resume['url'], item.resume['output'], 'archived')
+                return 'archived'
+        
+        self.log_message(f"[Queue] Starting: {item.title or item.url}")
+        postprocessing = PostProcessQueue()
+        ydl_opts['postprocess_queue'] = postprocessing
+        with ydl_pool.checkout(ydl_opts) as ydl:
+            info = metadata_cache.download_with_info(ydl, item.url, cached_info)
+        postprocessing.wait()
+        
+        item.title = (info or {}).get('title') or item.title
+        self.log_message(f"[Queue] Completed: {item.title or item.url}")
+        if item.title:
+            self.ui_bus.call(self.add_to_history, item.title)
+        return 'finished'
 
     def progress_hook(self, d):
-        if self.check_cancel:
-            raise Exception("Download Cancelled by User")
+        self.cancel_token.raise_if_cancelled()
 
+        # Called by yt-dlp for every chunk: only the latest state is drawn, once per UI tick
         if d['status'] == 'downloading':
-            try:
-                # Update progress bar
-                if 'total_bytes' in d:
-                    p = d['downloaded_bytes'] / d['total_bytes']
-                    self.progress_bar.set(p)
-                elif 'total_bytes_estimate' in d:
-                    p = d['downloaded_bytes'] / d['total_bytes_estimate']
-                    self.progress_bar.set(p)
-
-                # Update stats labels
-                speed = d.get('_speed_str', 'N/A')
-                eta = d.get('_eta_str', 'N/A')
-                
-                # Size formatting
-                total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
-                if total_bytes:
-                    size_mb = total_bytes / 1024 / 1024
-                    size_str = f"{size_mb:.1f} MiB"
-                else:
-                    size_str = "N/A"
-
-                # Update stat cards (new format)
-                self.stat_speed.configure(text=speed if speed != 'N/A' else "-")
-                self.stat_eta.configure(text=eta if eta != 'N/A' else "-")
-                self.stat_size.configure(text=size_str if size_str != 'N/A' else "-")
-                
-                # Update progress percentage
-                percent = int(p * 100)
-                self.progress_percent.configure(text=f"{percent}%")
-                
-                # STATUS MESSAGE logic
-                status_msg = "Downloading..."
-                
-                # Check for playlist info
-                if 'playlist_index' in d and 'playlist_count' in d:
-                    idx = d['playlist_index']
-                    count = d['playlist_count']
-                    status_msg = f"[Video {idx}/{count}] Downloading..."
-                
-                self.progress_status.configure(text=status_msg, text_color="gray")
-                
-                self.progress_bar.configure(mode="determinate")
-            except Exception as e:
-                # print(e)
-                pass
+            self.ui_bus.post(
+                'progress', self.show_download_progress,
+                d.get('downloaded_bytes') or 0,
+                d.get('total_bytes') or d.get('total_bytes_estimate'),
+                d.get('_speed_str'), d.get('_eta_str'),
+                d.get('playlist_index'), d.get('playlist_count'),
+            )
         
         elif d['status'] == 'finished':
             self.log_message("Download finished. Processing/Converting...")
+            self.ui_bus.post('progress', self.show_processing, "Processing...")
+
+    def show_download_progress(self, downloaded, total_bytes, speed, eta, playlist_index, playlist_count):
+        # Update progress bar
+        if total_bytes:
+            p = downloaded / total_bytes
+            self.progress_bar.configure(mode="determinate")
+            self.progress_bar.set(p)
+            self.progress_percent.configure(text=f"{int(p * 100)}%")
+
+        # Update stat cards
+        self.stat_speed.configure(text=speed if speed and speed != 'N/A' else "-")
+        self.stat_eta.configure(text=eta if eta and eta != 'N/A' else "-")
+        self.stat_size.configure(text=f"{total_bytes / 1024 / 1024:.1f} MiB" if total_bytes else "-")
+        
+        # STATUS MESSAGE logic
+        status_msg = "Downloading..."
+        
+        # Check for playlist info
+        if playlist_index and playlist_count:
+            status_msg = f"[Video {playlist_index}/{playlist_count}] Downloading..."
+        
+        self.progress_status.configure(text=status_msg, text_color="gray")
+
+    def show_processing(self, status_msg, started=True):
+        if started:
             self.progress_bar.configure(mode="indeterminate")
             self.progress_bar.start()
             self.stat_speed.configure(text="-")
             self.stat_eta.configure(text="Complete")
-            self.progress_status.configure(text="Processing...", text_color="#F39C12")
-
+        self.progress_status.configure(text=status_msg, text_color="#F39C12")
 
     def post_processor_hook(self, d):
+        # e.g. "Merging video and audio..." or "Converting to MP3..." could be shown from d['postprocessor']
+        # Own key: posted under 'progress' it could replace the download's "finished" update
+        # in the same tick, and the bar would never switch to indeterminate
         if d['status'] == 'started':
-            self.progress_status.configure(text="Processing / Converting...", text_color="#F39C12")
-            # If we know the specific post-processor, we can be more specific
-            # e.g. "Merging video and audio..." or "Converting to MP3..."
+            self.ui_bus.post('status', self.show_processing, "Processing / Converting...", False)
             
         elif d['status'] == 'finished':
-             self.progress_status.configure(text="Finalizing...", text_color="#F39C12")
+            self.ui_bus.post('status', self.show_processing, "Finalizing...", False)
 
 if __name__ == "__main__":
     app = YouTubeDownloaderApp()